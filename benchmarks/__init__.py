@@ -0,0 +1,7 @@
+"""
+The offline benchmark suite of the Logto SDK hot paths. Run `python -m benchmarks
+--help` (or `pdm run bench --help`) for the usage.
+
+All network requests are served by `FakeTransport` in the process, so the results
+only reflect the SDK overhead and are reproducible without a Logto server.
+"""
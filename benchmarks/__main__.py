@@ -0,0 +1,69 @@
+"""
+Usage:
+  python -m benchmarks [--concurrency 1,10,100,1000] [--ops 2000]
+                       [--filter getAccessToken] [--output report.json]
+                       [--compare baseline.json] [--threshold 0.1]
+
+Exits with 1 if `--compare` is given and any case regressed.
+"""
+
+import argparse
+import json
+import sys
+
+from .cases import cases
+from .runner import compare, run
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Benchmark the SDK hot paths."
+    )
+    parser.add_argument(
+        "--concurrency",
+        default="1,10,100,1000",
+        help="comma-separated concurrency levels (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--ops",
+        type=int,
+        default=2000,
+        help="operations per case and level (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--filter", default="", help="only run cases whose names contain this"
+    )
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="compare with this JSON report")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="allowed throughput drop when comparing (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    report = run(
+        {name: case for name, case in cases.items() if args.filter in name},
+        [int(level) for level in args.concurrency.split(",")],
+        args.ops,
+    )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
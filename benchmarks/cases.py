@@ -0,0 +1,198 @@
+"""
+The benchmark cases of the SDK hot paths. Each case prepares one operation per
+worker, so concurrent workers use separate sessions like concurrent requests do.
+"""
+
+import json
+import os
+import tempfile
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from logto import (
+    LogtoClient,
+    LogtoConfig,
+    MemorySessionStore,
+    SqliteSessionStore,
+    SyncStorageAdapter,
+)
+from logto.LogtoClient import SignInSession
+
+from . import fakes
+
+Operation = Callable[[], Awaitable[Any]]
+"""
+A single timed operation.
+"""
+
+
+class Context:
+    """
+    The fakes shared by the workers of one run.
+    """
+
+    def __init__(self) -> None:
+        self.transport = fakes.FakeTransport()
+        self.config = LogtoConfig(endpoint=fakes.endpoint, appId=fakes.appId)
+        self.sessionStore = MemorySessionStore()
+        self._directory = tempfile.TemporaryDirectory()
+        self._sqliteStore: Optional[SqliteSessionStore] = None
+
+    @property
+    def sqliteStore(self) -> SqliteSessionStore:
+        if self._sqliteStore is None:
+            self._sqliteStore = SqliteSessionStore(
+                os.path.join(self._directory.name, "sessions.db")
+            )
+        return self._sqliteStore
+
+    def createClient(self, worker: int) -> LogtoClient:
+        return LogtoClient(
+            self.config,
+            self.sessionStore.storage(f"session-{worker}"),
+            transport=self.transport,
+        )
+
+    def close(self) -> None:
+        if self._sqliteStore is not None:
+            self._sqliteStore.close()
+        self._directory.cleanup()
+
+
+Case = Callable[[Context, int], Awaitable[Operation]]
+"""
+A function that prepares the operation of a worker.
+"""
+
+redirectUri = "https://app.bench/callback"
+_state = "state"
+_signInSession = SignInSession(
+    redirectUri=redirectUri, codeVerifier="codeVerifier", state=_state
+).model_dump_json()
+_callbackUri = f"{redirectUri}?code=code&state={_state}"
+
+
+async def _signIn(context: Context, worker: int) -> Operation:
+    client = context.createClient(worker)
+
+    async def run() -> Any:
+        return await client.signIn(redirectUri)
+
+    return run
+
+
+async def _handleSignInCallback(context: Context, worker: int) -> Operation:
+    client = context.createClient(worker)
+    storage = context.sessionStore.storage(f"session-{worker}")
+
+    async def run() -> Any:
+        # Setting the sign-in session directly only costs a dictionary write
+        storage.set("signInSession", _signInSession)
+        return await client.handleSignInCallback(_callbackUri)
+
+    return run
+
+
+async def _signedInClient(context: Context, worker: int) -> LogtoClient:
+    client = context.createClient(worker)
+    storage = context.sessionStore.storage(f"session-{worker}")
+    storage.set("signInSession", _signInSession)
+    await client.handleSignInCallback(_callbackUri)
+    # Separate refresh tokens, so concurrent refreshes are not deduplicated
+    storage.set("refreshToken", f"refreshToken-{worker}")
+    return client
+
+
+async def _getAccessTokenCached(context: Context, worker: int) -> Operation:
+    client = await _signedInClient(context, worker)
+
+    async def run() -> Any:
+        return await client.getAccessToken()
+
+    return run
+
+
+async def _getAccessTokenRefresh(context: Context, worker: int) -> Operation:
+    client = await _signedInClient(context, worker)
+    storage = context.sessionStore.storage(f"session-{worker}")
+
+    async def run() -> Any:
+        storage.delete("accessTokenMap")
+        return await client.getAccessToken()
+
+    return run
+
+
+async def _getIdTokenClaims(context: Context, worker: int) -> Operation:
+    client = await _signedInClient(context, worker)
+
+    async def run() -> Any:
+        return client.getIdTokenClaims()
+
+    return run
+
+
+def _verifyIdToken(algorithm: str) -> Case:
+    async def prepare(context: Context, worker: int) -> Operation:
+        oidcCore = await context.createClient(worker).getOidcCore()
+        idToken = fakes.createIdToken(algorithm, f"user-{worker}")
+
+        async def run() -> Any:
+            return await oidcCore.verifyIdToken(idToken, fakes.appId)
+
+        return run
+
+    return prepare
+
+
+_accessTokenMap = json.dumps(
+    {"x": {"": {"token": "accessToken", "expiresAt": 9999999999}}}
+)
+
+
+async def _memoryStorage(context: Context, worker: int) -> Operation:
+    storage = context.sessionStore.storage(f"session-{worker}")
+
+    async def run() -> Any:
+        storage.set("accessTokenMap", _accessTokenMap)
+        return storage.get("accessTokenMap")
+
+    return run
+
+
+async def _sqliteStorage(context: Context, worker: int) -> Operation:
+    storage = context.sqliteStore.storage(f"session-{worker}")
+
+    async def run() -> Any:
+        storage.set("accessTokenMap", _accessTokenMap)
+        return storage.get("accessTokenMap")
+
+    return run
+
+
+async def _adapterStorage(context: Context, worker: int) -> Operation:
+    storage = SyncStorageAdapter(context.sessionStore.storage(f"session-{worker}"))
+
+    async def run() -> Any:
+        await storage.setMany(
+            {"accessTokenMap": _accessTokenMap, "refreshToken": "refreshToken"}
+        )
+        return await storage.getMany(["accessTokenMap", "refreshToken"])
+
+    return run
+
+
+cases: Dict[str, Case] = {
+    "signIn": _signIn,
+    "handleSignInCallback": _handleSignInCallback,
+    "getAccessToken.cached": _getAccessTokenCached,
+    "getAccessToken.refresh": _getAccessTokenRefresh,
+    "getIdTokenClaims": _getIdTokenClaims,
+    "verifyIdToken.RS256": _verifyIdToken("RS256"),
+    "verifyIdToken.ES256": _verifyIdToken("ES256"),
+    "storage.memory": _memoryStorage,
+    "storage.sqlite": _sqliteStorage,
+    "storage.adapter": _adapterStorage,
+}
+"""
+All benchmark cases by name.
+"""
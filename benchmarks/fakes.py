@@ -0,0 +1,102 @@
+"""
+The in-process fakes of the Logto endpoints for the benchmarks.
+"""
+
+import json
+import time
+from typing import Any, Dict
+
+import jwt
+
+from logto.HttpTransport import HttpResponse, HttpTransport
+from logto.models.oidc import OidcProviderMetadata
+from logto.utilities.test import createSigningKey
+
+endpoint = "https://logto.bench"
+appId = "bench-app"
+
+metadata = OidcProviderMetadata(
+    issuer=f"{endpoint}/oidc",
+    authorization_endpoint=f"{endpoint}/oidc/auth",
+    token_endpoint=f"{endpoint}/oidc/token",
+    userinfo_endpoint=f"{endpoint}/oidc/me",
+    jwks_uri=f"{endpoint}/oidc/jwks",
+    end_session_endpoint=f"{endpoint}/oidc/session/end",
+    response_types_supported=["code"],
+    subject_types_supported=["public"],
+    id_token_signing_alg_values_supported=["RS256", "ES256"],
+)
+
+_rsaKey, _rsaJwk = createSigningKey("rs256", "RS256")
+_ecKey, _ecJwk = createSigningKey("es256", "ES256")
+jwks = {"keys": [_rsaJwk, _ecJwk]}
+
+
+def signToken(claims: Dict[str, Any], algorithm: str = "ES256") -> str:
+    """
+    Sign the claims with the RS256 or ES256 key in the fake JWKS.
+    """
+    key, kid = (_rsaKey, "rs256") if algorithm == "RS256" else (_ecKey, "es256")
+    return jwt.encode(claims, key, algorithm=algorithm, headers={"kid": kid})
+
+
+def createIdToken(algorithm: str = "ES256", subject: str = "user") -> str:
+    now = int(time.time())
+    return signToken(
+        {
+            "iss": metadata.issuer,
+            "aud": appId,
+            "sub": subject,
+            "iat": now,
+            "exp": now + 3600,
+        },
+        algorithm,
+    )
+
+
+def createAccessToken(resource: str = "", subject: str = "user") -> str:
+    now = int(time.time())
+    return signToken(
+        {
+            "iss": metadata.issuer,
+            "aud": resource or appId,
+            "sub": subject,
+            "client_id": appId,
+            "scope": "read write",
+            "iat": now,
+            "exp": now + 3600,
+        }
+    )
+
+
+class FakeTransport(HttpTransport):
+    """
+    The transport that serves the discovery, JWKS and token endpoints in the process
+    with pre-signed tokens, and counts the requests.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.requests = 0
+        self._idToken = createIdToken()
+        self._accessToken = createAccessToken()
+        self._discovery = json.loads(metadata.model_dump_json())
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> HttpResponse:
+        self.requests += 1
+        if url.endswith("/.well-known/openid-configuration"):
+            return HttpResponse(200, {}, json=self._discovery)
+        if url == metadata.jwks_uri:
+            return HttpResponse(200, {}, json=jwks)
+        if url == metadata.token_endpoint:
+            data = kwargs.get("data", {})
+            tokenResponse: Dict[str, Any] = {
+                "access_token": self._accessToken,
+                "token_type": "Bearer",
+                "expires_in": 3600,
+                "refresh_token": data.get("refresh_token", "refreshToken"),
+            }
+            if data.get("grant_type") == "authorization_code":
+                tokenResponse["id_token"] = self._idToken
+            return HttpResponse(200, {}, json=tokenResponse)
+        return HttpResponse(404, {}, text="Not found")
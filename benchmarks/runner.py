@@ -0,0 +1,143 @@
+"""
+The runner that times the benchmark cases at the given concurrency levels, and
+compares the results with a baseline.
+"""
+
+import asyncio
+import platform
+import statistics
+import sys
+import time
+from importlib import metadata
+from typing import Any, Dict, List, Optional
+
+from .cases import Case, Context
+
+Result = Dict[str, Any]
+"""
+The result of a case at a concurrency level, see `run` for the fields.
+"""
+
+
+def _percentile(sortedLatencies: List[float], percentile: float) -> float:
+    index = min(len(sortedLatencies) - 1, int(len(sortedLatencies) * percentile))
+    return sortedLatencies[index]
+
+
+async def _runCase(
+    name: str, case: Case, concurrency: int, ops: int, warmup: int
+) -> Result:
+    context = Context()
+    try:
+        operations = await asyncio.gather(
+            *(case(context, worker) for worker in range(concurrency))
+        )
+        opsPerWorker = max(1, ops // concurrency)
+        latencies: List[float] = []
+
+        async def work(operation: Any, count: int, record: bool) -> None:
+            for _ in range(count):
+                start = time.perf_counter()
+                await operation()
+                if record:
+                    latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(
+            *(work(operation, warmup, False) for operation in operations)
+        )
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(work(operation, opsPerWorker, True) for operation in operations)
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        context.close()
+
+    latencies.sort()
+    return {
+        "name": name,
+        "concurrency": concurrency,
+        "ops": len(latencies),
+        "opsPerSec": round(len(latencies) / elapsed, 1),
+        "meanUs": round(statistics.fmean(latencies) * 1e6, 1),
+        "p50Us": round(_percentile(latencies, 0.5) * 1e6, 1),
+        "p95Us": round(_percentile(latencies, 0.95) * 1e6, 1),
+        "p99Us": round(_percentile(latencies, 0.99) * 1e6, 1),
+        "httpRequests": context.transport.requests,
+    }
+
+
+def run(
+    cases: Dict[str, Case],
+    concurrencies: List[int],
+    ops: int = 2000,
+    warmup: int = 5,
+) -> Dict[str, Any]:
+    """
+    Run each case at each concurrency level in a fresh event loop, and return the
+    machine-readable report.
+
+    At concurrency `n`, `n` workers run `ops / n` operations each, so every level
+    measures about the same number of operations. Each result has the throughput
+    (`opsPerSec`), the latency of single operations in microseconds (`meanUs`,
+    `p50Us`, `p95Us` and `p99Us`), and the number of requests to the fake server.
+    """
+    results: List[Result] = []
+    for name, case in cases.items():
+        for concurrency in concurrencies:
+            result = asyncio.run(_runCase(name, case, concurrency, ops, warmup))
+            results.append(result)
+            print(
+                f"{name:<28}{concurrency:>6}{result['opsPerSec']:>12.0f} ops/s"
+                f"{result['p50Us']:>10.1f} p50µs{result['p99Us']:>10.1f} p99µs",
+                file=sys.stderr,
+            )
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "sdk": _sdkVersion(),
+            "timestamp": int(time.time()),
+            "ops": ops,
+        },
+        "results": results,
+    }
+
+
+def _sdkVersion() -> Optional[str]:
+    try:
+        return metadata.version("logto")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def compare(
+    report: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.1
+) -> List[str]:
+    """
+    Compare the throughput of the report with the baseline, print the ratios, and
+    return the cases (as `name@concurrency`) that are slower than the baseline by
+    more than `threshold`. Cases missing in either report are skipped.
+    """
+    baselineResults = {
+        (result["name"], result["concurrency"]): result
+        for result in baseline["results"]
+    }
+    regressions: List[str] = []
+    for result in report["results"]:
+        key = (result["name"], result["concurrency"])
+        if key not in baselineResults:
+            continue
+
+        ratio = result["opsPerSec"] / baselineResults[key]["opsPerSec"]
+        label = f"{result['name']}@{result['concurrency']}"
+        regressed = ratio < 1 - threshold
+        print(
+            f"{label:<34}{ratio:>8.2f}x{'  REGRESSED' if regressed else ''}",
+            file=sys.stderr,
+        )
+        if regressed:
+            regressions.append(label)
+    return regressions
@@ -0,0 +1,157 @@
+"""
+The access token verifier for API resources (resource servers) protected by Logto.
+"""
+
+from typing import List, Optional
+
+import jwt
+from pydantic import ValidationError
+
+from .HttpTransport import HttpTransport
+from .JwksStore import JwksStore
+from .LogtoException import LogtoException
+from .models.oidc import AccessTokenClaims, OidcProviderMetadata
+from .OidcCore import OidcCore
+from .SharedCache import SharedCache
+from .Tracer import Tracer, noopTracer
+from .utilities.cache import VerifiedTokenCache
+
+
+class AccessTokenVerifier:
+    """
+    Verify the JWT access tokens issued by Logto for an API resource, including the
+    signature, issuer, audience, expiration and scopes.
+
+    The signing keys are fetched from `jwks_uri` once and kept in memory as parsed key
+    objects, so verifying a token only costs one signature check without any I/O.
+    Create one verifier per API resource and reuse it across requests.
+
+    Example:
+      ```python
+      verifier = await AccessTokenVerifier.create(
+          "https://foo.logto.app", audience="https://api.example.com"
+      )
+      claims = await verifier.verify(bearerToken, requiredScopes=["read:orders"])
+      ```
+    """
+
+    def __init__(
+        self,
+        metadata: OidcProviderMetadata,
+        audience: str,
+        transport: Optional[HttpTransport] = None,
+        jwksStore: Optional[JwksStore] = None,
+        leeway: int = 0,
+        cache: Optional[VerifiedTokenCache[AccessTokenClaims]] = None,
+        sharedCache: Optional[SharedCache] = None,
+        tracer: Optional[Tracer] = None,
+    ) -> None:
+        """
+        Args:
+            metadata: The provider metadata of the Logto tenant.
+            audience: The expected `aud` claim, usually the API resource indicator or
+                an organization URN.
+            transport: The transport for fetching the JWKS.
+            jwksStore: The JWKS store to reuse, a new one will be created for
+                `metadata.jwks_uri` if it's not provided.
+            leeway: The leeway (in seconds) for checking the time-based claims.
+            cache: The cache for the claims of verified tokens, a token that hits the
+                cache is not verified again until it expires (scopes are still
+                checked).
+            sharedCache: The cache for sharing the JWKS with other processes on the
+                host.
+            tracer: The tracer for the verifications and the JWKS requests.
+        """
+        self.metadata = metadata
+        self.audience = audience
+        self.tracer = tracer or noopTracer
+        self.jwksStore = jwksStore or JwksStore(
+            metadata.jwks_uri, transport, sharedCache=sharedCache, tracer=tracer
+        )
+        self.leeway = leeway
+        self.cache = cache
+
+    @classmethod
+    async def create(
+        cls,
+        endpoint: str,
+        audience: str,
+        transport: Optional[HttpTransport] = None,
+        leeway: int = 0,
+        cache: Optional[VerifiedTokenCache[AccessTokenClaims]] = None,
+        sharedCache: Optional[SharedCache] = None,
+        tracer: Optional[Tracer] = None,
+    ) -> "AccessTokenVerifier":
+        """
+        Create a verifier for the given Logto endpoint, the provider metadata will be
+        fetched from the discovery URL.
+        """
+        metadata = await OidcCore.getProviderMetadata(
+            f"{endpoint}/oidc/.well-known/openid-configuration",
+            transport,
+            sharedCache=sharedCache,
+            tracer=tracer,
+        )
+        return cls(
+            metadata,
+            audience,
+            transport,
+            leeway=leeway,
+            cache=cache,
+            sharedCache=sharedCache,
+            tracer=tracer,
+        )
+
+    async def verify(
+        self, accessToken: str, requiredScopes: Optional[List[str]] = None
+    ) -> AccessTokenClaims:
+        """
+        Verify the access token and return its claims, throw a `LogtoException` if the
+        verification fails or any of the required scopes is not granted.
+        """
+        with self.tracer.span(
+            "logto.verifyAccessToken", {"logto.audience": self.audience}
+        ) as span:
+            # The cache may be shared by the verifiers of other tenants and APIs
+            context = f"{self.metadata.issuer}\0{self.audience}"
+            if self.cache is not None:
+                cachedClaims = self.cache.get(accessToken, context)
+                span.setAttribute("logto.cache_hit", cachedClaims is not None)
+                if cachedClaims is not None:
+                    self.verifyScopes(cachedClaims, requiredScopes or [])
+                    return cachedClaims
+
+            try:
+                signingKey = await self.jwksStore.getSigningKeyFromJwt(accessToken)
+                claims = jwt.decode(
+                    accessToken,
+                    signingKey.key,
+                    algorithms=OidcCore.signingAlgorithms,
+                    audience=self.audience,
+                    issuer=self.metadata.issuer,
+                    leeway=self.leeway,
+                    options={"require": ["exp", "iss", "aud"]},
+                )
+                accessTokenClaims = AccessTokenClaims(**claims)
+            except jwt.PyJWTError as e:
+                raise LogtoException(f"Invalid access token: {e}") from e
+            except ValidationError as e:
+                raise LogtoException(f"Invalid access token claims: {e}") from e
+
+            if self.cache is not None:
+                self.cache.set(
+                    accessToken, accessTokenClaims, accessTokenClaims.exp, context
+                )
+            self.verifyScopes(accessTokenClaims, requiredScopes or [])
+            return accessTokenClaims
+
+    @staticmethod
+    def verifyScopes(claims: AccessTokenClaims, requiredScopes: List[str]) -> None:
+        """
+        Check that all the required scopes are granted by the `scope` claim.
+        """
+        missingScopes = set(requiredScopes).difference(claims.scope.split())
+        if missingScopes:
+            raise LogtoException(
+                f"Insufficient scopes: missing {' '.join(sorted(missingScopes))}"
+            )
@@ -0,0 +1,120 @@
+import time
+from typing import Any, Dict
+
+import jwt
+import pytest
+from pytest_mock import MockerFixture
+
+from . import LogtoException
+from .AccessTokenVerifier import AccessTokenVerifier
+from .HttpTransport import HttpResponse
+from .models.oidc import AccessTokenClaims
+from .utilities.cache import VerifiedTokenCache
+from .utilities.test import createSigningKey, mockProviderMetadata
+
+signingKey, publicJwk = createSigningKey("1")
+
+
+class TestAccessTokenVerifier:
+    @pytest.fixture
+    def verifier(self, mocker: MockerFixture) -> AccessTokenVerifier:
+        mocker.patch(
+            "logto.HttpTransport.HttpTransport.request",
+            return_value=HttpResponse(200, {}, json={"keys": [publicJwk]}),
+        )
+        return AccessTokenVerifier(mockProviderMetadata, "https://api.logto.app")
+
+    def sign(self, **claims: Any) -> str:
+        payload: Dict[str, Any] = {
+            "iss": "https://logto.app",
+            "aud": "https://api.logto.app",
+            "sub": "user1",
+            "iat": int(time.time()),
+            "exp": int(time.time()) + 3600,
+            "scope": "read write",
+            **claims,
+        }
+        # Omit the claims set to None
+        payload = {key: value for key, value in payload.items() if value is not None}
+        return jwt.encode(payload, signingKey, algorithm="RS256", headers={"kid": "1"})
+
+    async def test_verify(self, verifier: AccessTokenVerifier) -> None:
+        claims = await verifier.verify(self.sign(), requiredScopes=["read"])
+
+        assert isinstance(claims, AccessTokenClaims)
+        assert claims.sub == "user1"
+
+    async def test_verify_create(self, mocker: MockerFixture) -> None:
+        mocker.patch(
+            "logto.OidcCore.OidcCore.getProviderMetadata",
+            return_value=mockProviderMetadata,
+        )
+        verifier = await AccessTokenVerifier.create(
+            "https://logto.app", "https://api.logto.app"
+        )
+
+        assert verifier.metadata == mockProviderMetadata
+        assert verifier.jwksStore.jwksUri == mockProviderMetadata.jwks_uri
+
+    async def test_verify_invalidAudience(self, verifier: AccessTokenVerifier) -> None:
+        with pytest.raises(LogtoException, match="Audience"):
+            await verifier.verify(self.sign(aud="https://other.logto.app"))
+
+    async def test_verify_audienceList(self, verifier: AccessTokenVerifier) -> None:
+        audience = ["https://other.logto.app", "https://api.logto.app"]
+        claims = await verifier.verify(self.sign(aud=audience))
+
+        assert claims.aud == audience
+
+        with pytest.raises(LogtoException, match="Audience"):
+            await verifier.verify(self.sign(aud=["https://other.logto.app"]))
+
+    async def test_verify_missingScope(self, verifier: AccessTokenVerifier) -> None:
+        with pytest.raises(LogtoException, match="Invalid access token claims"):
+            await verifier.verify(self.sign(scope=None))
+
+    async def test_verify_invalidIssuer(self, verifier: AccessTokenVerifier) -> None:
+        with pytest.raises(LogtoException, match="issuer"):
+            await verifier.verify(self.sign(iss="https://other.logto.app"))
+
+    async def test_verify_expired(self, verifier: AccessTokenVerifier) -> None:
+        with pytest.raises(LogtoException, match="expired"):
+            await verifier.verify(self.sign(exp=int(time.time()) - 10))
+
+    async def test_verify_invalidSignature(self, verifier: AccessTokenVerifier) -> None:
+        otherKey, _ = createSigningKey("1")
+        token = jwt.encode(
+            {"iss": "https://logto.app", "aud": "https://api.logto.app"},
+            otherKey,
+            algorithm="RS256",
+            headers={"kid": "1"},
+        )
+        with pytest.raises(LogtoException, match="Signature"):
+            await verifier.verify(token)
+
+    async def test_verify_insufficientScopes(
+        self, verifier: AccessTokenVerifier
+    ) -> None:
+        with pytest.raises(LogtoException, match="missing admin"):
+            await verifier.verify(self.sign(), requiredScopes=["read", "admin"])
+
+    async def test_verify_cache(self, verifier: AccessTokenVerifier) -> None:
+        verifier.cache = VerifiedTokenCache()
+        token = self.sign()
+
+        assert await verifier.verify(token) == await verifier.verify(token)
+        assert (verifier.cache.hits, verifier.cache.misses) == (1, 1)
+
+        # Scopes are still checked for cached tokens
+        with pytest.raises(LogtoException, match="missing admin"):
+            await verifier.verify(token, requiredScopes=["admin"])
+
+        # The cache is shared with the verifier of another tenant
+        otherVerifier = AccessTokenVerifier(
+            mockProviderMetadata.model_copy(update={"issuer": "https://other.app"}),
+            "https://api.logto.app",
+            jwksStore=verifier.jwksStore,
+            cache=verifier.cache,
+        )
+        with pytest.raises(LogtoException, match="issuer"):
+            await otherVerifier.verify(token)
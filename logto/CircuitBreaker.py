@@ -0,0 +1,181 @@
+"""
+The circuit breaker for the requests to Logto, which fails fast while the Logto
+endpoint is down instead of waiting for every request to time out.
+"""
+
+import threading
+import time
+import urllib.parse
+from typing import Dict, Literal
+
+from .LogtoException import LogtoException
+
+CircuitState = Literal["closed", "open", "halfOpen"]
+
+
+class LogtoCircuitOpenException(LogtoException):
+    """
+    The exception raised when a request is rejected because the circuit to the host
+    is open. No request has been sent.
+    """
+
+    def __init__(self, host: str, retryAfter: float, grace: bool) -> None:
+        super().__init__(
+            f"The circuit to {host} is open, retry after {retryAfter:.1f} seconds"
+        )
+        self.host = host
+        self.retryAfter = retryAfter
+        """The time (in seconds) until the next probe is allowed."""
+        self.grace = grace
+        """Whether the outage is still in the grace period of the circuit breaker."""
+
+
+class _Circuit:
+    __slots__ = ("state", "failures", "openedAt", "outageStartedAt", "probes")
+
+    def __init__(self) -> None:
+        self.state: CircuitState = "closed"
+        self.failures = 0
+        self.openedAt = 0.0
+        self.outageStartedAt = 0.0
+        self.probes = 0
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker for each host, used by `HttpTransport` to reject the requests
+    to a host that keeps failing.
+
+    - While the circuit is closed, requests are sent as usual. After
+      `failureThreshold` consecutive failures (connection errors, timeouts or 5xx
+      responses), the circuit opens.
+    - While the circuit is open, requests fail immediately with
+      `LogtoCircuitOpenException`.
+    - After `resetTimeout` seconds, the circuit is half-open: up to
+      `halfOpenRequests` requests are sent as probes, and the others still fail
+      immediately. A successful probe closes the circuit, a failed one opens it
+      again.
+
+    If `gracePeriod` is set, the client keeps serving what it has cached during the
+    first `gracePeriod` seconds of an outage instead of failing: the provider
+    metadata (even if expired), the JWKS, and the access tokens that are past their
+    refresh time but not yet expired. The rejected requests are raised as usual once
+    the grace period is over.
+
+    Example:
+      ```python
+      transport = HttpTransport(
+          circuitBreaker=CircuitBreaker(failureThreshold=5, gracePeriod=300)
+      )
+      client = LogtoClient(config, storage, transport=transport)
+      ```
+    """
+
+    def __init__(
+        self,
+        failureThreshold: int = 5,
+        resetTimeout: float = 30,
+        halfOpenRequests: int = 1,
+        gracePeriod: float = 0,
+    ) -> None:
+        """
+        Args:
+            failureThreshold: The number of consecutive failures that opens the
+                circuit.
+            resetTimeout: The time (in seconds) the circuit stays open before probes
+                are allowed.
+            halfOpenRequests: The number of concurrent probes while the circuit is
+                half-open.
+            gracePeriod: The time (in seconds) since the circuit opened during which
+                cached metadata and tokens are served, 0 disables the grace mode.
+        """
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.halfOpenRequests = halfOpenRequests
+        self.gracePeriod = gracePeriod
+        self._circuits: Dict[str, _Circuit] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urllib.parse.urlsplit(url).netloc
+
+    def getState(self, url: str) -> CircuitState:
+        """
+        Get the state of the circuit to the host of the given URL.
+        """
+        circuit = self._circuits.get(self._host(url))
+        if circuit is None:
+            return "closed"
+        if (
+            circuit.state == "open"
+            and time.monotonic() - circuit.openedAt >= self.resetTimeout
+        ):
+            return "halfOpen"
+        return circuit.state
+
+    def acquire(self, url: str) -> bool:
+        """
+        Check whether a request to the host of the given URL is allowed, raise
+        `LogtoCircuitOpenException` if it's not. Returns whether the request is a
+        probe, which must be released by `onSuccess`, `onFailure` or `release`.
+        """
+        host = self._host(url)
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.state == "closed":
+                return False
+
+            now = time.monotonic()
+            if circuit.state == "open" and now - circuit.openedAt >= self.resetTimeout:
+                circuit.state = "halfOpen"
+            if circuit.state == "halfOpen" and circuit.probes < self.halfOpenRequests:
+                circuit.probes += 1
+                return True
+
+            raise LogtoCircuitOpenException(
+                host,
+                max(0.0, circuit.openedAt + self.resetTimeout - now),
+                now - circuit.outageStartedAt < self.gracePeriod,
+            )
+
+    def onSuccess(self, url: str, probe: bool = False) -> None:
+        """
+        Record a successful request, which closes the circuit.
+        """
+        host = self._host(url)
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is not None and (probe or circuit.state == "closed"):
+                del self._circuits[host]
+
+    def onFailure(self, url: str, probe: bool = False) -> None:
+        """
+        Record a failed request, which opens the circuit if it's a probe or the
+        failure threshold is reached.
+        """
+        host = self._host(url)
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None:
+                circuit = self._circuits[host] = _Circuit()
+
+            now = time.monotonic()
+            if probe and circuit.state != "closed":
+                circuit.probes -= 1
+                circuit.state = "open"
+                circuit.openedAt = now
+            elif circuit.state == "closed":
+                circuit.failures += 1
+                if circuit.failures >= self.failureThreshold:
+                    circuit.state = "open"
+                    circuit.openedAt = circuit.outageStartedAt = now
+
+    def release(self, url: str) -> None:
+        """
+        Release a probe that ended without a result (e.g. it was cancelled).
+        """
+        with self._lock:
+            circuit = self._circuits.get(self._host(url))
+            if circuit is not None and circuit.probes > 0:
+                circuit.probes -= 1
@@ -0,0 +1,75 @@
+from typing import Any
+
+import pytest
+from pytest_mock import MockerFixture
+
+from .CircuitBreaker import CircuitBreaker, LogtoCircuitOpenException
+
+url = "https://logto.app/oidc/token"
+
+
+@pytest.fixture
+def monotonic(mocker: MockerFixture) -> Any:
+    monotonic = mocker.patch("logto.CircuitBreaker.time").monotonic
+    monotonic.return_value = 1000.0
+    return monotonic
+
+
+class TestCircuitBreaker:
+    def test_opens(self, monotonic: Any) -> None:
+        breaker = CircuitBreaker(failureThreshold=3, resetTimeout=30)
+        breaker.onFailure(url)
+        breaker.onFailure(url)
+        breaker.onSuccess(url)
+        breaker.onFailure(url)
+        breaker.onFailure(url)
+        assert breaker.getState(url) == "closed"
+        assert breaker.acquire(url) is False
+
+        breaker.onFailure(url)
+        assert breaker.getState(url) == "open"
+        assert breaker.getState("https://other.app/oidc/token") == "closed"
+        monotonic.return_value += 10
+        with pytest.raises(LogtoCircuitOpenException) as e:
+            breaker.acquire("https://logto.app/oidc/jwks")
+        assert e.value.host == "logto.app"
+        assert e.value.retryAfter == 20
+        assert e.value.grace is False
+
+    def test_halfOpen(self, monotonic: Any) -> None:
+        breaker = CircuitBreaker(failureThreshold=1, resetTimeout=30)
+        breaker.onFailure(url)
+        monotonic.return_value += 30
+        assert breaker.getState(url) == "halfOpen"
+
+        assert breaker.acquire(url) is True
+        with pytest.raises(LogtoCircuitOpenException):
+            breaker.acquire(url)
+        breaker.onFailure(url, probe=True)
+        assert breaker.getState(url) == "open"
+
+        monotonic.return_value += 30
+        assert breaker.acquire(url) is True
+        breaker.release(url)
+        assert breaker.acquire(url) is True
+        breaker.onSuccess(url, probe=True)
+        assert breaker.getState(url) == "closed"
+
+    def test_gracePeriod(self, monotonic: Any) -> None:
+        breaker = CircuitBreaker(failureThreshold=1, resetTimeout=40, gracePeriod=60)
+        breaker.onFailure(url)
+        with pytest.raises(LogtoCircuitOpenException) as e:
+            breaker.acquire(url)
+        assert e.value.grace is True
+
+        # A failed probe doesn't extend the grace period
+        monotonic.return_value += 40
+        breaker.onFailure(url, probe=breaker.acquire(url))
+        monotonic.return_value += 19
+        with pytest.raises(LogtoCircuitOpenException) as e:
+            breaker.acquire(url)
+        assert e.value.grace is True
+        monotonic.return_value += 1
+        with pytest.raises(LogtoCircuitOpenException) as e:
+            breaker.acquire(url)
+        assert e.value.grace is False
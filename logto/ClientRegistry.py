@@ -0,0 +1,203 @@
+"""
+The registry of Logto clients for serving many Logto tenants and applications in one
+process.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+
+from .HttpTransport import HttpTransport
+from .LogtoClient import LogtoClient, LogtoConfig
+from .LogtoException import LogtoException
+from .models.oidc import IdTokenClaims
+from .OidcCore import OidcCore
+from .RefreshLock import RefreshLock
+from .RetryPolicy import RetryPolicies
+from .SharedCache import SharedCache
+from .Storage import AsyncStorage, Storage
+from .Timeouts import Timeouts
+from .TokenRefresher import TokenRefresher
+from .Tracer import Tracer
+from .utilities.cache import VerifiedTokenCache
+
+
+class _OidcCoreEntry:
+    __slots__ = ("oidcCore", "lastUsedAt")
+
+    def __init__(self, oidcCore: OidcCore, lastUsedAt: float) -> None:
+        self.oidcCore = oidcCore
+        self.lastUsedAt = lastUsedAt
+
+
+class ClientRegistry:
+    """
+    The registry of application configs keyed by (endpoint, app ID), which creates
+    clients that share the resources of their Logto endpoint: one `OidcCore` (with the
+    provider metadata and the JWKS store) per endpoint, and one transport (connection
+    pool), refresh lock, refresher, shared cache and tracer for all endpoints.
+
+    Since the cores bound the requests by the timeouts of the configs (see
+    `LogtoConfig.timeouts`), the applications of an endpoint with different timeouts
+    get one core per distinct timeouts. The requests of all cores are retried by the
+    given retry policies, or the process-wide `defaultRetryPolicies`.
+
+    The OIDC cores are kept for at most `maxEndpoints` endpoints, and the ones not used
+    for `idleTimeout` seconds are evicted, so rarely used tenants don't hold memory;
+    an evicted core is created again on the next use.
+
+    Example:
+      ```python
+      registry = ClientRegistry(transport=HttpTransport())
+      registry.register(LogtoConfig(endpoint="https://foo.logto.app", appId="app1"))
+
+      client = await registry.getClient("https://foo.logto.app", "app1", storage)
+      ```
+    """
+
+    def __init__(
+        self,
+        transport: Optional[HttpTransport] = None,
+        maxEndpoints: int = 1000,
+        idleTimeout: float = 3600,
+        refreshLock: Optional[RefreshLock] = None,
+        refresher: Optional[TokenRefresher] = None,
+        sharedCache: Optional[SharedCache] = None,
+        verificationCache: Optional[VerifiedTokenCache[IdTokenClaims]] = None,
+        tracer: Optional[Tracer] = None,
+        retryPolicies: Optional[RetryPolicies] = None,
+    ) -> None:
+        self.transport = transport
+        self.maxEndpoints = maxEndpoints
+        self.idleTimeout = idleTimeout
+        self.refreshLock = refreshLock
+        self.refresher = refresher
+        self.sharedCache = sharedCache
+        self.verificationCache = verificationCache
+        self.tracer = tracer
+        self.retryPolicies = retryPolicies
+        self._configs: Dict[Tuple[str, str], LogtoConfig] = {}
+        self._oidcCores: "OrderedDict[Tuple[str, str], _OidcCoreEntry]" = OrderedDict()
+        self._creating: "Dict[Tuple[str, str], asyncio.Task[OidcCore]]" = {}
+
+    def __len__(self) -> int:
+        """
+        The number of cached OIDC cores.
+        """
+        return len(self._oidcCores)
+
+    def register(self, config: LogtoConfig) -> None:
+        """
+        Register the config of an application, replacing the existing one with the same
+        endpoint and app ID.
+        """
+        self._configs[(config.endpoint, config.appId)] = config
+
+    def unregister(self, endpoint: str, appId: str) -> None:
+        """
+        Remove the config of an application.
+        """
+        self._configs.pop((endpoint, appId), None)
+
+    async def getClient(
+        self,
+        endpoint: str,
+        appId: str,
+        storage: Union[Storage, AsyncStorage],
+    ) -> LogtoClient:
+        """
+        Create a client of the registered application for the given storage (session).
+        Clients are cheap to create, since the OIDC core is shared.
+        """
+        config = self._configs.get((endpoint, appId))
+        if config is None:
+            raise LogtoException(f"Application '{appId}' of '{endpoint}' not found")
+
+        return LogtoClient(
+            config,
+            storage,
+            transport=self.transport,
+            refreshLock=self.refreshLock,
+            refresher=self.refresher,
+            sharedCache=self.sharedCache,
+            oidcCore=await self.getOidcCore(endpoint, config.timeouts),
+            tracer=self.tracer,
+        )
+
+    async def getOidcCore(
+        self, endpoint: str, timeouts: Optional[Timeouts] = None
+    ) -> OidcCore:
+        """
+        Get the shared OIDC core of the endpoint with the given timeouts (the default
+        `Timeouts` if they're not provided), concurrent calls for a new core share one
+        creation.
+        """
+        timeouts = timeouts or Timeouts()
+        key = (endpoint, timeouts.model_dump_json())
+        now = time.monotonic()
+        self._evictIdle(now)
+        entry = self._oidcCores.get(key)
+        if entry is not None:
+            entry.lastUsedAt = now
+            self._oidcCores.move_to_end(key)
+            return entry.oidcCore
+
+        loop = asyncio.get_running_loop()
+        task = self._creating.get(key)
+        if task is None or task.get_loop() is not loop:
+            task = self._creating[key] = loop.create_task(
+                self._createOidcCore(key, timeouts)
+            )
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done() and self._creating.get(key) is task:
+                del self._creating[key]
+
+    def evictIdle(self) -> int:
+        """
+        Evict the OIDC cores that have been idle for `idleTimeout` seconds, and return
+        the number of evicted cores.
+        """
+        return self._evictIdle(time.monotonic(), len(self._oidcCores))
+
+    async def _createOidcCore(
+        self, key: Tuple[str, str], timeouts: Timeouts
+    ) -> OidcCore:
+        endpoint, _ = key
+        oidcCore = OidcCore(
+            await OidcCore.getProviderMetadata(
+                f"{endpoint}/oidc/.well-known/openid-configuration",
+                self.transport,
+                sharedCache=self.sharedCache,
+                tracer=self.tracer,
+                retryPolicy=(
+                    self.retryPolicies.discovery if self.retryPolicies else None
+                ),
+                timeout=timeouts.discovery,
+            ),
+            self.transport,
+            verificationCache=self.verificationCache,
+            sharedCache=self.sharedCache,
+            tracer=self.tracer,
+            retryPolicies=self.retryPolicies,
+            timeouts=timeouts,
+        )
+        self._oidcCores[key] = _OidcCoreEntry(oidcCore, time.monotonic())
+        while len(self._oidcCores) > self.maxEndpoints:
+            self._oidcCores.popitem(last=False)
+        return oidcCore
+
+    def _evictIdle(self, now: float, limit: int = 2) -> int:
+        """
+        Evict up to `limit` idle OIDC cores from the least recently used end.
+        """
+        evicted = 0
+        while evicted < limit and self._oidcCores:
+            entry = next(iter(self._oidcCores.values()))
+            if now - entry.lastUsedAt < self.idleTimeout:
+                break
+            self._oidcCores.popitem(last=False)
+            evicted += 1
+        return evicted
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from pytest_mock import MockerFixture
+
+from . import LogtoConfig, LogtoException
+from .ClientRegistry import ClientRegistry
+from .OidcCore import OidcCore
+from .RetryPolicy import RetryPolicies, noRetry
+from .Storage import MemoryStorage
+from .Timeouts import Timeout, Timeouts
+from .utilities.test import mockProviderMetadata
+
+
+class TestClientRegistry:
+    @pytest.fixture
+    def registry(self, mocker: MockerFixture) -> ClientRegistry:
+        mocker.patch(
+            "logto.OidcCore.OidcCore.getProviderMetadata",
+            return_value=mockProviderMetadata,
+        )
+        registry = ClientRegistry()
+        for endpoint in ("https://a.logto.app", "https://b.logto.app"):
+            for appId in ("app1", "app2"):
+                registry.register(LogtoConfig(endpoint=endpoint, appId=appId))
+        return registry
+
+    async def test_getClient(self, registry: ClientRegistry) -> None:
+        client1 = await registry.getClient(
+            "https://a.logto.app", "app1", MemoryStorage()
+        )
+        client2 = await registry.getClient(
+            "https://a.logto.app", "app2", MemoryStorage()
+        )
+        client3 = await registry.getClient(
+            "https://b.logto.app", "app1", MemoryStorage()
+        )
+
+        assert client1.config.appId == "app1"
+        assert client2.config.appId == "app2"
+        assert await client1.getOidcCore() is await client2.getOidcCore()
+        assert await client1.getOidcCore() is not await client3.getOidcCore()
+        assert OidcCore.getProviderMetadata.call_count == 2  # type: ignore
+
+    async def test_getClient_timeouts(self, registry: ClientRegistry) -> None:
+        timeouts = Timeouts(refreshToken=Timeout(total=3))
+        registry.retryPolicies = RetryPolicies(refreshToken=noRetry)
+        registry.register(
+            LogtoConfig(endpoint="https://a.logto.app", appId="app3", timeouts=timeouts)
+        )
+        client1 = await registry.getClient(
+            "https://a.logto.app", "app1", MemoryStorage()
+        )
+        client3 = await registry.getClient(
+            "https://a.logto.app", "app3", MemoryStorage()
+        )
+
+        oidcCore = await client3.getOidcCore()
+        assert oidcCore is not await client1.getOidcCore()
+        assert oidcCore.timeouts == timeouts
+        assert oidcCore.jwksStore.timeout == timeouts.jwks
+        assert oidcCore.retryPolicies.refreshToken is noRetry
+        assert (await client1.getOidcCore()).timeouts == Timeouts()
+
+    async def test_getClient_notFound(self, registry: ClientRegistry) -> None:
+        registry.unregister("https://a.logto.app", "app1")
+
+        with pytest.raises(LogtoException, match="Application 'app1'"):
+            await registry.getClient("https://a.logto.app", "app1", MemoryStorage())
+
+    async def test_getOidcCore_concurrent(self, registry: ClientRegistry) -> None:
+        oidcCores = await asyncio.gather(
+            *(registry.getOidcCore("https://a.logto.app") for _ in range(100))
+        )
+
+        assert all(oidcCore is oidcCores[0] for oidcCore in oidcCores)
+        assert OidcCore.getProviderMetadata.call_count == 1  # type: ignore
+
+    async def test_maxEndpoints(self, registry: ClientRegistry) -> None:
+        registry.maxEndpoints = 1
+        oidcCore = await registry.getOidcCore("https://a.logto.app")
+        await registry.getOidcCore("https://b.logto.app")
+
+        assert len(registry) == 1
+        assert await registry.getOidcCore("https://a.logto.app") is not oidcCore
+
+    async def test_evictIdle(
+        self, registry: ClientRegistry, mocker: MockerFixture
+    ) -> None:
+        now = mocker.patch("logto.ClientRegistry.time").monotonic
+        now.return_value = 1000
+        registry.idleTimeout = 60
+        await registry.getOidcCore("https://a.logto.app")
+        now.return_value = 1030
+        await registry.getOidcCore("https://b.logto.app")
+
+        now.return_value = 1060
+        assert registry.evictIdle() == 1
+        assert len(registry) == 1
@@ -0,0 +1,221 @@
+"""
+The shared HTTP transport for the Logto client. A transport keeps a pooled
+`aiohttp.ClientSession` alive, so TCP and TLS connections to the Logto endpoint are
+reused across requests instead of being re-established for every call.
+"""
+
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, Literal, Mapping, Optional
+
+import aiohttp
+
+from .CircuitBreaker import CircuitBreaker
+
+HttpMethod = Literal["get", "post"]
+"""
+The HTTP methods used by the Logto client.
+"""
+
+
+class HttpResponse:
+    """
+    A fully-read HTTP response. The body is parsed as JSON when the status is 200,
+    otherwise it is kept as text so it can be used in error messages.
+    """
+
+    def __init__(
+        self,
+        status: int,
+        headers: Mapping[str, str],
+        json: Any = None,
+        text: Optional[str] = None,
+    ) -> None:
+        self.status = status
+        self.headers = headers
+        self.json = json
+        self.text = text
+
+
+class HttpTransport:
+    """
+    A long-lived HTTP transport with keep-alive connection pooling and DNS caching.
+    It can be shared by multiple `OidcCore` and `LogtoClient` instances.
+
+    One `aiohttp.ClientSession` is created lazily for each running event loop, since
+    aiohttp sessions cannot be used across event loops. Connections are therefore only
+    reused within a long-lived event loop (e.g. an ASGI server). If each request runs
+    on a fresh event loop (e.g. Flask async views), the session is closed when that
+    loop shuts down, which behaves like a session per request.
+
+    Example:
+      ```python
+      async with HttpTransport(limitPerHost=20) as transport:
+          client = LogtoClient(config, storage, transport=transport)
+          ...
+      ```
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limitPerHost: int = 0,
+        dnsCacheTtl: Optional[int] = 300,
+        keepaliveTimeout: float = 30,
+        headers: Optional[Dict[str, str]] = None,
+        circuitBreaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        """
+        Args:
+            limit: The total number of simultaneous connections, 0 means no limit.
+            limitPerHost: The number of simultaneous connections to the same host,
+                0 means no limit.
+            dnsCacheTtl: The time (in seconds) to cache DNS lookups, `None` caches
+                them forever.
+            keepaliveTimeout: The time (in seconds) to keep an idle connection open.
+            headers: Extra headers to send with every request.
+            circuitBreaker: The circuit breaker to reject the requests to a host
+                that keeps failing, no circuit breaker is used if it's not provided.
+        """
+        self.limit = limit
+        self.limitPerHost = limitPerHost
+        self.dnsCacheTtl = dnsCacheTtl
+        self.keepaliveTimeout = keepaliveTimeout
+        self.headers = {"user-agent": "@logto/python", **(headers or {})}
+        self.circuitBreaker = circuitBreaker
+        self._sessions: Dict[asyncio.AbstractEventLoop, _LoopSession] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        The pooled session for the running event loop. It will be created on first
+        use, and re-created if it has been closed.
+        """
+        loop = asyncio.get_running_loop()
+        loopSession = self._sessions.get(loop)
+        if loopSession is not None and not loopSession.session.closed:
+            return loopSession.session
+
+        with self._lock:
+            loopSession = self._sessions.get(loop)
+            if loopSession is None or loopSession.session.closed:
+                # Drop the sessions of event loops that have been shut down, they
+                # have been closed by `_closeOnShutdown`
+                for staleLoop in [key for key in self._sessions if key.is_closed()]:
+                    del self._sessions[staleLoop]
+
+                loopSession = _LoopSession(
+                    aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(
+                            limit=self.limit,
+                            limit_per_host=self.limitPerHost,
+                            ttl_dns_cache=self.dnsCacheTtl,
+                            use_dns_cache=True,
+                            keepalive_timeout=self.keepaliveTimeout,
+                        ),
+                        headers=self.headers,
+                    )
+                )
+                self._sessions[loop] = loopSession
+            return loopSession.session
+
+    async def request(
+        self, method: HttpMethod, url: str, **kwargs: Any
+    ) -> HttpResponse:
+        """
+        Send a request with the pooled session and read the whole response. Keyword
+        arguments are passed to the corresponding `aiohttp.ClientSession` method.
+
+        If the transport has a circuit breaker, `LogtoCircuitOpenException` is raised
+        without sending the request while the circuit to the host is open.
+        """
+        if self.circuitBreaker is None:
+            return await self._send(method, url, **kwargs)
+
+        circuitBreaker = self.circuitBreaker
+        probe = circuitBreaker.acquire(url)
+        try:
+            resp = await self._send(method, url, **kwargs)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            circuitBreaker.onFailure(url, probe)
+            raise
+        except BaseException:
+            if probe:
+                circuitBreaker.release(url)
+            raise
+        if resp.status >= 500:
+            circuitBreaker.onFailure(url, probe)
+        else:
+            circuitBreaker.onSuccess(url, probe)
+        return resp
+
+    async def _send(self, method: HttpMethod, url: str, **kwargs: Any) -> HttpResponse:
+        async with getattr(self.session, method)(url, **kwargs) as resp:
+            if resp.status == 200:
+                return HttpResponse(resp.status, resp.headers, json=await resp.json())
+            return HttpResponse(resp.status, resp.headers, text=await resp.text())
+
+    async def aclose(self) -> None:
+        """
+        Close the sessions and release their connections. The session of another
+        running event loop is closed in that loop; the session of an event loop that
+        is not running is kept, and will be closed when that loop shuts down.
+        """
+        currentLoop = asyncio.get_running_loop()
+        with self._lock:
+            sessions = list(self._sessions.items())
+            for loop, _ in sessions:
+                if loop is currentLoop or loop.is_running() or loop.is_closed():
+                    del self._sessions[loop]
+
+        for loop, loopSession in sessions:
+            if loopSession.session.closed:
+                continue
+            if loop is currentLoop:
+                await loopSession.session.close()
+            elif loop.is_running():
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(loopSession.session.close(), loop)
+                )
+
+    async def __aenter__(self) -> "HttpTransport":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.aclose()
+
+
+class _LoopSession:
+    """
+    A session bound to the running event loop, which will be closed when the loop
+    shuts down.
+
+    The session is closed by an async generator: event loops finalize pending async
+    generators on shutdown (`asyncio.run` does it via `loop.shutdown_asyncgens()`),
+    so the session can be closed in its own loop before the loop is closed.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession) -> None:
+        self.session = session
+        self._closer = _closeOnShutdown(session)
+        try:
+            # Run to the first `yield` so the generator is registered to the loop
+            self._closer.asend(None).send(None)
+        except StopIteration:
+            pass
+
+
+async def _closeOnShutdown(session: aiohttp.ClientSession) -> AsyncIterator[None]:
+    try:
+        yield
+    finally:
+        if not session.closed:
+            await session.close()
+
+
+defaultTransport = HttpTransport()
+"""
+The process-wide transport used when no transport is given to `OidcCore` or
+`LogtoClient`.
+"""
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import warnings
+from typing import List
+
+import aiohttp
+import pytest
+from pytest_mock import MockerFixture
+
+from .CircuitBreaker import CircuitBreaker, LogtoCircuitOpenException
+from .HttpTransport import HttpTransport
+from .LogtoException import LogtoException
+from .OidcCore import OidcCore
+from .utilities.test import FakeLogtoServer, mockHttp
+
+
+class TestHttpTransport:
+    async def test_session_reused(self) -> None:
+        async with HttpTransport() as transport:
+            assert transport.session is transport.session
+
+    async def test_session_connectorOptions(self) -> None:
+        async with HttpTransport(limit=10, limitPerHost=5) as transport:
+            connector = transport.session.connector
+            assert connector is not None
+            assert connector.limit == 10
+            assert connector.limit_per_host == 5
+
+    async def test_aclose(self) -> None:
+        transport = HttpTransport()
+        session = transport.session
+        await transport.aclose()
+
+        assert session.closed
+        assert transport.session is not session
+        await transport.aclose()
+
+    def test_session_closedWithLoop(self) -> None:
+        transport = HttpTransport()
+        sessions: List[aiohttp.ClientSession] = []
+
+        async def useSession() -> None:
+            sessions.append(transport.session)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", ResourceWarning)
+            asyncio.run(useSession())
+            asyncio.run(useSession())
+
+        assert len(sessions) == 2
+        assert sessions[0] is not sessions[1]
+        assert all(session.closed for session in sessions)
+
+    async def test_aclose_otherLoop(self) -> None:
+        transport = HttpTransport()
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+
+        async def getSession() -> aiohttp.ClientSession:
+            return transport.session
+
+        try:
+            session = await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(getSession(), loop)
+            )
+            await transport.aclose()
+            assert session.closed
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    async def test_request(self, mocker: MockerFixture) -> None:
+        mockHttp(mocker, "get", {"foo": "bar"}, None)
+        async with HttpTransport() as transport:
+            resp = await transport.request("get", "https://logto.app")
+
+        assert resp.status == 200
+        assert resp.json == {"foo": "bar"}
+        assert resp.text is None
+
+    async def test_request_failure(self, mocker: MockerFixture) -> None:
+        mockHttp(mocker, "post", None, "error", 400)
+        async with HttpTransport() as transport:
+            resp = await transport.request("post", "https://logto.app")
+
+        assert resp.status == 400
+        assert resp.json is None
+        assert resp.text == "error"
+
+    async def test_circuitBreaker(self, mocker: MockerFixture) -> None:
+        monotonic = mocker.patch("logto.CircuitBreaker.time").monotonic
+        monotonic.return_value = 1000.0
+        breaker = CircuitBreaker(failureThreshold=2, resetTimeout=30)
+        async with HttpTransport(circuitBreaker=breaker) as transport, FakeLogtoServer(
+            errorRate=1
+        ) as server:
+            jwksUri = server.metadata.jwks_uri
+            assert (await transport.request("get", jwksUri)).status == 503
+            assert (await transport.request("get", jwksUri)).status == 503
+            with pytest.raises(LogtoCircuitOpenException):
+                await transport.request("get", jwksUri)
+            assert server.requests["/oidc/jwks"] == 2
+
+            server.errorRate = 0
+            monotonic.return_value += 30
+            assert (await transport.request("get", jwksUri)).status == 200
+            assert breaker.getState(jwksUri) == "closed"
+
+    async def test_circuitBreaker_connectionErrors(self, mocker: MockerFixture) -> None:
+        mocker.patch("logto.RetryPolicy.random").uniform.return_value = 0
+        breaker = CircuitBreaker(failureThreshold=1)
+        async with FakeLogtoServer() as server:
+            endpoint = server.endpoint
+        async with HttpTransport(circuitBreaker=breaker) as transport:
+            with pytest.raises(LogtoException) as e:
+                await OidcCore.getProviderMetadata(
+                    f"{endpoint}/oidc/.well-known/openid-configuration", transport
+                )
+            # The retries are rejected by the open circuit
+            assert isinstance(e.value, LogtoCircuitOpenException)
@@ -0,0 +1,158 @@
+"""
+The asynchronous JSON Web Key Set (JWKS) store for verifying JWT signatures.
+"""
+
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+
+import jwt
+from jwt import PyJWK, PyJWKSet
+from jwt.exceptions import PyJWKSetError
+
+from .HttpTransport import HttpTransport, defaultTransport
+from .LogtoException import LogtoException
+from .RetryPolicy import RetryPolicy, defaultRetryPolicies
+from .SharedCache import SharedCache
+from .Timeouts import Timeout, createSharedTask, toClientTimeout
+from .Tracer import Tracer, noopTracer, tracedRequest
+
+
+class JwksStore:
+    """
+    Fetch the JWKS from the given URI with the async transport, and keep the parsed
+    public keys in memory by key ID (`kid`).
+
+    The JWKS is only fetched again when a token is signed by an unknown key (e.g. the
+    keys have been rotated), and no more than once per `minRefreshInterval` seconds,
+    so tokens with bogus key IDs can't make the store flood the JWKS endpoint. The
+    interval counts from the last attempt, so a failed fetch is not retried either
+    until it passes, and the lookups of unknown keys fail with the cached error.
+    Concurrent lookups share one fetch.
+
+    If a `SharedCache` is given, the fetched JWKS is shared with other processes on
+    the host for `minRefreshInterval` seconds, so only one of them fetches it.
+
+    The JWKS requests are traced by the given `Tracer` (if any), and retried by the
+    given retry policy, or `defaultRetryPolicies.jwks` if it's not provided. Each
+    attempt is bounded by the given timeout, or the default `Timeout`.
+    """
+
+    def __init__(
+        self,
+        jwksUri: str,
+        transport: Optional[HttpTransport] = None,
+        minRefreshInterval: float = 60,
+        sharedCache: Optional[SharedCache] = None,
+        tracer: Optional[Tracer] = None,
+        retryPolicy: Optional[RetryPolicy] = None,
+        timeout: Optional[Timeout] = None,
+    ) -> None:
+        self.jwksUri = jwksUri
+        self.transport = transport or defaultTransport
+        self.minRefreshInterval = minRefreshInterval
+        self.sharedCache = sharedCache
+        self.tracer = tracer or noopTracer
+        self.retryPolicy = retryPolicy
+        self.timeout = timeout or Timeout()
+        self._keys: Dict[str, PyJWK] = {}
+        self._fetchedAt: Optional[float] = None
+        self._error: Optional[Exception] = None
+        self._fetching: "Optional[asyncio.Task[None]]" = None
+
+    async def getSigningKey(self, kid: str) -> PyJWK:
+        """
+        Get the signing key for the given key ID, fetch the JWKS if the key is unknown
+        and the store is allowed to refresh.
+        """
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+
+        if (
+            self._fetchedAt is None
+            or time.monotonic() - self._fetchedAt >= self.minRefreshInterval
+            or self._isFetching()
+        ):
+            await self.refresh()
+        elif self._error is not None:
+            raise LogtoException(
+                f"Unable to find a signing key that matches '{kid}', the last JWKS fetch failed: {self._error}"
+            ) from self._error
+
+        key = self._keys.get(kid)
+        if key is None:
+            raise LogtoException(f"Unable to find a signing key that matches '{kid}'")
+        return key
+
+    async def getSigningKeyFromJwt(self, token: str) -> PyJWK:
+        """
+        Get the signing key for the given JWT by the `kid` in its header.
+        """
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is None:
+            raise LogtoException("The `kid` is missing in the JWT header")
+        return await self.getSigningKey(kid)
+
+    async def refresh(self) -> None:
+        """
+        Fetch the JWKS and replace the stored keys. Concurrent calls in the same event
+        loop share one request.
+        """
+        loop = asyncio.get_running_loop()
+        if self._fetching is None or self._fetching.get_loop() is not loop:
+            self._fetching = createSharedTask(self._fetch())
+        task = self._fetching
+        try:
+            await asyncio.shield(task)
+        finally:
+            if task.done() and self._fetching is task:
+                self._fetching = None
+
+    def _isFetching(self) -> bool:
+        return self._fetching is not None and not self._fetching.done()
+
+    async def _download(self) -> bytes:
+        resp = await (self.retryPolicy or defaultRetryPolicies.jwks).run(
+            lambda: tracedRequest(
+                self.tracer,
+                self.transport,
+                "jwks",
+                "get",
+                self.jwksUri,
+                timeout=toClientTimeout(self.timeout),
+            )
+        )
+        if resp.status != 200:
+            raise LogtoException(resp.text)
+        return json.dumps(resp.json).encode()
+
+    async def _fetch(self) -> None:
+        try:
+            await self._load()
+            self._error = None
+        except Exception as e:
+            self._error = e
+            raise
+        finally:
+            self._fetchedAt = time.monotonic()
+
+    async def _load(self) -> None:
+        if self.sharedCache is None:
+            jwks = await self._download()
+        else:
+            jwks = await self.sharedCache.getOrLoad(
+                f"jwks:{self.jwksUri}", self._download, self.minRefreshInterval
+            )
+
+        try:
+            keySet = PyJWKSet.from_dict(json.loads(jwks))
+        except PyJWKSetError as e:
+            raise LogtoException(f"Invalid JWKS: {e}") from e
+
+        self._keys = {
+            key.key_id: key
+            for key in keySet.keys
+            if key.key_id is not None and key.public_key_use in (None, "sig")
+        }
@@ -0,0 +1,117 @@
+import asyncio
+from pathlib import Path
+
+import jwt
+import pytest
+from pytest_mock import MockerFixture
+
+from . import LogtoException
+from .HttpTransport import HttpResponse
+from .JwksStore import JwksStore
+from .SharedCache import SharedCache
+from .utilities.test import createSigningKey
+
+
+class TestJwksStore:
+    @pytest.fixture
+    def store(self) -> JwksStore:
+        return JwksStore("https://logto.app/oidc/jwks")
+
+    def mockJwks(self, mocker: MockerFixture, *kids: str):
+        return mocker.patch(
+            "logto.HttpTransport.HttpTransport.request",
+            return_value=HttpResponse(
+                200,
+                {},
+                json={"keys": [createSigningKey(kid, "ES256")[1] for kid in kids]},
+            ),
+        )
+
+    async def test_getSigningKey(self, store: JwksStore, mocker: MockerFixture) -> None:
+        request = self.mockJwks(mocker, "1", "2")
+
+        assert (await store.getSigningKey("1")).key_id == "1"
+        assert (await store.getSigningKey("2")).key_id == "2"
+        assert request.call_count == 1
+
+    async def test_getSigningKey_concurrent(
+        self, store: JwksStore, mocker: MockerFixture
+    ) -> None:
+        request = self.mockJwks(mocker, "1")
+
+        keys = await asyncio.gather(*(store.getSigningKey("1") for _ in range(100)))
+
+        assert all(key.key_id == "1" for key in keys)
+        assert request.call_count == 1
+
+    async def test_getSigningKey_unknownKid(
+        self, store: JwksStore, mocker: MockerFixture
+    ) -> None:
+        request = self.mockJwks(mocker, "1")
+        await store.getSigningKey("1")
+
+        # Rate limited, no refetch within `minRefreshInterval`
+        with pytest.raises(LogtoException, match="'2'"):
+            await store.getSigningKey("2")
+        assert request.call_count == 1
+
+        # Keys rotated
+        store.minRefreshInterval = 0
+        request = self.mockJwks(mocker, "2")
+        assert (await store.getSigningKey("2")).key_id == "2"
+        assert request.call_count == 1
+
+    async def test_getSigningKey_failure(
+        self, store: JwksStore, mocker: MockerFixture
+    ) -> None:
+        mocker.patch(
+            "logto.HttpTransport.HttpTransport.request",
+            return_value=HttpResponse(500, {}, text="error"),
+        )
+        with pytest.raises(LogtoException, match="error"):
+            await store.getSigningKey("1")
+
+    async def test_getSigningKey_failure_rateLimited(
+        self, store: JwksStore, mocker: MockerFixture
+    ) -> None:
+        monotonic = mocker.patch("logto.JwksStore.time").monotonic
+        monotonic.return_value = 1000.0
+        request = mocker.patch(
+            "logto.HttpTransport.HttpTransport.request",
+            return_value=HttpResponse(400, {}, text="error"),
+        )
+        with pytest.raises(LogtoException, match="error"):
+            await store.getSigningKey("1")
+        assert request.call_count == 1
+
+        # The failed fetch is not retried within `minRefreshInterval`
+        monotonic.return_value += 59
+        with pytest.raises(LogtoException, match="the last JWKS fetch failed: error"):
+            await store.getSigningKey("1")
+        assert request.call_count == 1
+
+        monotonic.return_value += 1
+        request = self.mockJwks(mocker, "1")
+        assert (await store.getSigningKey("1")).key_id == "1"
+        assert request.call_count == 1
+
+    async def test_getSigningKeyFromJwt(
+        self, store: JwksStore, mocker: MockerFixture
+    ) -> None:
+        self.mockJwks(mocker, "1")
+        token = jwt.encode({"sub": "user1"}, "secret", headers={"kid": "1"})
+
+        assert (await store.getSigningKeyFromJwt(token)).key_id == "1"
+
+        with pytest.raises(LogtoException, match="kid"):
+            await store.getSigningKeyFromJwt(jwt.encode({"sub": "user1"}, "secret"))
+
+    async def test_sharedCache(self, mocker: MockerFixture, tmp_path: Path) -> None:
+        request = self.mockJwks(mocker, "1")
+        sharedCache = SharedCache(str(tmp_path))
+        store1 = JwksStore("https://logto.app/oidc/jwks", sharedCache=sharedCache)
+        store2 = JwksStore("https://logto.app/oidc/jwks", sharedCache=sharedCache)
+
+        assert (await store1.getSigningKey("1")).key_id == "1"
+        assert (await store2.getSigningKey("1")).key_id == "1"
+        assert request.call_count == 1
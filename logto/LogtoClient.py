@@ -2,12 +2,31 @@
 The Logto client class and the related models.
 """
 
+import asyncio
+import hashlib
 import time
 import urllib.parse
-from typing import Dict, List, Literal, Optional, Union
+import warnings
+import weakref
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
 
+import jwt
 from pydantic import BaseModel
 
+from .CircuitBreaker import LogtoCircuitOpenException
+from .HttpTransport import HttpTransport
 from .LogtoException import LogtoException
 from .models.oidc import (
     DirectSignInOption,
@@ -24,8 +43,24 @@ from .OidcCore import (
     TokenResponse,
     UserInfoResponse,
 )
-from .Storage import MemoryStorage, Storage
-from .utilities import OrganizationUrnPrefix, buildOrganizationUrn, removeFalsyKeys
+from .RefreshLock import RefreshLock
+from .SharedCache import SharedCache
+from .Storage import (
+    AsyncStorage,
+    MemoryStorage,
+    PersistKey,
+    Storage,
+    SyncStorageAdapter,
+)
+from .Timeouts import Timeouts, createSharedTask, runWithDeadline
+from .TokenRefresher import TokenRefresher
+from .Tracer import Tracer, TracedStorage, noopTracer
+from .utilities import (
+    OrganizationUrnPrefix,
+    buildOrganizationUrn,
+    codec,
+    removeFalsyKeys,
+)
 
 
 class LogtoConfig(BaseModel):
@@ -84,6 +119,29 @@ class LogtoConfig(BaseModel):
     for more information of available scopes for user information.
     """
 
+    compactSession: bool = False
+    """
+    Whether to store the access token map compressed (see `codec`) instead of JSON
+    when it's smaller, which is cheaper to store in cookie or Redis sessions with many
+    resource or organization tokens. Values in either encoding can always be read, so
+    this can be switched on or off without signing users out.
+    """
+
+    timeouts: Timeouts = Timeouts()
+    """
+    The connect, read and total timeouts of the requests to Logto by operation
+    (`discovery`, `jwks`, `userInfo`, `refreshToken` and `authorizationCode`).
+
+    The timeouts are applied by the OIDC core of the client. A `ClientRegistry`
+    creates the cores with the timeouts of the config, but an OIDC core given to the
+    client keeps its own timeouts, and a warning is issued if they differ.
+
+    Example:
+    ```python
+    LogtoConfig(..., timeouts=Timeouts(refreshToken=Timeout(total=3)))
+    ```
+    """
+
 
 class SignInSession(BaseModel):
     """
@@ -140,86 +198,457 @@ specification, but a Logto extension.
 """
 
 
+_inflightRefreshes: "Dict[str, asyncio.Task[Optional[TokenResponse]]]" = {}
+"""
+The in-flight token refreshes in the process, keyed by the digest of the refresh token
+and the resource.
+"""
+
+
+def _removeInflightRefresh(
+    key: str, task: "asyncio.Task[Optional[TokenResponse]]"
+) -> None:
+    if _inflightRefreshes.get(key) is task:
+        del _inflightRefreshes[key]
+    if not task.cancelled():
+        task.exception()  # Avoid the "exception was never retrieved" warning
+
+
+_sessionLocks: (
+    "weakref.WeakValueDictionary[Tuple[asyncio.AbstractEventLoop, str], asyncio.Lock]"
+) = weakref.WeakValueDictionary()
+"""
+The locks that serialize the refresh token grants of each session in the process,
+keyed by the event loop and the digest of the refresh token. A rotated refresh token
+is mapped to the lock of the session, so the grants with the old and the new refresh
+token are serialized as well.
+"""
+
+
+def _getSessionLock(refreshToken: str) -> asyncio.Lock:
+    key = (
+        asyncio.get_running_loop(),
+        hashlib.sha256(refreshToken.encode()).hexdigest(),
+    )
+    lock = _sessionLocks.get(key)
+    if lock is None:
+        lock = _sessionLocks[key] = asyncio.Lock()
+    return lock
+
+
+def _linkSessionLock(lock: asyncio.Lock, refreshToken: str) -> None:
+    _sessionLocks[
+        (
+            asyncio.get_running_loop(),
+            hashlib.sha256(refreshToken.encode()).hexdigest(),
+        )
+    ] = lock
+
+
+_tokenKeys: List[PersistKey] = ["idToken", "refreshToken", "accessTokenMap"]
+"""
+The storage keys of the tokens, which are cleared when a new session starts.
+"""
+
+
+_staticSignInParams = frozenset(
+    ("client_id", "response_type", "scope", "resource", "prompt")
+)
+"""
+The sign-in URL parameters that are encoded in the static query parts, see
+`LogtoClient._getStaticQuery`.
+"""
+
+
+@asynccontextmanager
+async def _noLock() -> AsyncIterator[None]:
+    yield
+
+
 class LogtoClient:
     """
     The main class of the Logto client. You should create an instance of this class
     and use it to sign in, sign out, get access token, etc.
     """
 
-    def __init__(self, config: LogtoConfig, storage: Storage = MemoryStorage()) -> None:
+    def __init__(
+        self,
+        config: LogtoConfig,
+        storage: Union[Storage, AsyncStorage] = MemoryStorage(),
+        transport: Optional[HttpTransport] = None,
+        refreshLock: Optional[RefreshLock] = None,
+        refresher: Optional[TokenRefresher] = None,
+        sharedCache: Optional[SharedCache] = None,
+        oidcCore: Optional[OidcCore] = None,
+        tracer: Optional[Tracer] = None,
+    ) -> None:
+        """
+        Initialize the Logto client with the config and the storage. The storage can
+        be a `Storage` or an `AsyncStorage`; with an `AsyncStorage`, the synchronous
+        getters (`getIdToken`, `getIdTokenClaims`, `getRefreshToken` and
+        `isAuthenticated`) are not available, read the storage directly instead.
+
+        The transport is used for all network requests, and can be shared by multiple
+        clients to reuse connections. If it's not provided, the process-wide
+        `defaultTransport` will be used.
+
+        Concurrent token refreshes for the same session are deduplicated in the
+        process. If multiple processes share the storage, provide a refresh lock
+        (e.g. `FileRefreshLock`) to coordinate the refreshes across processes.
+
+        Provide a `TokenRefresher` to renew the access tokens in the background before
+        they expire, and a `SharedCache` to share the provider metadata and the JWKS
+        with the other processes on the host.
+
+        An OIDC core for the endpoint can be given to share its JWKS store and caches
+        with other clients (see `ClientRegistry`), otherwise the client creates its own
+        on the first use.
+
+        Provide a `Tracer` to trace the sign-in flows, token requests, storage
+        accesses and ID token verifications.
+        """
         self.config = config
-        self._oidcCore: Optional[OidcCore] = None
+        if oidcCore is not None and oidcCore.timeouts != config.timeouts:
+            warnings.warn(
+                "The timeouts of the given OIDC core are used instead of `config.timeouts`",
+                stacklevel=2,
+            )
+        self._oidcCore = oidcCore
+        self._tracer = tracer or noopTracer
         self._storage = storage
+        self._asyncStorage = self._wrapStorage(storage)
+        self._transport = transport
+        self._refreshLock = refreshLock
+        self._refresher = refresher
+        self._sharedCache = sharedCache
+        self._accessTokenMapCache: Optional[Tuple[Optional[str], AccessTokenMap]] = None
+        self._parent: Optional[LogtoClient] = None
+        self._staticQueryCache: Optional[Tuple[Tuple[Any, ...], str, str]] = None
+
+    def bind(self, storage: Union[Storage, AsyncStorage]) -> "LogtoClient":
+        """
+        Return a client that shares everything with this client except the storage,
+        e.g. for binding a long-lived client to the session of each request. Binding
+        is cheap: the config is not validated again, and the OIDC core (with the
+        provider metadata and the JWKS) of this client is reused, or created once and
+        kept in this client for later bindings.
+
+        Note the `TokenRefresher` only renews the tokens of bound clients that are
+        still referenced.
+
+        Example:
+          ```python
+          client = LogtoClient(config)
+
+          async def handler(request):
+              sessionClient = client.bind(SessionStorage(request.session))
+              return await sessionClient.getAccessToken()
+          ```
+        """
+        bound = object.__new__(LogtoClient)
+        bound.__dict__.update(self.__dict__)
+        bound._storage = storage
+        bound._asyncStorage = bound._wrapStorage(storage)
+        bound._accessTokenMapCache = None
+        bound._parent = self._parent or self
+        return bound
+
+    def _wrapStorage(self, storage: Union[Storage, AsyncStorage]) -> AsyncStorage:
+        asyncStorage = (
+            storage
+            if isinstance(storage, AsyncStorage)
+            else SyncStorageAdapter(storage)
+        )
+        if self._tracer is noopTracer:
+            return asyncStorage
+        return TracedStorage(asyncStorage, self._tracer)
 
     async def getOidcCore(self) -> OidcCore:
         """
         Get the OIDC core object. You can use it to get the provider metadata, verify
         the ID token, fetch tokens by code or refresh token, etc.
         """
+        if self._oidcCore is None and self._parent is not None:
+            self._oidcCore = await self._parent.getOidcCore()
         if self._oidcCore is None:
-            self._oidcCore = OidcCore(
-                await OidcCore.getProviderMetadata(
-                    f"{self.config.endpoint}/oidc/.well-known/openid-configuration"
-                )
+            metadata = await OidcCore.getProviderMetadata(
+                f"{self.config.endpoint}/oidc/.well-known/openid-configuration",
+                self._transport,
+                sharedCache=self._sharedCache,
+                tracer=self._tracer,
+                timeout=self.config.timeouts.discovery,
             )
+            # Concurrent first calls share the core (and its JWKS) of the first one
+            if self._oidcCore is None:
+                self._oidcCore = OidcCore(
+                    metadata,
+                    self._transport,
+                    sharedCache=self._sharedCache,
+                    tracer=self._tracer,
+                    timeouts=self.config.timeouts,
+                )
         return self._oidcCore
 
-    def _getAccessTokenMap(self) -> AccessTokenMap:
+    def _decodeAccessTokenMap(self, rawAccessTokenMap: Optional[str]) -> AccessTokenMap:
         """
-        Get the access token map from storage.
+        Decode the access token map read from storage. The decoded map is kept in
+        memory and reused as long as the stored value is unchanged, so reading a cached
+        token doesn't parse the JSON again. The returned map must not be mutated.
         """
-        accessTokenMap = self._storage.get("accessTokenMap")
+        cache = self._accessTokenMapCache
+        if cache is not None and cache[0] == rawAccessTokenMap:
+            return cache[1]
+
         try:
             # Returns parsed `AccessTokenMap` if valid JSON, otherwise will be caught by except clause
-            return AccessTokenMap.model_validate_json(accessTokenMap)  # type: ignore
+            accessTokenMap = AccessTokenMap.model_validate_json(
+                codec.decode(rawAccessTokenMap)  # type: ignore
+            )
         except:
-            return AccessTokenMap(x={})
+            accessTokenMap = AccessTokenMap(x={})
+        self._accessTokenMapCache = (rawAccessTokenMap, accessTokenMap)
+        return accessTokenMap
+
+    async def _getAccessTokenMap(self) -> AccessTokenMap:
+        """
+        Get the access token map from storage.
+        """
+        return self._decodeAccessTokenMap(
+            await self._asyncStorage.get("accessTokenMap")
+        )
+
+    def _encodeAccessToken(
+        self,
+        accessTokenMap: AccessTokenMap,
+        resource: str,
+        accessToken: str,
+        expiresIn: int,
+    ) -> Tuple[str, AccessToken]:
+        """
+        Add the access token for the given resource to a copy of the access token map,
+        and return the encoded map with the added access token.
+        """
+        rawAccessTokenMap, tokens = self._encodeAccessTokens(
+            accessTokenMap, {resource: (accessToken, expiresIn)}
+        )
+        return rawAccessTokenMap, tokens[resource]
 
-    def _setAccessToken(self, resource: str, accessToken: str, expiresIn: int) -> None:
+    def _encodeAccessTokens(
+        self,
+        accessTokenMap: AccessTokenMap,
+        accessTokens: Mapping[str, Tuple[str, int]],
+    ) -> Tuple[str, Dict[str, AccessToken]]:
+        """
+        Add the access tokens (with their `expires_in`) by resource to a copy of the
+        access token map, and return the encoded map with the added access tokens.
+        """
+        now = int(time.time())
+        tokens = {
+            resource: AccessToken(
+                token=accessToken,
+                expiresAt=now
+                + expiresIn
+                - 60,  # 60 seconds earlier to avoid clock skew
+            )
+            for resource, (accessToken, expiresIn) in accessTokens.items()
+        }
+        accessTokenMap = AccessTokenMap.model_construct(
+            x={**accessTokenMap.x, **tokens}
+        )
+        rawAccessTokenMap = accessTokenMap.model_dump_json()
+        if self.config.compactSession:
+            rawAccessTokenMap = codec.encode(rawAccessTokenMap)
+        self._accessTokenMapCache = (rawAccessTokenMap, accessTokenMap)
+        return rawAccessTokenMap, tokens
+
+    async def _setAccessToken(
+        self, resource: str, accessToken: str, expiresIn: int
+    ) -> AccessToken:
         """
         Set the access token for the given resource to storage.
         """
-        accessTokenMap = self._getAccessTokenMap()
-        accessTokenMap.x[resource] = AccessToken(
-            token=accessToken,
-            expiresAt=int(time.time())
-            + expiresIn
-            - 60,  # 60 seconds earlier to avoid clock skew
+        rawAccessTokenMap, token = self._encodeAccessToken(
+            await self._getAccessTokenMap(), resource, accessToken, expiresIn
         )
-        self._storage.set("accessTokenMap", accessTokenMap.model_dump_json())
+        await self._asyncStorage.set("accessTokenMap", rawAccessTokenMap)
+        return token
 
-    def _getAccessToken(self, resource: str) -> Optional[str]:
+    @staticmethod
+    def _findValidAccessToken(
+        accessTokenMap: AccessTokenMap, resource: str
+    ) -> Optional[AccessToken]:
         """
-        Get the valid access token for the given resource from storage, no refresh will be
-        performed.
+        Find the valid access token object for the given resource in the map.
         """
-        accessTokenMap = self._getAccessTokenMap()
         accessToken = accessTokenMap.x.get(resource, None)
         if accessToken is None or accessToken.expiresAt < int(time.time()):
             return None
-        return accessToken.token
+        return accessToken
+
+    @staticmethod
+    def _findGraceAccessToken(
+        accessTokenMap: AccessTokenMap, resource: str
+    ) -> Optional[AccessToken]:
+        """
+        Find the access token for the given resource that is past its refresh time
+        but not expired yet, by the `exp` claim of a JWT, or the `expires_in` of the
+        token response for an opaque token.
+        """
+        accessToken = accessTokenMap.x.get(resource, None)
+        if accessToken is None:
+            return None
+        try:
+            expiresAt = jwt.decode(
+                accessToken.token, options={"verify_signature": False}
+            ).get("exp")
+        except jwt.DecodeError:
+            expiresAt = accessToken.expiresAt + 60
+        if not isinstance(expiresAt, (int, float)) or expiresAt <= time.time():
+            return None
+        return accessToken
+
+    async def _getAccessToken(self, resource: str) -> Optional[str]:
+        """
+        Get the valid access token for the given resource from storage, no refresh will be
+        performed.
+        """
+        accessToken = self._findValidAccessToken(
+            await self._getAccessTokenMap(), resource
+        )
+        return accessToken.token if accessToken is not None else None
+
+    def _getSyncStorage(self, method: str) -> Storage:
+        if isinstance(self._storage, AsyncStorage):
+            raise LogtoException(
+                f"`{method}` is not available with an `AsyncStorage`, read the storage directly instead"
+            )
+        return self._storage
 
     async def _handleTokenResponse(
-        self, resource: str, tokenResponse: TokenResponse
+        self,
+        resource: str,
+        tokenResponse: TokenResponse,
+        accessTokenMap: AccessTokenMap,
+        values: Optional[Dict[PersistKey, Optional[str]]] = None,
     ) -> None:
         """
-        Handle the token response from the Logto server and store the tokens to storage.
+        Handle the token response from the Logto server and store the tokens to storage
+        in one write, along with the given values. The access token is added to the
+        given access token map, which should be read from storage by the caller.
 
         Resource can be an empty string, which means the access token is for UserInfo
         endpoint or the default resource.
         """
-        if tokenResponse.id_token is not None:
-            (await self.getOidcCore()).verifyIdToken(
-                tokenResponse.id_token, self.config.appId
-            )
-            self._storage.set("idToken", tokenResponse.id_token)
+        await self._handleTokenResponses(
+            {resource: tokenResponse}, accessTokenMap, values
+        )
 
-        if tokenResponse.refresh_token is not None:
-            self._storage.set("refreshToken", tokenResponse.refresh_token)
+    async def _handleTokenResponses(
+        self,
+        tokenResponses: Mapping[str, TokenResponse],
+        accessTokenMap: AccessTokenMap,
+        values: Optional[Dict[PersistKey, Optional[str]]] = None,
+    ) -> None:
+        """
+        Handle the token responses by resource like `_handleTokenResponse`, and store
+        all the tokens in one write. The ID token and the refresh token of the last
+        response that has them are kept.
+        """
+        values = dict(values or {})
+        idToken = None
+        for tokenResponse in tokenResponses.values():
+            if tokenResponse.id_token is not None:
+                idToken = tokenResponse.id_token
+            if tokenResponse.refresh_token is not None:
+                values["refreshToken"] = tokenResponse.refresh_token
+
+        if idToken is not None:
+            await (await self.getOidcCore()).verifyIdToken(idToken, self.config.appId)
+            values["idToken"] = idToken
+
+        values["accessTokenMap"], accessTokens = self._encodeAccessTokens(
+            accessTokenMap,
+            {
+                resource: (tokenResponse.access_token, tokenResponse.expires_in)
+                for resource, tokenResponse in tokenResponses.items()
+            },
+        )
+        await self._asyncStorage.setMany(values)
+        if self._refresher is not None:
+            for resource, accessToken in accessTokens.items():
+                self._refresher.schedule(
+                    self, resource, accessToken.token, accessToken.expiresAt
+                )
 
-        self._setAccessToken(
-            resource, tokenResponse.access_token, tokenResponse.expires_in
+    def _buildStaticQuery(
+        self, overrides: Optional[Dict[str, str]] = None
+    ) -> Tuple[str, str]:
+        """
+        Build the encoded query parts of the sign-in URL that only depend on the config:
+        the client ID (before the redirect URI), and the response type, scope, resource
+        and prompt (after it). Parameters in `overrides` replace the config values in
+        place.
+        """
+        appId, prompt, resources, scopes = (
+            self.config.appId,
+            self.config.prompt,
+            self.config.resources,
+            self.config.scopes,
+        )
+        params = {
+            "client_id": appId,
+            "response_type": "code",
+            "scope": " ".join(
+                (item.value if isinstance(item, Scope) else item)
+                for item in (scopes + OidcCore.defaultScopes)
+            ),
+            "resource": (
+                list(dict.fromkeys(resources + [ReservedResource.organizations.value]))
+                if UserInfoScope.organizations in scopes
+                else resources
+            ),
+            "prompt": prompt,
+            **(overrides or {}),
+        }
+        clientId = {"client_id": params.pop("client_id")}
+        return (
+            urllib.parse.urlencode(removeFalsyKeys(clientId), True),
+            urllib.parse.urlencode(removeFalsyKeys(params), True),
+        )
+
+    def _getStaticQuery(
+        self, extraParams: Optional[Dict[str, str]]
+    ) -> Tuple[str, str, Optional[Dict[str, str]]]:
+        """
+        Get the static query parts of the sign-in URL, and the extra parameters that
+        are not part of them. The parts are cached until the config changes, unless the
+        extra parameters override any of them.
+        """
+        if extraParams and not _staticSignInParams.isdisjoint(extraParams):
+            overrides = {
+                key: value
+                for key, value in extraParams.items()
+                if key in _staticSignInParams
+            }
+            return (
+                *self._buildStaticQuery(overrides),
+                {
+                    key: value
+                    for key, value in extraParams.items()
+                    if key not in _staticSignInParams
+                },
+            )
+
+        fingerprint = (
+            self.config.appId,
+            self.config.prompt,
+            tuple(self.config.resources),
+            tuple(self.config.scopes),
         )
+        cache = self._staticQueryCache
+        if cache is None or cache[0] != fingerprint:
+            cache = self._staticQueryCache = (fingerprint, *self._buildStaticQuery())
+        return cache[1], cache[2], extraParams
 
     async def _buildSignInUrl(
         self,
@@ -232,31 +661,19 @@ class LogtoClient:
         directSignIn: Optional[DirectSignInOption] = None,
         extraParams: Optional[Dict[str, str]] = None,
     ) -> str:
-        appId, prompt, resources, scopes = (
-            self.config.appId,
-            self.config.prompt,
-            self.config.resources,
-            self.config.scopes,
-        )
         authorizationEndpoint = (
             await self.getOidcCore()
         ).metadata.authorization_endpoint
-        query = urllib.parse.urlencode(
+        if extraParams and "redirect_uri" in extraParams:
+            extraParams = dict(extraParams)
+            redirectUri = extraParams.pop("redirect_uri")
+        clientIdQuery, staticQuery, extraParams = self._getStaticQuery(extraParams)
+        redirectUriQuery = urllib.parse.urlencode(
+            removeFalsyKeys({"redirect_uri": redirectUri})
+        )
+        requestQuery = urllib.parse.urlencode(
             removeFalsyKeys(
                 {
-                    "client_id": appId,
-                    "redirect_uri": redirectUri,
-                    "response_type": "code",
-                    "scope": " ".join(
-                        (item.value if isinstance(item, Scope) else item)
-                        for item in (scopes + OidcCore.defaultScopes)
-                    ),
-                    "resource": (
-                        list(set(resources + [ReservedResource.organizations.value]))
-                        if UserInfoScope.organizations in scopes
-                        else resources
-                    ),
-                    "prompt": prompt,
                     "code_challenge": codeChallenge,
                     "code_challenge_method": "S256",
                     "state": state,
@@ -277,28 +694,40 @@ class LogtoClient:
             ),
             True,
         )
+        query = "&".join(
+            part
+            for part in (clientIdQuery, redirectUriQuery, staticQuery, requestQuery)
+            if part
+        )
         return f"{authorizationEndpoint}?{query}"
 
-    def _getSignInSession(self) -> Optional[SignInSession]:
+    @staticmethod
+    def _parseSignInSession(signInSession: Optional[str]) -> Optional[SignInSession]:
         """
-        Try to parse the current sign-in session from storage. If the value does not
+        Try to parse the sign-in session read from storage. If the value does not
         exist or parse failed, return None.
         """
-        signInSession = self._storage.get("signInSession")
         if signInSession is None:
             return None
         try:
-            return SignInSession.model_validate_json(signInSession)
+            return SignInSession.model_validate_json(codec.decode(signInSession))
         except:
             return None
 
-    def _setSignInSession(self, signInSession: SignInSession) -> None:
-        self._storage.set("signInSession", signInSession.model_dump_json())
-
-    def _clearAllTokens(self) -> None:
-        self._storage.delete("idToken")
-        self._storage.delete("refreshToken")
-        self._storage.delete("accessTokenMap")
+    async def _clearAllTokens(
+        self, values: Optional[Dict[PersistKey, Optional[str]]] = None
+    ) -> None:
+        """
+        Clear all tokens in storage, and set the given values in the same write.
+        """
+        if self._refresher is not None:
+            self._refresher.cancel(self)
+        if values:
+            await self._asyncStorage.setMany(
+                {**values, **dict.fromkeys(_tokenKeys, None)}
+            )
+        else:
+            await self._asyncStorage.deleteMany(_tokenKeys)
 
     async def signIn(
         self,
@@ -326,30 +755,32 @@ class LogtoClient:
           ))
           ```
         """
-        codeVerifier = OidcCore.generateCodeVerifier()
-        codeChallenge = OidcCore.generateCodeChallenge(codeVerifier)
-        state = OidcCore.generateState()
-        signInUrl = await self._buildSignInUrl(
-            redirectUri,
-            codeChallenge,
-            state,
-            interactionMode,
-            firstScreen,
-            identifiers,
-            directSignIn,
-            extraParams,
-        )
+        with self._tracer.span("logto.signIn"):
+            codeVerifier = OidcCore.generateCodeVerifier()
+            codeChallenge = OidcCore.generateCodeChallenge(codeVerifier)
+            state = OidcCore.generateState()
+            signInUrl = await self._buildSignInUrl(
+                redirectUri,
+                codeChallenge,
+                state,
+                interactionMode,
+                firstScreen,
+                identifiers,
+                directSignIn,
+                extraParams,
+            )
 
-        self._setSignInSession(
-            SignInSession(
-                redirectUri=redirectUri,
-                codeVerifier=codeVerifier,
-                state=state,
+            await self._clearAllTokens(
+                {
+                    "signInSession": SignInSession(
+                        redirectUri=redirectUri,
+                        codeVerifier=codeVerifier,
+                        state=state,
+                    ).model_dump_json()
+                }
             )
-        )
-        self._clearAllTokens()
 
-        return signInUrl
+            return signInUrl
 
     async def signOut(self, postLogoutRedirectUri: Optional[str] = None) -> str:
         """
@@ -369,7 +800,7 @@ class LogtoClient:
           return redirect(await client.signOut('https://example.com'))
           ```
         """
-        self._clearAllTokens()
+        await self._clearAllTokens()
 
         endSessionEndpoint = (await self.getOidcCore()).metadata.end_session_endpoint
 
@@ -391,82 +822,243 @@ class LogtoClient:
             )
         )
 
-    async def handleSignInCallback(self, callbackUri: str) -> None:
+    async def handleSignInCallback(
+        self, callbackUri: str, deadline: Optional[float] = None
+    ) -> None:
         """
         Handle the sign-in callback from the Logto server. This method should be called
         in the callback route handler of your application.
+
+        If a deadline (a `time.monotonic()` timestamp) is given, the requests and
+        their retries are bounded by it, and `LogtoDeadlineExceededException` is
+        raised if the callback can't be handled in time.
         """
-        signInSession = self._getSignInSession()
+        if deadline is not None:
+            return await runWithDeadline(
+                self.handleSignInCallback(callbackUri), deadline
+            )
 
-        if signInSession is None:
-            raise LogtoException("Sign-in session not found")
+        with self._tracer.span("logto.handleSignInCallback"):
+            values = await self._asyncStorage.getMany(
+                ["signInSession", "accessTokenMap"]
+            )
+            signInSession = self._parseSignInSession(values["signInSession"])
 
-        # Validate the callback URI without query matches the redirect URI
-        parsedCallbackUri = urllib.parse.urlparse(callbackUri)
+            if signInSession is None:
+                raise LogtoException("Sign-in session not found")
 
-        if (
-            parsedCallbackUri.path
-            != urllib.parse.urlparse(signInSession.redirectUri).path
-        ):
-            raise LogtoException(
-                "The URI path does not match the redirect URI in the sign-in session"
-            )
+            # Validate the callback URI without query matches the redirect URI
+            parsedCallbackUri = urllib.parse.urlparse(callbackUri)
 
-        query = urllib.parse.parse_qs(parsedCallbackUri.query)
+            if (
+                parsedCallbackUri.path
+                != urllib.parse.urlparse(signInSession.redirectUri).path
+            ):
+                raise LogtoException(
+                    "The URI path does not match the redirect URI in the sign-in session"
+                )
 
-        if "error" in query:
-            raise LogtoException(query["error"][0])
+            query = urllib.parse.parse_qs(parsedCallbackUri.query)
 
-        if signInSession.state != query.get("state", [None])[0]:
-            raise LogtoException("Invalid state in the callback URI")
+            if "error" in query:
+                raise LogtoException(query["error"][0])
 
-        code = query.get("code", [None])[0]
-        if code is None:
-            raise LogtoException("Code not found in the callback URI")
+            if signInSession.state != query.get("state", [None])[0]:
+                raise LogtoException("Invalid state in the callback URI")
 
-        tokenResponse = await (await self.getOidcCore()).fetchTokenByCode(
-            clientId=self.config.appId,
-            clientSecret=self.config.appSecret,
-            redirectUri=signInSession.redirectUri,
-            code=code,
-            codeVerifier=signInSession.codeVerifier,
-        )
+            code = query.get("code", [None])[0]
+            if code is None:
+                raise LogtoException("Code not found in the callback URI")
+
+            tokenResponse = await (await self.getOidcCore()).fetchTokenByCode(
+                clientId=self.config.appId,
+                clientSecret=self.config.appSecret,
+                redirectUri=signInSession.redirectUri,
+                code=code,
+                codeVerifier=signInSession.codeVerifier,
+            )
 
-        await self._handleTokenResponse("", tokenResponse)
-        self._storage.delete("signInSession")
+            await self._handleTokenResponse(
+                "",
+                tokenResponse,
+                self._decodeAccessTokenMap(values["accessTokenMap"]),
+                {"signInSession": None},
+            )
 
-    async def getAccessToken(self, resource: str = "") -> Optional[str]:
+    async def getAccessToken(
+        self, resource: str = "", deadline: Optional[float] = None
+    ) -> Optional[str]:
         """
         Get the access token for the given resource. If the access token is expired,
         it will be refreshed automatically. If no refresh token is found, None will
         be returned.
-        """
-        accessToken = self._getAccessToken(resource)
-        if accessToken is not None:
-            return accessToken
 
-        if (
-            resource.startswith(OrganizationUrnPrefix)
-            and UserInfoScope.organizations not in self.config.scopes
-        ):
-            raise LogtoException(
-                "The `UserInfoScope.organizations` scope is required to fetch organization tokens"
+        If a deadline (a `time.monotonic()` timestamp) is given, the refresh and its
+        retries are bounded by it, and `LogtoDeadlineExceededException` is raised if
+        the token can't be returned in time.
+
+        If the refresh is rejected by the circuit breaker of the transport during its
+        grace period, the stored access token is returned as long as it's not expired.
+        """
+        if deadline is not None:
+            return await runWithDeadline(self.getAccessToken(resource), deadline)
+
+        with self._tracer.span(
+            "logto.getAccessToken", {"logto.resource": resource}
+        ) as span:
+            values = await self._asyncStorage.getMany(
+                ["accessTokenMap", "refreshToken"]
             )
+            accessTokenMap = self._decodeAccessTokenMap(values["accessTokenMap"])
+            accessToken = self._findValidAccessToken(accessTokenMap, resource)
+            span.setAttribute("logto.cache_hit", accessToken is not None)
+            if accessToken is not None:
+                if self._refresher is not None:
+                    self._refresher.touch(
+                        self, resource, accessToken.token, accessToken.expiresAt
+                    )
+                return accessToken.token
+
+            if (
+                resource.startswith(OrganizationUrnPrefix)
+                and UserInfoScope.organizations not in self.config.scopes
+            ):
+                raise LogtoException(
+                    "The `UserInfoScope.organizations` scope is required to fetch organization tokens"
+                )
+
+            try:
+                return await self._refreshAccessToken(resource, values=values)
+            except LogtoCircuitOpenException as e:
+                # Logto is down: keep serving the stored token until it expires
+                accessToken = (
+                    self._findGraceAccessToken(accessTokenMap, resource)
+                    if e.grace
+                    else None
+                )
+                if accessToken is None:
+                    raise
+                span.setAttribute("logto.grace", True)
+                return accessToken.token
+
+    async def _refreshAccessToken(
+        self,
+        resource: str,
+        staleAccessToken: Optional[str] = None,
+        values: Optional[Dict[PersistKey, Optional[str]]] = None,
+    ) -> Optional[str]:
+        """
+        Refresh the access token for the given resource with the refresh token, return
+        None if no refresh token is found.
+
+        The refresh is skipped if a valid access token exists in storage, unless it's
+        the given stale access token (for renewing tokens before they expire).
+
+        Concurrent refreshes for the same refresh token (session) and resource in the
+        process share one token request, and the refresh lock (if any) extends the
+        guarantee across processes.
 
-        refreshToken = self._storage.get("refreshToken")
+        The access token map and the refresh token are read from storage, unless they
+        are given in `values`.
+        """
+        if values is None:
+            values = await self._asyncStorage.getMany(
+                ["accessTokenMap", "refreshToken"]
+            )
+        refreshToken = values["refreshToken"]
         if refreshToken is None:
             return None
 
-        tokenResponse = await (await self.getOidcCore()).fetchTokenByRefreshToken(
-            clientId=self.config.appId,
-            clientSecret=self.config.appSecret,
-            refreshToken=refreshToken,
-            resource=resource,
-        )
+        key = hashlib.sha256(f"{refreshToken}\0{resource}".encode()).hexdigest()
+        loop = asyncio.get_running_loop()
+        isLeader = False
+        task = _inflightRefreshes.get(key)
+        if task is None or task.get_loop() is not loop:
+            isLeader = True
+            task = createSharedTask(
+                self._fetchRefreshedToken(resource, key, staleAccessToken, refreshToken)
+            )
+            _inflightRefreshes[key] = task
+            task.add_done_callback(lambda done: _removeInflightRefresh(key, done))
+
+        tokenResponse = await asyncio.shield(task)
 
-        await self._handleTokenResponse(resource, tokenResponse)
+        if tokenResponse is None:
+            # Refreshed by another process, or the session has been signed out
+            return await self._getAccessToken(resource)
+
+        # The waiters may use different storage instances for the same session
+        if not isLeader:
+            accessTokenMap = await self._getAccessTokenMap()
+            if self._findValidAccessToken(accessTokenMap, resource) is None:
+                await self._handleTokenResponse(resource, tokenResponse, accessTokenMap)
         return tokenResponse.access_token
 
+    async def _fetchRefreshedToken(
+        self,
+        resource: str,
+        key: str,
+        staleAccessToken: Optional[str],
+        refreshToken: str,
+    ) -> Optional[TokenResponse]:
+        """
+        Fetch and store the refreshed tokens while holding the session lock and the
+        refresh lock. Returns None if no refresh is needed anymore.
+        """
+        async with _getSessionLock(refreshToken):
+            tokenResponse, _ = await self._grantRefreshToken(
+                resource, key, staleAccessToken
+            )
+            return tokenResponse
+
+    async def _grantRefreshToken(
+        self,
+        resource: str,
+        key: str,
+        staleAccessToken: Optional[str],
+        defer: bool = False,
+    ) -> Tuple[Optional[TokenResponse], bool]:
+        """
+        Fetch the refreshed tokens while holding the refresh lock, the caller must hold
+        the session lock. Returns the token response (None if no refresh is needed
+        anymore), and whether it has been stored.
+
+        With `defer`, the tokens are only stored if the refresh token is rotated, so
+        the caller can store the other tokens in one write.
+        """
+        async with self._refreshLock.acquire(key) if self._refreshLock else _noLock():
+            # Read again, since another grant may have refreshed the token (and
+            # rotated the refresh token) while we were waiting
+            values = await self._asyncStorage.getMany(
+                ["accessTokenMap", "refreshToken"]
+            )
+
+            accessTokenMap = self._decodeAccessTokenMap(values["accessTokenMap"])
+            accessToken = self._findValidAccessToken(accessTokenMap, resource)
+            if accessToken is not None and accessToken.token != staleAccessToken:
+                return None, False
+
+            refreshToken = values["refreshToken"]
+            if refreshToken is None:
+                return None, False
+
+            tokenResponse = await (await self.getOidcCore()).fetchTokenByRefreshToken(
+                clientId=self.config.appId,
+                clientSecret=self.config.appSecret,
+                refreshToken=refreshToken,
+                resource=resource,
+            )
+
+            rotated = tokenResponse.refresh_token not in (None, refreshToken)
+            if rotated:
+                _linkSessionLock(
+                    _getSessionLock(refreshToken), str(tokenResponse.refresh_token)
+                )
+            elif defer:
+                return tokenResponse, False
+            await self._handleTokenResponse(resource, tokenResponse, accessTokenMap)
+            return tokenResponse, True
+
     async def getOrganizationToken(self, organizationId: str) -> Optional[str]:
         """
         Get the access token for the given organization ID. If the access token is expired,
@@ -475,6 +1067,145 @@ class LogtoClient:
         """
         return await self.getAccessToken(buildOrganizationUrn(organizationId))
 
+    async def getOrganizationTokens(
+        self,
+        organizationIds: Iterable[str],
+        concurrency: int = 4,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Optional[str]]:
+        """
+        Get the access tokens for the given organization IDs, keyed by organization ID.
+        The valid tokens are read from storage, and the missing or expired ones are
+        fetched with up to `concurrency` token requests at a time, then stored in one
+        write. The tokens are None if no refresh token is found.
+
+        If Logto rotates the refresh token, the tokens are fetched one by one instead,
+        and each rotated refresh token is stored before the next request, since a
+        rotated refresh token can't be used again. The other refreshes of the session
+        in the process wait for the batch to complete. If some of the requests fail, the fetched tokens are still stored, and
+        the first error is raised.
+
+        See `getAccessToken` for the deadline.
+        """
+        if concurrency < 1:
+            raise LogtoException(
+                f"The concurrency must be at least 1, got {concurrency}"
+            )
+
+        if deadline is not None:
+            return await runWithDeadline(
+                self.getOrganizationTokens(organizationIds, concurrency), deadline
+            )
+
+        if UserInfoScope.organizations not in self.config.scopes:
+            raise LogtoException(
+                "The `UserInfoScope.organizations` scope is required to fetch organization tokens"
+            )
+
+        with self._tracer.span("logto.getOrganizationTokens") as span:
+            values = await self._asyncStorage.getMany(
+                ["accessTokenMap", "refreshToken"]
+            )
+            tokens, missing = self._findOrganizationTokens(
+                self._decodeAccessTokenMap(values["accessTokenMap"]), organizationIds
+            )
+            span.setAttribute("logto.cache_misses", len(missing))
+            if not missing or values["refreshToken"] is None:
+                return tokens
+
+            # Hold the session lock, so the other grants of the session (which may
+            # rotate the refresh token) wait for the batch
+            async with _getSessionLock(values["refreshToken"]):
+                await self._fetchOrganizationTokens(tokens, missing, concurrency)
+            return tokens
+
+    def _findOrganizationTokens(
+        self, accessTokenMap: AccessTokenMap, organizationIds: Iterable[str]
+    ) -> Tuple[Dict[str, Optional[str]], List[str]]:
+        """
+        Find the valid tokens of the organizations in the access token map, and return
+        them with the organizations that have no valid token.
+        """
+        tokens: Dict[str, Optional[str]] = {}
+        missing: List[str] = []
+        for organizationId in dict.fromkeys(organizationIds):
+            accessToken = self._findValidAccessToken(
+                accessTokenMap, buildOrganizationUrn(organizationId)
+            )
+            if accessToken is None:
+                missing.append(organizationId)
+            tokens[organizationId] = accessToken and accessToken.token
+        return tokens, missing
+
+    async def _fetchOrganizationTokens(
+        self,
+        tokens: Dict[str, Optional[str]],
+        missing: List[str],
+        concurrency: int,
+    ) -> None:
+        """
+        Fetch the tokens of the missing organizations into `tokens` while holding the
+        session lock, see `getOrganizationTokens`.
+        """
+        tokenResponses: Dict[str, TokenResponse] = {}
+        errors: List[Exception] = []
+        refreshToken = await self._asyncStorage.get("refreshToken")
+        rotates: Optional[bool] = None
+
+        async def fetch(organizationId: str) -> None:
+            nonlocal refreshToken, rotates
+            resource = buildOrganizationUrn(organizationId)
+            key = hashlib.sha256(f"{refreshToken}\0{resource}".encode()).hexdigest()
+            try:
+                tokenResponse, stored = await self._grantRefreshToken(
+                    resource, key, None, defer=True
+                )
+            except Exception as e:
+                errors.append(e)
+                return
+            if tokenResponse is None:
+                return
+
+            tokens[organizationId] = tokenResponse.access_token
+            if stored:
+                # The refresh token is rotated and stored, the next grant reads it
+                rotates = True
+                refreshToken = tokenResponse.refresh_token
+            else:
+                tokenResponses[buildOrganizationUrn(organizationId)] = tokenResponse
+                if rotates is None:
+                    rotates = False
+
+        # Fetch one by one until a response tells whether the refresh token is
+        # rotated, then fetch the rest concurrently if it's not
+        index = 0
+        while index < len(missing) and rotates is not False:
+            await fetch(missing[index])
+            index += 1
+        if index < len(missing):
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def fetchConcurrently(organizationId: str) -> None:
+                async with semaphore:
+                    await fetch(organizationId)
+
+            await asyncio.gather(*map(fetchConcurrently, missing[index:]))
+
+        if tokenResponses:
+            # Read again to keep the tokens stored while fetching
+            await self._handleTokenResponses(
+                tokenResponses, await self._getAccessTokenMap()
+            )
+        if any(tokens[organizationId] is None for organizationId in missing):
+            # Refreshed by another process
+            storedTokens, _ = self._findOrganizationTokens(
+                await self._getAccessTokenMap(), missing
+            )
+            for organizationId, token in storedTokens.items():
+                tokens[organizationId] = tokens[organizationId] or token
+        if errors:
+            raise errors[0]
+
     async def getAccessTokenClaims(self, resource: str = "") -> AccessTokenClaims:
         """
         Get the claims in the access token for the given resource. If the access token
@@ -501,14 +1232,14 @@ class LogtoClient:
         Get the ID Token string. If you need to get the claims in the ID Token, use
         `getIdTokenClaims` instead.
         """
-        return self._storage.get("idToken")
+        return self._getSyncStorage("getIdToken").get("idToken")
 
     def getIdTokenClaims(self) -> IdTokenClaims:
         """
         Get the claims in the ID Token. If the ID Token does not exist, an exception
         will be thrown.
         """
-        idToken = self._storage.get("idToken")
+        idToken = self._getSyncStorage("getIdTokenClaims").get("idToken")
         if idToken is None:
             raise LogtoException("ID Token not found")
 
@@ -518,19 +1249,26 @@ class LogtoClient:
         """
         Get the refresh token string.
         """
-        return self._storage.get("refreshToken")
+        return self._getSyncStorage("getRefreshToken").get("refreshToken")
 
     def isAuthenticated(self) -> bool:
         """
         Check if the user is authenticated by checking if the ID Token exists.
         """
-        return self._storage.get("idToken") is not None
+        return self._getSyncStorage("isAuthenticated").get("idToken") is not None
 
-    async def fetchUserInfo(self) -> UserInfoResponse:
+    async def fetchUserInfo(self, deadline: Optional[float] = None) -> UserInfoResponse:
         """
         Fetch the user information from the UserInfo endpoint. If the access token
         is expired, it will be refreshed automatically.
+
+        If a deadline (a `time.monotonic()` timestamp) is given, the requests and
+        their retries are bounded by it, and `LogtoDeadlineExceededException` is
+        raised if the user info can't be fetched in time.
         """
+        if deadline is not None:
+            return await runWithDeadline(self.fetchUserInfo(), deadline)
+
         accessToken = await self.getAccessToken()
         if accessToken is None:
             raise LogtoException(
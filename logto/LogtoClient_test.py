@@ -1,5 +1,17 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from itertools import combinations
-from typing import Any, Callable, Dict, Optional
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Mapping,
+    Optional,
+    Tuple,
+)
 from urllib.parse import quote
 
 import pytest
@@ -16,13 +28,45 @@ from .models.oidc import (
     UserInfoScope,
 )
 from .models.response import TokenResponse, UserInfoResponse
+from .CircuitBreaker import CircuitBreaker, LogtoCircuitOpenException
+from .HttpTransport import HttpTransport
+from .LogtoClient import AccessTokenMap
 from .OidcCore import OidcCore
-from .Storage import MemoryStorage, Storage
-from .utilities.test import mockHttp, mockProviderMetadata
+from .RefreshLock import RefreshLock
+from .Storage import AsyncStorage, MemoryStorage, PersistKey, Storage
+from .Timeouts import LogtoDeadlineExceededException, Timeout, Timeouts
+from .Tracer import noopTracer
+from .utilities.test import FakeLogtoServer, mockHttp, mockProviderMetadata
 
 MockRequest = Callable[..., None]
 
 
+class CountingStorage(AsyncStorage):
+    def __init__(self) -> None:
+        self.data: Dict[str, str] = {}
+        self.reads = 0
+        self.writes = 0
+
+    async def getMany(
+        self, keys: Iterable[PersistKey]
+    ) -> Dict[PersistKey, Optional[str]]:
+        self.reads += 1
+        return {key: self.data.get(key) for key in keys}
+
+    async def setMany(self, values: Mapping[PersistKey, Optional[str]]) -> None:
+        self.writes += 1
+        for key, value in values.items():
+            if value is None:
+                self.data.pop(key, None)
+            else:
+                self.data[key] = value
+
+    async def deleteMany(self, keys: Iterable[PersistKey]) -> None:
+        self.writes += 1
+        for key in keys:
+            self.data.pop(key, None)
+
+
 class TestLogtoClient:
     @pytest.fixture
     def config(self) -> LogtoConfig:
@@ -74,6 +118,73 @@ class TestLogtoClient:
     async def test_getOidcCore(self, client: LogtoClient) -> None:
         assert isinstance(await client.getOidcCore(), OidcCore)
 
+    async def test_getOidcCore_transport(
+        self, config: LogtoConfig, storage: Storage, mocker: MockerFixture
+    ) -> None:
+        transport = HttpTransport()
+        getProviderMetadata = mocker.patch(
+            "logto.OidcCore.OidcCore.getProviderMetadata",
+            return_value=mockProviderMetadata,
+        )
+        oidcCore = await LogtoClient(config, storage, transport).getOidcCore()
+
+        getProviderMetadata.assert_called_once_with(
+            "http://localhost:3001/oidc/.well-known/openid-configuration",
+            transport,
+            sharedCache=None,
+            tracer=noopTracer,
+            timeout=config.timeouts.discovery,
+        )
+        assert oidcCore.transport is transport
+
+    def test_oidcCore_timeouts(self, config: LogtoConfig, storage: Storage) -> None:
+        oidcCore = OidcCore(mockProviderMetadata, timeouts=config.timeouts)
+        LogtoClient(config, storage, oidcCore=oidcCore)
+
+        config.timeouts = Timeouts(refreshToken=Timeout(total=3))
+        with pytest.warns(UserWarning, match="timeouts of the given OIDC core"):
+            LogtoClient(config, storage, oidcCore=oidcCore)
+
+    async def test_bind(
+        self, client: LogtoClient, storage: Storage, mocker: MockerFixture
+    ) -> None:
+        getProviderMetadata = mocker.patch(
+            "logto.OidcCore.OidcCore.getProviderMetadata",
+            return_value=mockProviderMetadata,
+        )
+        storage.set(
+            "accessTokenMap",
+            '{"x":{"":{"token":"access_token","expiresAt": 9999999999}}}',
+        )
+        otherStorage = MemoryStorage()
+        bound = client.bind(otherStorage)
+        boundTwice = bound.bind(MemoryStorage())
+
+        assert bound.config is client.config
+        assert await bound.getAccessToken() is None
+        assert await client.getAccessToken() == "access_token"
+        assert await bound.getOidcCore() is await client.getOidcCore()
+        assert await boundTwice.getOidcCore() is await client.getOidcCore()
+        assert getProviderMetadata.call_count == 1
+
+    async def test_getOidcCore_concurrent(
+        self, client: LogtoClient, mocker: MockerFixture
+    ) -> None:
+        async def getProviderMetadata(*args: Any, **kwargs: Any) -> Any:
+            await asyncio.sleep(0)
+            return mockProviderMetadata
+
+        mocker.patch(
+            "logto.OidcCore.OidcCore.getProviderMetadata",
+            side_effect=getProviderMetadata,
+        )
+        boundClients = [client.bind(MemoryStorage()) for _ in range(3)]
+        oidcCores = await asyncio.gather(
+            client.getOidcCore(), *(bound.getOidcCore() for bound in boundClients)
+        )
+
+        assert all(oidcCore is oidcCores[0] for oidcCore in oidcCores)
+
     async def test_signIn(self, client: LogtoClient) -> None:
         url = await client.signIn("redirectUri", "signUp")
 
@@ -181,6 +292,28 @@ class TestLogtoClient:
             == "https://logto.app/oidc/auth?client_id=replace-with-your-app-id&redirect_uri=redirectUri&response_type=code&scope=openid+offline_access+profile&prompt=consent&code_challenge=codeChallenge&code_challenge_method=S256&state=state&custom_param_1=value_1&custom_param_2=value_2"
         )
 
+    async def test_signIn_extraParamsOverride(self, client: LogtoClient) -> None:
+        url = await client.signIn(
+            "redirectUri",
+            extraParams={"prompt": "login", "redirect_uri": "other", "foo": "bar"},
+        )
+
+        assert (
+            url
+            == "https://logto.app/oidc/auth?client_id=replace-with-your-app-id&redirect_uri=other&response_type=code&scope=openid+offline_access+profile&prompt=login&code_challenge=codeChallenge&code_challenge_method=S256&state=state&foo=bar"
+        )
+
+        # The overrides are not cached
+        url = await client.signIn("redirectUri")
+        assert "&prompt=consent&" in url and "redirect_uri=redirectUri&" in url
+
+    async def test_signIn_configChanged(self, client: LogtoClient) -> None:
+        await client.signIn("redirectUri")
+        client.config.scopes = ["email"]
+        url = await client.signIn("redirectUri")
+
+        assert "&scope=email+openid+offline_access+profile&" in url
+
     async def test_signIn_multipleParams(self, client: LogtoClient) -> None:
         url = await client.signIn(
             "redirectUri",
@@ -316,6 +449,81 @@ class TestLogtoClient:
         assert storage.get("refreshToken") == "refreshToken"
         assert await client.getAccessToken() == "accessToken"
 
+    async def test_handleSignInCallback_asyncStorage(
+        self,
+        config: LogtoConfig,
+        client: LogtoClient,
+        mockRequest: MockRequest,
+        mocker: MockerFixture,
+    ) -> None:
+        storage = CountingStorage()
+        client = LogtoClient(config, storage)
+        client.getOidcCore = mocker.AsyncMock(
+            return_value=OidcCore(mockProviderMetadata),
+        )
+        mocker.patch("logto.OidcCore.OidcCore.verifyIdToken", return_value=None)
+
+        await client.signIn("https://redirect_uri")
+        assert (storage.reads, storage.writes) == (0, 1)
+
+        tokenResponse = TokenResponse(
+            access_token="accessToken",
+            token_type="Bearer",
+            expires_in=3600,
+            refresh_token="refreshToken",
+            id_token="idToken",
+        )
+        mockRequest(method="post", json=tokenResponse.__dict__)
+        await client.handleSignInCallback(
+            callbackUri="https://redirect_uri?state=state&code=code"
+        )
+        assert (storage.reads, storage.writes) == (1, 2)
+        assert storage.data.keys() == {"idToken", "refreshToken", "accessTokenMap"}
+
+        assert await client.getAccessToken() == "accessToken"
+        assert (storage.reads, storage.writes) == (2, 2)
+
+        with pytest.raises(LogtoException, match="`isAuthenticated` is not available"):
+            client.isAuthenticated()
+
+    async def test_handleSignInCallback_compactSession(
+        self,
+        client: LogtoClient,
+        storage: Storage,
+        mockRequest: MockRequest,
+        mocker: MockerFixture,
+    ) -> None:
+        client.config.compactSession = True
+        client.getOidcCore = mocker.AsyncMock(
+            return_value=OidcCore(mockProviderMetadata),
+        )
+        mocker.patch("logto.OidcCore.OidcCore.verifyIdToken", return_value=None)
+
+        await client.signIn("https://redirect_uri")
+
+        tokenResponse = TokenResponse(
+            access_token="accessToken" * 50,
+            token_type="Bearer",
+            expires_in=3600,
+            refresh_token="refreshToken",
+            id_token="idToken",
+        )
+        mockRequest(method="post", json=tokenResponse.__dict__)
+        await client.handleSignInCallback(
+            callbackUri="https://redirect_uri?state=state&code=code"
+        )
+
+        assert (storage.get("accessTokenMap") or "").startswith("lt1.")
+        client._accessTokenMapCache = None
+        assert await client.getAccessToken() == "accessToken" * 50
+
+        # JSON values can still be read
+        storage.set(
+            "accessTokenMap",
+            '{"x":{"":{"token":"access_token","expiresAt": 9999999999}}}',
+        )
+        assert await client.getAccessToken() == "access_token"
+
     async def test_getAccessToken_cached(
         self,
         client: LogtoClient,
@@ -329,6 +537,35 @@ class TestLogtoClient:
         assert await client.getAccessToken() == "access_token"
         assert await client.getAccessToken(resource="foo") == "access_token_foo"
 
+    async def test_getAccessToken_decodedOnce(
+        self,
+        client: LogtoClient,
+        storage: Storage,
+        mocker: MockerFixture,
+    ) -> None:
+        storage.set(
+            "accessTokenMap",
+            '{"x":{"":{"token":"access_token","expiresAt": 9999999999}}}',
+        )
+        validate = mocker.spy(AccessTokenMap, "model_validate_json")
+        assert await client.getAccessToken() == "access_token"
+        assert await client.getAccessToken() == "access_token"
+        assert validate.call_count == 1
+
+        # Writes go through the decoded map
+        await client._setAccessToken("foo", "access_token_foo", 3600)
+        assert await client.getAccessToken(resource="foo") == "access_token_foo"
+        assert await client.getAccessToken() == "access_token"
+        assert validate.call_count == 1
+
+        # Changes in storage invalidate the decoded map
+        storage.set(
+            "accessTokenMap",
+            '{"x":{"":{"token":"access_token_new","expiresAt": 9999999999}}}',
+        )
+        assert await client.getAccessToken() == "access_token_new"
+        assert validate.call_count == 2
+
     async def test_getAccessToken_noRefreshToken(
         self,
         client: LogtoClient,
@@ -358,6 +595,66 @@ class TestLogtoClient:
 
         assert await client.getAccessToken() == "accessToken"
 
+    async def test_getAccessToken_concurrentRefresh(
+        self,
+        client: LogtoClient,
+        config: LogtoConfig,
+        storage: Storage,
+        mocker: MockerFixture,
+    ) -> None:
+        storage.set("refreshToken", "refreshToken")
+        otherStorage = MemoryStorage()
+        otherStorage.set("refreshToken", "refreshToken")
+        otherClient = LogtoClient(config, otherStorage)
+
+        async def fetchTokenByRefreshToken(**kwargs) -> TokenResponse:
+            await asyncio.sleep(0.01)
+            return TokenResponse(
+                access_token="accessToken",
+                token_type="Bearer",
+                expires_in=3600,
+                refresh_token="rotatedRefreshToken",
+            )
+
+        fetch = mocker.patch(
+            "logto.OidcCore.OidcCore.fetchTokenByRefreshToken",
+            side_effect=fetchTokenByRefreshToken,
+        )
+        results = await asyncio.gather(
+            *(client.getAccessToken() for _ in range(100)),
+            otherClient.getAccessToken(),
+        )
+
+        assert results == ["accessToken"] * 101
+        assert fetch.call_count == 1
+        assert storage.get("refreshToken") == "rotatedRefreshToken"
+        assert otherStorage.get("refreshToken") == "rotatedRefreshToken"
+
+    async def test_getAccessToken_refreshLock(
+        self,
+        config: LogtoConfig,
+        storage: Storage,
+        mocker: MockerFixture,
+    ) -> None:
+        storage.set("refreshToken", "refreshToken")
+
+        class OtherProcessRefreshLock(RefreshLock):
+            @asynccontextmanager
+            async def acquire(self, key: str) -> AsyncIterator[None]:
+                # Simulate another process that refreshed the token meanwhile
+                storage.set(
+                    "accessTokenMap",
+                    '{"x":{"":{"token":"accessToken","expiresAt": 9999999999}}}',
+                )
+                yield
+
+        fetch = mocker.patch("logto.OidcCore.OidcCore.fetchTokenByRefreshToken")
+        client = LogtoClient(config, storage, refreshLock=OtherProcessRefreshLock())
+        client._oidcCore = OidcCore(mockProviderMetadata)
+
+        assert await client.getAccessToken() == "accessToken"
+        assert fetch.call_count == 0
+
     async def test_getOrganizationToken(
         self,
         organizationClient: LogtoClient,
@@ -375,6 +672,20 @@ class TestLogtoClient:
     async def test_getOrganizationToken_noScope(self, client: LogtoClient) -> None:
         with pytest.raises(LogtoException, match="scope is required"):
             await client.getOrganizationToken("1")
+        with pytest.raises(LogtoException, match="scope is required"):
+            await client.getOrganizationTokens(["1"])
+
+    async def test_getOrganizationTokens_stored(
+        self, organizationClient: LogtoClient, storage: Storage
+    ) -> None:
+        storage.set(
+            "accessTokenMap",
+            '{"x":{"urn:logto:organization:1":{"token":"organization_token","expiresAt": 9999999999}}}',
+        )
+        assert await organizationClient.getOrganizationTokens(["1", "2", "1"]) == {
+            "1": "organization_token",
+            "2": None,
+        }
 
     async def test_getAccessTokenClaims(
         self, client: LogtoClient, storage: Storage
@@ -481,3 +792,179 @@ class TestLogtoClient:
         )
 
         assert await client.fetchUserInfo() == userinfoResponse
+
+
+@asynccontextmanager
+async def signedIn(
+    storage: Optional[AsyncStorage] = None,
+    transport: Optional[HttpTransport] = None,
+    configOptions: Optional[Dict[str, Any]] = None,
+    **serverOptions: Any,
+) -> AsyncIterator[Tuple[LogtoClient, FakeLogtoServer]]:
+    """
+    Start a `FakeLogtoServer` with the options, and sign in a client to it.
+    """
+    async with transport or HttpTransport() as transport, FakeLogtoServer(
+        **serverOptions
+    ) as server:
+        client = LogtoClient(
+            LogtoConfig(
+                endpoint=server.endpoint,
+                appId="app",
+                **{"scopes": [UserInfoScope.organizations], **(configOptions or {})},
+            ),
+            storage or CountingStorage(),
+            transport=transport,
+        )
+        signInUrl = await client.signIn("http://app.test/callback")
+        async with transport.session.get(signInUrl, allow_redirects=False) as resp:
+            await client.handleSignInCallback(resp.headers["Location"])
+        yield client, server
+
+
+class TestGraceMode:
+    async def test_getAccessToken(self, mocker: MockerFixture) -> None:
+        mocker.patch("logto.RetryPolicy.random").uniform.return_value = 0
+        breaker = CircuitBreaker(failureThreshold=3, gracePeriod=60)
+        async with signedIn(
+            transport=HttpTransport(circuitBreaker=breaker), accessTokenTtl=3600
+        ) as (client, server):
+            accessToken = await client.getAccessToken("https://api.test")
+
+            # The token is due for a refresh but not expired, and Logto is down
+            mocker.patch("logto.LogtoClient.time").time.return_value = (
+                time.time() + 3600 - 30
+            )
+            server.errorRate = 1
+            with pytest.raises(LogtoException):
+                await client.getAccessToken("https://api.test")
+            tokenRequests = server.requests["/oidc/token"]
+
+            assert await client.getAccessToken("https://api.test") == accessToken
+            assert server.requests["/oidc/token"] == tokenRequests
+
+            breaker.gracePeriod = 0
+            with pytest.raises(LogtoCircuitOpenException):
+                await client.getAccessToken("https://api.test")
+
+
+class TestDeadlines:
+    async def test_getAccessToken(self) -> None:
+        async with signedIn(faultPaths=["/oidc/token"]) as (client, server):
+            server.latency = 0.5
+            start = time.monotonic()
+            with pytest.raises(LogtoDeadlineExceededException):
+                await client.getAccessToken("https://api.test", deadline=start + 0.1)
+            assert time.monotonic() - start < 0.4
+
+            server.latency = 0
+            assert await client.getAccessToken(
+                "https://api.test", deadline=time.monotonic() + 10
+            )
+
+    async def test_timeouts(self) -> None:
+        async with signedIn(
+            configOptions={"timeouts": Timeouts(userInfo=Timeout(total=0.05))},
+            faultPaths=["/oidc/me"],
+        ) as (client, server):
+            server.latency = 0.5
+            with pytest.raises(asyncio.TimeoutError):
+                await client.fetchUserInfo()
+            # Each attempt is timed out
+            assert server.requests["/oidc/me"] == 3
+
+            with pytest.raises(LogtoDeadlineExceededException):
+                await client.fetchUserInfo(deadline=time.monotonic() + 0.08)
+
+    async def test_sharedRefresh(self) -> None:
+        async with signedIn(faultPaths=["/oidc/token"]) as (client, server):
+            server.latency = 0.2
+            leader = asyncio.ensure_future(
+                client.getAccessToken(
+                    "https://api.test", deadline=time.monotonic() + 0.05
+                )
+            )
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(client.getAccessToken("https://api.test"))
+
+            with pytest.raises(LogtoDeadlineExceededException):
+                await leader
+            # The refresh started by the leader isn't cut short by its deadline
+            assert await follower
+            assert server.requests["/oidc/token"] == 2
+
+
+class TestGetOrganizationTokens:
+    async def test_concurrent(self) -> None:
+        storage = CountingStorage()
+        async with signedIn(storage, faultPaths=["/oidc/token"]) as (
+            client,
+            server,
+        ):
+            token = await client.getOrganizationToken("a")
+            server.latency = 0.1
+            writes = storage.writes
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            tokens = await client.getOrganizationTokens(
+                ["a", "b", "c", "d", "e"], concurrency=4
+            )
+
+            # One request to learn that the refresh token is not rotated, then the
+            # other three at once
+            assert loop.time() - start < 0.35
+            assert server.requests["/oidc/token"] == 6
+            assert storage.writes == writes + 1
+            assert list(tokens) == ["a", "b", "c", "d", "e"]
+            assert tokens["a"] == token
+            for organizationId in "bcde":
+                assert (
+                    OidcCore.decodeAccessToken(tokens[organizationId] or "").aud
+                    == f"urn:logto:organization:{organizationId}"
+                )
+                assert await client.getOrganizationToken(organizationId) == (
+                    tokens[organizationId]
+                )
+            assert server.requests["/oidc/token"] == 6
+
+    async def test_rotatedRefreshToken(self) -> None:
+        storage = CountingStorage()
+        async with signedIn(storage, rotateRefreshTokens=True) as (client, _):
+            tokens = await client.getOrganizationTokens(["a", "b", "c"])
+
+            assert all(tokens.values())
+            # The latest refresh token is stored and still valid
+            assert await client.getAccessToken("https://api.test")
+
+    async def test_rotatedRefreshToken_concurrent(self) -> None:
+        async with signedIn(rotateRefreshTokens=True) as (client, server):
+            server.latency = 0.05
+            tokens, token = await asyncio.gather(
+                client.getOrganizationTokens(["a", "b", "c", "d"]),
+                client.getOrganizationToken("d"),
+            )
+
+            # The single grant waits for the batch instead of reusing a rotated
+            # refresh token
+            assert all(tokens.values())
+            assert token == tokens["d"]
+            assert server.requests["/oidc/token"] == 5
+            assert await client.getAccessToken("https://api.test")
+
+    async def test_invalidConcurrency(self) -> None:
+        async with signedIn() as (client, server):
+            with pytest.raises(LogtoException, match="at least 1"):
+                await client.getOrganizationTokens(["a", "b"], concurrency=0)
+            assert server.requests["/oidc/token"] == 1
+
+    async def test_errors(self) -> None:
+        storage = CountingStorage()
+        async with signedIn(storage) as (client, server):
+            await client.getOrganizationTokens(["a"])
+            server.errorRate = 1
+            with pytest.raises(LogtoException):
+                await client.getOrganizationTokens(["a", "b"])
+
+            # The stored tokens are kept
+            server.errorRate = 0
+            assert (await client.getOrganizationTokens(["a"]))["a"]
@@ -0,0 +1,364 @@
+"""
+The dependency-free metrics of the Logto client, collected from the spans of the
+client (see `Tracer`) and exposed in the Prometheus text format.
+"""
+
+import bisect
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, ContextManager, Dict, List, Optional, Sequence, Tuple
+
+from .Tracer import Span, Tracer, noopTracer
+from .utilities import OrganizationUrnPrefix
+
+LabelValues = Tuple[str, ...]
+
+defaultBuckets: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+"""
+The default histogram buckets (in seconds), from in-process storage accesses to slow
+network requests.
+"""
+
+
+class Metric(ABC):
+    """
+    The base class of the metrics, with the values keyed by the label values.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labelNames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labelNames)
+        self._lock = threading.Lock()
+
+    def _formatLabels(self, labelValues: LabelValues, extra: str = "") -> str:
+        labels = [
+            f'{name}="{_escape(value)}"'
+            for name, value in zip(self.labelNames, labelValues)
+        ]
+        if extra:
+            labels.append(extra)
+        return "{" + ",".join(labels) + "}" if labels else ""
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """
+        The sample lines of the metric in the Prometheus text format.
+        """
+        ...
+
+
+class Counter(Metric):
+    """
+    A monotonically increasing counter.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelNames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelNames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, labelValues: LabelValues = (), amount: float = 1) -> None:
+        with self._lock:
+            self.values[labelValues] = self.values.get(labelValues, 0) + amount
+
+    def get(self, labelValues: LabelValues = ()) -> float:
+        return self.values.get(labelValues, 0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{self._formatLabels(labelValues)} {_formatValue(value)}"
+            for labelValues, value in sorted(self.values.items())
+        ]
+
+
+class Gauge(Counter):
+    """
+    A value that can go up and down, e.g. the number of in-flight requests.
+    """
+
+    type = "gauge"
+
+    def dec(self, labelValues: LabelValues = (), amount: float = 1) -> None:
+        self.inc(labelValues, -amount)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self, size: int) -> None:
+        self.buckets = [0] * size
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(Metric):
+    """
+    A histogram of observed values (e.g. latencies in seconds) in cumulative buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelNames: Sequence[str] = (),
+        buckets: Sequence[float] = defaultBuckets,
+    ) -> None:
+        super().__init__(name, help, labelNames)
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[LabelValues, _HistogramValue] = {}
+
+    def observe(self, value: float, labelValues: LabelValues = ()) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self.values.get(labelValues)
+            if histogram is None:
+                histogram = self.values[labelValues] = _HistogramValue(
+                    len(self.buckets)
+                )
+            if index < len(self.buckets):
+                histogram.buckets[index] += 1
+            histogram.count += 1
+            histogram.sum += value
+
+    def getCount(self, labelValues: LabelValues = ()) -> int:
+        histogram = self.values.get(labelValues)
+        return 0 if histogram is None else histogram.count
+
+    def samples(self) -> List[str]:
+        lines: List[str] = []
+        for labelValues, histogram in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.buckets):
+                cumulative += count
+                labels = self._formatLabels(labelValues, f'le="{_formatValue(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = self._formatLabels(labelValues, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {histogram.count}")
+            labels = self._formatLabels(labelValues)
+            lines.append(f"{self.name}_sum{labels} {_formatValue(histogram.sum)}")
+            lines.append(f"{self.name}_count{labels} {histogram.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The registry of the Logto client metrics. Pass a `MetricsTracer` with the registry
+    to the clients to collect them, and serve `render()` on a metrics endpoint.
+
+    The metrics are:
+
+    - `logto_http_request_duration_seconds`: the latency of the requests to Logto by
+      `endpoint` (`discovery`, `token`, `jwks` or `userinfo`) and `status` (`error`
+      if no response was received)
+    - `logto_http_requests_in_flight`: the in-flight requests to Logto by `endpoint`
+    - `logto_token_refreshes_total`: the refresh token grants by `resource`, each
+      counted once regardless of its retries. The grants of all organizations are
+      counted as the `organization` resource, so the number of series doesn't grow
+      with the number of organizations
+    - `logto_access_token_cache_total`: the `getAccessToken` calls by `result` (`hit`
+      if served from storage, `miss` if a token request was needed)
+    - `logto_verification_cache_total`: the lookups of the verified token caches by
+      `token` (`id_token` or `access_token`) and `result`, only counted if the cache
+      is enabled
+    - `logto_storage_operation_duration_seconds`: the latency of the storage by
+      `operation` (`getMany`, `setMany` or `deleteMany`)
+    - `logto_operation_duration_seconds`: the latency of `signIn`,
+      `handleSignInCallback` and `getAccessToken` by `operation`
+    """
+
+    def __init__(self, buckets: Sequence[float] = defaultBuckets) -> None:
+        self.httpDuration = Histogram(
+            "logto_http_request_duration_seconds",
+            "The latency of the requests to Logto.",
+            ("endpoint", "status"),
+            buckets,
+        )
+        self.httpInFlight = Gauge(
+            "logto_http_requests_in_flight",
+            "The in-flight requests to Logto.",
+            ("endpoint",),
+        )
+        self.tokenRefreshes = Counter(
+            "logto_token_refreshes_total",
+            "The refresh token grants.",
+            ("resource",),
+        )
+        self.accessTokenCache = Counter(
+            "logto_access_token_cache_total",
+            "The getAccessToken calls served from storage (hit) or Logto (miss).",
+            ("result",),
+        )
+        self.verificationCache = Counter(
+            "logto_verification_cache_total",
+            "The lookups of the verified token caches.",
+            ("token", "result"),
+        )
+        self.storageDuration = Histogram(
+            "logto_storage_operation_duration_seconds",
+            "The latency of the storage operations.",
+            ("operation",),
+            buckets,
+        )
+        self.operationDuration = Histogram(
+            "logto_operation_duration_seconds",
+            "The latency of the client operations.",
+            ("operation",),
+            buckets,
+        )
+
+    @property
+    def metrics(self) -> List[Metric]:
+        return [value for value in vars(self).values() if isinstance(value, Metric)]
+
+    def render(self) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsSpan(Span):
+    def __init__(
+        self,
+        tracer: "MetricsTracer",
+        name: str,
+        attributes: Dict[str, Any],
+        inner: ContextManager[Span],
+    ) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.inner = inner
+        self.innerSpan: Span
+        self.start = 0.0
+
+    def setAttribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+        self.innerSpan.setAttribute(key, value)
+
+    def __enter__(self) -> "_MetricsSpan":
+        self.innerSpan = self.inner.__enter__()
+        self.traceparent = self.innerSpan.traceparent
+        self.tracer._enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> Any:
+        self.tracer._exit(self, time.perf_counter() - self.start)
+        return self.inner.__exit__(exc_type, exc_value, traceback)
+
+
+_verificationSpans = {
+    "logto.verifyIdToken": "id_token",
+    "logto.verifyAccessToken": "access_token",
+}
+
+
+class MetricsTracer(Tracer):
+    """
+    The tracer that collects the metrics in `MetricsRegistry` from the spans of the
+    client, and passes the spans on to another tracer (if any), so metrics and
+    tracing can be used together.
+
+    Example:
+      ```python
+      metrics = MetricsTracer()
+      client = LogtoClient(config, storage, tracer=metrics)
+
+      @app.route("/metrics")
+      def serveMetrics():
+          return metrics.registry.render(), {"Content-Type": "text/plain"}
+      ```
+    """
+
+    def __init__(
+        self,
+        registry: Optional[MetricsRegistry] = None,
+        tracer: Optional[Tracer] = None,
+    ) -> None:
+        self.registry = registry or MetricsRegistry()
+        self.tracer = tracer or noopTracer
+
+    def span(
+        self, name: str, attributes: Optional[Dict[str, Any]] = None
+    ) -> ContextManager[Span]:
+        return _MetricsSpan(
+            self, name, dict(attributes or {}), self.tracer.span(name, attributes)
+        )
+
+    def _enter(self, span: _MetricsSpan) -> None:
+        if span.name.startswith("logto.http."):
+            self.registry.httpInFlight.inc((span.name[len("logto.http.") :],))
+
+    def _exit(self, span: _MetricsSpan, duration: float) -> None:
+        registry = self.registry
+        name = span.name
+        attributes = span.attributes
+
+        if name.startswith("logto.http."):
+            endpoint = name[len("logto.http.") :]
+            registry.httpInFlight.dec((endpoint,))
+            status = attributes.get("http.response.status_code", "error")
+            registry.httpDuration.observe(duration, (endpoint, str(status)))
+        elif name == "logto.refreshToken":
+            # Counted once per grant, however many attempts it takes
+            registry.tokenRefreshes.inc(
+                (_resourceLabel(attributes.get("logto.resource", "")),)
+            )
+        elif name.startswith("logto.storage."):
+            registry.storageDuration.observe(duration, (name[len("logto.storage.") :],))
+        elif name in _verificationSpans:
+            if "logto.cache_hit" in attributes:
+                registry.verificationCache.inc(
+                    (_verificationSpans[name], _result(attributes["logto.cache_hit"]))
+                )
+        else:
+            registry.operationDuration.observe(duration, (name[len("logto.") :],))
+            if "logto.cache_hit" in attributes:
+                registry.accessTokenCache.inc((_result(attributes["logto.cache_hit"]),))
+
+
+def _resourceLabel(resource: str) -> str:
+    return "organization" if resource.startswith(OrganizationUrnPrefix) else resource
+
+
+def _result(cacheHit: bool) -> str:
+    return "hit" if cacheHit else "miss"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatValue(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
@@ -0,0 +1,183 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import pytest
+from pytest_mock import MockerFixture
+
+from . import LogtoClient, LogtoConfig, LogtoException
+from .HttpTransport import HttpResponse, HttpTransport
+from .Metrics import Counter, Histogram, Metric, MetricsRegistry, MetricsTracer
+from .OidcCore import OidcCore
+from .Storage import MemoryStorage
+from .Tracer import Span, Tracer, tracedRequest
+from .utilities.cache import VerifiedTokenCache
+from .utilities.test import FakeLogtoServer
+
+
+class TestMetrics:
+    def test_counter(self) -> None:
+        counter = Counter("requests_total", "The requests.", ("path",))
+        counter.inc(("/a",))
+        counter.inc(('/"b"\n',), 2)
+
+        assert counter.get(("/a",)) == 1
+        assert counter.samples() == [
+            'requests_total{path="/\\"b\\"\\n"} 2',
+            'requests_total{path="/a"} 1',
+        ]
+
+    def test_histogram(self) -> None:
+        histogram = Histogram("latency_seconds", "The latency.", buckets=(0.1, 1))
+        for value in [0.05, 0.1, 0.5, 2]:
+            histogram.observe(value)
+
+        assert histogram.getCount() == 4
+        assert histogram.samples() == [
+            'latency_seconds_bucket{le="0.1"} 2',
+            'latency_seconds_bucket{le="1"} 3',
+            'latency_seconds_bucket{le="+Inf"} 4',
+            "latency_seconds_sum 2.65",
+            "latency_seconds_count 4",
+        ]
+
+    def test_metric_abstract(self) -> None:
+        with pytest.raises(TypeError):
+            Metric("metric", "The metric.")  # type: ignore
+
+    def test_render(self) -> None:
+        registry = MetricsRegistry()
+        registry.tokenRefreshes.inc(("https://api.test",))
+        text = registry.render()
+
+        assert text.endswith("\n")
+        assert (
+            "# HELP logto_token_refreshes_total The refresh token grants.\n"
+            "# TYPE logto_token_refreshes_total counter\n"
+            'logto_token_refreshes_total{resource="https://api.test"} 1\n'
+        ) in text
+        assert "# TYPE logto_http_request_duration_seconds histogram\n" in text
+
+
+class TestMetricsTracer:
+    async def test_LogtoClient(self) -> None:
+        metrics = MetricsTracer()
+        registry = metrics.registry
+        async with HttpTransport() as transport, FakeLogtoServer() as server:
+            client = LogtoClient(
+                LogtoConfig(endpoint=server.endpoint, appId="app"),
+                MemoryStorage(),
+                transport=transport,
+                tracer=metrics,
+            )
+            signInUrl = await client.signIn("http://app.test/callback")
+            async with transport.session.get(signInUrl, allow_redirects=False) as resp:
+                await client.handleSignInCallback(resp.headers["Location"])
+            await client.getAccessToken()
+            await client.getAccessToken()
+            await client.getAccessToken("https://api.test")
+
+            server.errorRate = 1
+            with pytest.raises(LogtoException):
+                await client.fetchUserInfo()
+
+        assert registry.httpDuration.getCount(("discovery", "200")) == 1
+        assert registry.httpDuration.getCount(("jwks", "200")) == 1
+        assert registry.httpDuration.getCount(("token", "200")) == 2
+        # Retried by the default policy
+        assert registry.httpDuration.getCount(("userinfo", "503")) == 3
+        assert all(value == 0 for value in registry.httpInFlight.values.values())
+        assert registry.tokenRefreshes.values == {("https://api.test",): 1}
+        # `fetchUserInfo` gets the access token from storage too
+        assert registry.accessTokenCache.values == {("hit",): 3, ("miss",): 1}
+        # The refresh reads the tokens again while holding the session lock
+        assert registry.storageDuration.getCount(("getMany",)) == 6
+        assert registry.operationDuration.getCount(("getAccessToken",)) == 4
+        assert registry.operationDuration.getCount(("signIn",)) == 1
+        assert registry.verificationCache.values == {}
+
+    async def test_verificationCache(self) -> None:
+        metrics = MetricsTracer()
+        async with HttpTransport() as transport, FakeLogtoServer() as server:
+            oidcCore = OidcCore(
+                await OidcCore.getProviderMetadata(
+                    f"{server.endpoint}/oidc/.well-known/openid-configuration",
+                    transport,
+                ),
+                transport,
+                verificationCache=VerifiedTokenCache(),
+                tracer=metrics,
+            )
+            idToken = server.sign({"sub": "user", "aud": "app"})
+            for _ in range(3):
+                await oidcCore.verifyIdToken(idToken, "app")
+
+        assert metrics.registry.verificationCache.values == {
+            ("id_token", "miss"): 1,
+            ("id_token", "hit"): 2,
+        }
+
+    async def test_tokenRefreshes_retried(self, mocker: MockerFixture) -> None:
+        mocker.patch("logto.RetryPolicy.random").uniform.return_value = 0
+        metrics = MetricsTracer()
+        async with HttpTransport() as transport, FakeLogtoServer(
+            faultPaths=["/oidc/token"]
+        ) as server:
+            oidcCore = OidcCore(server.metadata, transport, tracer=metrics)
+            server.errorRate = 1
+            with pytest.raises(LogtoException):
+                await oidcCore.fetchTokenByRefreshToken(
+                    "app", None, "refresh_token", "https://api.test"
+                )
+            server.errorRate = 0
+            for organizationId in ["a", "b"]:
+                await oidcCore.fetchTokenByRefreshToken(
+                    "app",
+                    None,
+                    server.issueRefreshToken(),
+                    f"urn:logto:organization:{organizationId}",
+                )
+
+        # Three attempts of one grant
+        assert metrics.registry.httpDuration.getCount(("token", "503")) == 3
+        # The organizations share one series
+        assert metrics.registry.tokenRefreshes.values == {
+            ("https://api.test",): 1,
+            ("organization",): 2,
+        }
+
+    async def test_innerTracer(self) -> None:
+        class InnerSpan(Span):
+            traceparent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+            def __init__(self) -> None:
+                self.attributes: Dict[str, Any] = {}
+
+            def setAttribute(self, key: str, value: Any) -> None:
+                self.attributes[key] = value
+
+        class InnerTracer(Tracer):
+            def __init__(self) -> None:
+                self.spans: Dict[str, InnerSpan] = {}
+
+            @contextmanager
+            def span(
+                self, name: str, attributes: Optional[Dict[str, Any]] = None
+            ) -> Iterator[Span]:
+                self.spans[name] = InnerSpan()
+                yield self.spans[name]
+
+        class StubTransport(HttpTransport):
+            async def request(self, method: Any, url: str, **kwargs: Any) -> Any:
+                self.headers = kwargs["headers"]
+                return HttpResponse(200, {}, json={})
+
+        inner = InnerTracer()
+        transport = StubTransport()
+        await tracedRequest(
+            MetricsTracer(tracer=inner), transport, "jwks", "get", "https://logto.app"
+        )
+
+        assert transport.headers["traceparent"] == InnerSpan.traceparent
+        assert inner.spans["logto.http.jwks"].attributes == {
+            "http.response.status_code": 200
+        }
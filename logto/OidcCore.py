@@ -5,13 +5,14 @@ instance methods.
 """
 
 import hashlib
-import secrets
+import json
 from typing import List, Optional
 
-import aiohttp
 import jwt
-from jwt import PyJWKClient
 
+from .CircuitBreaker import LogtoCircuitOpenException
+from .HttpTransport import HttpTransport, defaultTransport
+from .JwksStore import JwksStore
 from .LogtoException import LogtoException
 from .models.oidc import (
     AccessTokenClaims,
@@ -22,7 +23,34 @@ from .models.oidc import (
     UserInfoScope,
 )
 from .models.response import TokenResponse, UserInfoResponse
-from .utilities import OrganizationUrnPrefix, removeFalsyKeys, urlsafeEncode
+from .RetryPolicy import RetryPolicies, RetryPolicy, defaultRetryPolicies
+from .SharedCache import SharedCache
+from .Timeouts import Timeout, Timeouts, toClientTimeout
+from .Tracer import Tracer, noopTracer, tracedRequest
+from .utilities import (
+    OrganizationUrnPrefix,
+    removeFalsyKeys,
+    tokenBytes,
+    urlsafeEncode,
+)
+from .utilities.cache import AsyncTtlCache, VerifiedTokenCache
+
+providerMetadataCache: AsyncTtlCache[OidcProviderMetadata] = AsyncTtlCache(
+    ttl=600, staleTtl=3600
+)
+"""
+The process-wide provider metadata cache keyed by the discovery URL. By default the
+metadata is considered fresh for 10 minutes, and can be served for another hour while
+it's being revalidated in the background.
+
+The settings can be changed at startup, e.g. `providerMetadataCache.ttl = 60`. Set
+`ttl` to 0 to disable caching (concurrent fetches are still deduplicated).
+
+Note: the background revalidation runs in the caller's event loop. If each request
+runs on a fresh event loop (e.g. Flask async views), the revalidation is cancelled
+when the request ends; set `staleTtl` to 0 in this case so expired metadata is
+re-fetched in the foreground instead.
+"""
 
 
 class OidcCore:
@@ -31,24 +59,61 @@ class OidcCore:
         OAuthScope.offlineAccess,
         UserInfoScope.profile,
     ]
+    signingAlgorithms: List[str] = ["RS256", "PS256", "ES256", "ES384", "ES512"]
+    """
+    The JWT signing algorithms accepted when verifying tokens issued by Logto.
+    """
 
-    def __init__(self, metadata: OidcProviderMetadata) -> None:
+    def __init__(
+        self,
+        metadata: OidcProviderMetadata,
+        transport: Optional[HttpTransport] = None,
+        verificationCache: Optional[VerifiedTokenCache[IdTokenClaims]] = None,
+        sharedCache: Optional[SharedCache] = None,
+        tracer: Optional[Tracer] = None,
+        retryPolicies: Optional[RetryPolicies] = None,
+        timeouts: Optional[Timeouts] = None,
+    ) -> None:
         """
         Initialize the OIDC core with the provider metadata. You can use the
         `getProviderMetadata` method to fetch the provider metadata from the
         discovery URL.
+
+        The given transport will be used for all network requests, the process-wide
+        `defaultTransport` will be used if it's not provided.
+
+        If a verification cache is given, `verifyIdToken` will skip the signature
+        check for ID tokens that have been verified before and are not expired.
+
+        If a shared cache is given, the JWKS is shared with other processes on the
+        host. If a tracer is given, the network requests and the ID token verification
+        are traced.
+
+        Failed requests are retried by `retryPolicies`, or the process-wide
+        `defaultRetryPolicies` if they're not provided. Each attempt is bounded by
+        `timeouts`, or the default `Timeouts` if they're not provided.
         """
         self.metadata = metadata
-        self.jwksClient = PyJWKClient(
-            metadata.jwks_uri, headers={"user-agent": "@logto/python", "accept": "*/*"}
+        self.transport = transport or defaultTransport
+        self.tracer = tracer or noopTracer
+        self.retryPolicies = retryPolicies or defaultRetryPolicies
+        self.timeouts = timeouts or Timeouts()
+        self.jwksStore = JwksStore(
+            metadata.jwks_uri,
+            self.transport,
+            sharedCache=sharedCache,
+            tracer=tracer,
+            retryPolicy=retryPolicies.jwks if retryPolicies else None,
+            timeout=self.timeouts.jwks,
         )
+        self.verificationCache = verificationCache
 
     @staticmethod
     def generateState() -> str:
         """
         Generate a random string (32 bytes) for the state parameter.
         """
-        return urlsafeEncode(secrets.token_bytes(32))
+        return urlsafeEncode(tokenBytes(32))
 
     @staticmethod
     def generateCodeVerifier() -> str:
@@ -57,7 +122,7 @@ class OidcCore:
 
         See: https://www.rfc-editor.org/rfc/rfc7636.html#section-4.1
         """
-        return urlsafeEncode(secrets.token_bytes(32))
+        return urlsafeEncode(tokenBytes(32))
 
     @staticmethod
     def generateCodeChallenge(codeVerifier: str) -> str:
@@ -85,14 +150,70 @@ class OidcCore:
         )
 
     @staticmethod
-    async def getProviderMetadata(discoveryUrl: str) -> OidcProviderMetadata:
+    async def getProviderMetadata(
+        discoveryUrl: str,
+        transport: Optional[HttpTransport] = None,
+        useCache: bool = True,
+        sharedCache: Optional[SharedCache] = None,
+        tracer: Optional[Tracer] = None,
+        retryPolicy: Optional[RetryPolicy] = None,
+        timeout: Optional[Timeout] = None,
+    ) -> OidcProviderMetadata:
         """
-        Fetch the provider metadata from the discovery URL.
+        Fetch the provider metadata from the discovery URL. The process-wide
+        `defaultTransport` will be used if no transport is given.
+
+        The result is cached in `providerMetadataCache` by the discovery URL, so the
+        metadata is shared by all clients in the process and concurrent calls only
+        trigger one discovery request. Set `useCache` to `False` to always fetch the
+        latest metadata.
+
+        If a shared cache is given, the metadata is also shared with other processes
+        on the host for `providerMetadataCache.ttl` seconds, so only one of them
+        fetches it when the cache expires.
+
+        Failed requests are retried by the given retry policy, or
+        `defaultRetryPolicies.discovery` if it's not provided, and each attempt is
+        bounded by the given timeout (or the default `Timeout`). If the circuit to the
+        endpoint is open and still in its grace period (see `CircuitBreaker`), the
+        cached metadata is returned even if it has expired.
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.get(discoveryUrl) as resp:
-                json = await resp.json()
-                return OidcProviderMetadata(**json)
+
+        async def download() -> bytes:
+            resp = await (retryPolicy or defaultRetryPolicies.discovery).run(
+                lambda: tracedRequest(
+                    tracer or noopTracer,
+                    transport or defaultTransport,
+                    "discovery",
+                    "get",
+                    discoveryUrl,
+                    timeout=toClientTimeout(timeout or Timeout()),
+                )
+            )
+            if resp.status != 200:
+                raise LogtoException(resp.text)
+
+            return json.dumps(resp.json).encode()
+
+        async def fetch() -> OidcProviderMetadata:
+            if sharedCache is None or not useCache:
+                metadata = await download()
+            else:
+                metadata = await sharedCache.getOrLoad(
+                    f"metadata:{discoveryUrl}", download, providerMetadataCache.ttl
+                )
+            return OidcProviderMetadata(**json.loads(metadata))
+
+        if not useCache:
+            return await fetch()
+
+        try:
+            return await providerMetadataCache.getOrLoad(discoveryUrl, fetch)
+        except LogtoCircuitOpenException as e:
+            metadata = providerMetadataCache.getStale(discoveryUrl)
+            if not e.grace or metadata is None:
+                raise
+            return metadata
 
     async def fetchTokenByCode(
         self,
@@ -106,9 +227,15 @@ class OidcCore:
         Fetch the token from the token endpoint using the authorization code.
         """
         tokenEndpoint = self.metadata.token_endpoint
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
+        resp = await self.retryPolicies.authorizationCode.run(
+            lambda: tracedRequest(
+                self.tracer,
+                self.transport,
+                "token",
+                "post",
                 tokenEndpoint,
+                {"logto.grant_type": "authorization_code"},
+                timeout=toClientTimeout(self.timeouts.authorizationCode),
                 data={
                     "grant_type": "authorization_code",
                     "client_id": clientId,
@@ -117,12 +244,12 @@ class OidcCore:
                     "code": code,
                     "code_verifier": codeVerifier,
                 },
-            ) as resp:
-                if resp.status != 200:
-                    raise LogtoException(await resp.text())
+            )
+        )
+        if resp.status != 200:
+            raise LogtoException(resp.text)
 
-                json = await resp.json()
-                return TokenResponse(**json)
+        return TokenResponse(**resp.json)
 
     async def fetchTokenByRefreshToken(
         self,
@@ -138,49 +265,75 @@ class OidcCore:
         and used as the `organization_id` parameter.
         """
         tokenEndpoint = self.metadata.token_endpoint
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                tokenEndpoint,
-                data=removeFalsyKeys(
-                    {
-                        "grant_type": "refresh_token",
-                        "client_id": clientId,
-                        "client_secret": clientSecret,
-                        "refresh_token": refreshToken,
-                        "resource": (
-                            resource
-                            if not resource.startswith(OrganizationUrnPrefix)
-                            else None
-                        ),
-                        "organization_id": (
-                            resource[len(OrganizationUrnPrefix) :]
-                            if resource.startswith(OrganizationUrnPrefix)
-                            else None
-                        ),
-                    }
-                ),
-            ) as resp:
-                if resp.status != 200:
-                    raise LogtoException(await resp.text())
-
-                json = await resp.json()
-                return TokenResponse(**json)
-
-    def verifyIdToken(self, idToken: str, clientId: str) -> None:
+        # One span for the grant, which covers the traced request of each attempt
+        with self.tracer.span("logto.refreshToken", {"logto.resource": resource}):
+            resp = await self.retryPolicies.refreshToken.run(
+                lambda: tracedRequest(
+                    self.tracer,
+                    self.transport,
+                    "token",
+                    "post",
+                    tokenEndpoint,
+                    {"logto.grant_type": "refresh_token", "logto.resource": resource},
+                    timeout=toClientTimeout(self.timeouts.refreshToken),
+                    data=removeFalsyKeys(
+                        {
+                            "grant_type": "refresh_token",
+                            "client_id": clientId,
+                            "client_secret": clientSecret,
+                            "refresh_token": refreshToken,
+                            "resource": (
+                                resource
+                                if not resource.startswith(OrganizationUrnPrefix)
+                                else None
+                            ),
+                            "organization_id": (
+                                resource[len(OrganizationUrnPrefix) :]
+                                if resource.startswith(OrganizationUrnPrefix)
+                                else None
+                            ),
+                        }
+                    ),
+                )
+            )
+        if resp.status != 200:
+            raise LogtoException(resp.text)
+
+        return TokenResponse(**resp.json)
+
+    async def verifyIdToken(self, idToken: str, clientId: str) -> IdTokenClaims:
         """
         Verify the ID Token signature and its issuer and client ID, throw an exception
-        if the verification fails.
-        """
-        issuer = self.metadata.issuer
-        signing_key = self.jwksClient.get_signing_key_from_jwt(idToken)
-        jwt.decode(
-            idToken,
-            signing_key.key,
-            algorithms=["RS256", "PS256", "ES256", "ES384", "ES512"],
-            audience=clientId,
-            issuer=issuer,
-            leeway=30,
-        )
+        if the verification fails. Returns the claims of the verified ID Token.
+
+        The signing key is looked up in `jwksStore`, which only fetches the JWKS when
+        the key is unknown.
+        """
+        with self.tracer.span("logto.verifyIdToken") as span:
+            issuer = self.metadata.issuer
+            # The cache may be shared by the cores of other tenants
+            context = f"{issuer}\0{clientId}"
+            if self.verificationCache is not None:
+                cachedClaims = self.verificationCache.get(idToken, context)
+                span.setAttribute("logto.cache_hit", cachedClaims is not None)
+                if cachedClaims is not None:
+                    return cachedClaims
+
+            signing_key = await self.jwksStore.getSigningKeyFromJwt(idToken)
+            claims = IdTokenClaims(
+                **jwt.decode(
+                    idToken,
+                    signing_key.key,
+                    algorithms=self.signingAlgorithms,
+                    audience=clientId,
+                    issuer=issuer,
+                    leeway=30,
+                )
+            )
+
+            if self.verificationCache is not None:
+                self.verificationCache.set(idToken, claims, claims.exp, context)
+            return claims
 
     async def fetchUserInfo(self, accessToken: str) -> UserInfoResponse:
         """
@@ -189,12 +342,18 @@ class OidcCore:
         See: https://openid.net/specs/openid-connect-core-1_0.html#UserInfo
         """
         userInfoEndpoint = self.metadata.userinfo_endpoint
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                userInfoEndpoint, headers={"Authorization": f"Bearer {accessToken}"}
-            ) as resp:
-                if resp.status != 200:
-                    raise LogtoException(await resp.text())
-
-                json = await resp.json()
-                return UserInfoResponse(**json)
+        resp = await self.retryPolicies.userInfo.run(
+            lambda: tracedRequest(
+                self.tracer,
+                self.transport,
+                "userinfo",
+                "get",
+                userInfoEndpoint,
+                timeout=toClientTimeout(self.timeouts.userInfo),
+                headers={"Authorization": f"Bearer {accessToken}"},
+            )
+        )
+        if resp.status != 200:
+            raise LogtoException(resp.text)
+
+        return UserInfoResponse(**resp.json)
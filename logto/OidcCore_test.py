@@ -1,4 +1,6 @@
+import asyncio
 import time
+from pathlib import Path
 from typing import Any, Callable, Dict, Optional
 from jwt import PyJWK
 import jwt
@@ -6,10 +8,14 @@ from pytest_mock import MockerFixture
 import pytest
 
 from . import LogtoException
-from .utilities.test import mockHttp, mockProviderMetadata
+from .CircuitBreaker import CircuitBreaker, LogtoCircuitOpenException
+from .utilities.test import FakeLogtoServer, mockHttp, mockProviderMetadata
 from .models.response import TokenResponse, UserInfoResponse
 from .models.oidc import IdTokenClaims, AccessTokenClaims, OidcProviderMetadata
-from .OidcCore import OidcCore
+from .HttpTransport import HttpResponse, HttpTransport, defaultTransport
+from .OidcCore import OidcCore, providerMetadataCache
+from .SharedCache import SharedCache
+from .utilities.cache import VerifiedTokenCache
 
 MockRequest = Callable[..., None]
 
@@ -91,6 +97,106 @@ class TestOidcCore:
 
         assert result == metadata
 
+    async def test_getProviderMetadata_cached(
+        self,
+        metadata: OidcProviderMetadata,
+        mocker: MockerFixture,
+    ) -> None:
+        discoveryUrl = "https://discovery.url"
+        request = mocker.patch(
+            "logto.HttpTransport.HttpTransport.request",
+            return_value=HttpResponse(200, {}, json=metadata.__dict__),
+        )
+        results = await asyncio.gather(
+            *(OidcCore.getProviderMetadata(discoveryUrl) for _ in range(1000))
+        )
+
+        assert all(result == metadata for result in results)
+        assert request.call_count == 1
+
+    async def test_getProviderMetadata_noCache(
+        self,
+        metadata: OidcProviderMetadata,
+        mocker: MockerFixture,
+    ) -> None:
+        request = mocker.patch(
+            "logto.HttpTransport.HttpTransport.request",
+            return_value=HttpResponse(200, {}, json=metadata.__dict__),
+        )
+        await OidcCore.getProviderMetadata("https://discovery.url")
+        await OidcCore.getProviderMetadata("https://discovery.url", useCache=False)
+
+        assert request.call_count == 2
+
+    async def test_getProviderMetadata_sharedCache(
+        self,
+        metadata: OidcProviderMetadata,
+        mocker: MockerFixture,
+        tmp_path: Path,
+    ) -> None:
+        request = mocker.patch(
+            "logto.HttpTransport.HttpTransport.request",
+            return_value=HttpResponse(200, {}, json=metadata.__dict__),
+        )
+        sharedCache = SharedCache(str(tmp_path))
+        await OidcCore.getProviderMetadata(
+            "https://discovery.url", sharedCache=sharedCache
+        )
+
+        # Another process has an empty in-process cache
+        providerMetadataCache.clear()
+        result = await OidcCore.getProviderMetadata(
+            "https://discovery.url", sharedCache=sharedCache
+        )
+
+        assert result == metadata
+        assert request.call_count == 1
+
+    async def test_getProviderMetadata_failure(
+        self,
+        mockRequest: MockRequest,
+    ) -> None:
+        mockRequest(text="error", status=500)
+        with pytest.raises(LogtoException, match="error"):
+            await OidcCore.getProviderMetadata("https://discovery.url")
+
+    async def test_getProviderMetadata_grace(self, mocker: MockerFixture) -> None:
+        breaker = CircuitBreaker(failureThreshold=1, gracePeriod=60)
+        async with HttpTransport(
+            circuitBreaker=breaker
+        ) as transport, FakeLogtoServer() as server:
+            discoveryUrl = f"{server.endpoint}/oidc/.well-known/openid-configuration"
+            metadata = await OidcCore.getProviderMetadata(discoveryUrl, transport)
+
+            # The cached metadata has expired, and Logto is down
+            mocker.patch("logto.utilities.cache.time").monotonic.return_value = (
+                time.monotonic() + 1e6
+            )
+            server.errorRate = 1
+            breaker.onFailure(discoveryUrl)
+            assert (
+                await OidcCore.getProviderMetadata(discoveryUrl, transport)
+            ) == metadata
+
+            breaker.gracePeriod = 0
+            with pytest.raises(LogtoCircuitOpenException):
+                await OidcCore.getProviderMetadata(discoveryUrl, transport)
+
+    async def test_transport(
+        self,
+        metadata: OidcProviderMetadata,
+        tokenResponse: TokenResponse,
+        mockRequest: MockRequest,
+    ) -> None:
+        transport = HttpTransport()
+        oidcCore = OidcCore(metadata, transport)
+        mockRequest(method="post", json=tokenResponse.__dict__)
+        await oidcCore.fetchTokenByRefreshToken("clientId", None, "refreshToken")
+
+        assert oidcCore.transport is transport
+        assert OidcCore(metadata).transport is defaultTransport
+        await transport.aclose()
+
     async def test_fetchTokenByCode(
         self,
         oidcCore: OidcCore,
@@ -142,21 +248,20 @@ class TestOidcCore:
     async def test_verifyIdToken(
         self,
         oidcCore: OidcCore,
-        mocker: MockerFixture,
+        mockRequest: MockRequest,
     ) -> None:
         # Mock PyJWK with a valid key
-        jwk = PyJWK(
-            jwk_data={
-                "kty": "EC",
-                "d": "EQw2P8sukYhYuc_H8Q5pV8oTlXfAd7TM1mB4fwrYuw4BGFBcFx-Y9q5g6lvyxfG9",
-                "use": "sig",
-                "crv": "P-384",
-                "kid": "1",
-                "x": "GWEhvHiHu2nfZNn741QeWPyn3Laphn11wcD9c5LWqPQTaqw-SlJIWXavrvl4Yv7f",
-                "y": "0KiYwX8U2pb74HCRby6ljlNgQGD-v_j5QN-MzXObRYa7XRQzKCrqj0_4BZN6UcS6",
-                "alg": "ES384",
-            }
-        )
+        jwkData = {
+            "kty": "EC",
+            "d": "EQw2P8sukYhYuc_H8Q5pV8oTlXfAd7TM1mB4fwrYuw4BGFBcFx-Y9q5g6lvyxfG9",
+            "use": "sig",
+            "crv": "P-384",
+            "kid": "1",
+            "x": "GWEhvHiHu2nfZNn741QeWPyn3Laphn11wcD9c5LWqPQTaqw-SlJIWXavrvl4Yv7f",
+            "y": "0KiYwX8U2pb74HCRby6ljlNgQGD-v_j5QN-MzXObRYa7XRQzKCrqj0_4BZN6UcS6",
+            "alg": "ES384",
+        }
+        jwk = PyJWK(jwk_data=jwkData)
 
         idToken = IdTokenClaims(
             iss="https://logto.app",
@@ -178,18 +283,45 @@ class TestOidcCore:
             headers={"kid": "1"},
         )
 
-        # Mock `get_signing_key_from_jwt` response from jwksClient
-        mocker.patch(
-            "jwt.jwks_client.PyJWKClient.get_signing_key_from_jwt",
-            return_value=jwk,
+        # Mock the JWKS response with the public key
+        mockRequest(
+            json={"keys": [{k: v for k, v in jwkData.items() if k != "d"}]},
         )
 
         # No error should be raised
-        oidcCore.verifyIdToken(
+        await oidcCore.verifyIdToken(
             idToken=idTokenString,
             clientId="foo",
         )
 
+        # Verify again with the verification cache
+        idToken.exp = int(time.time() + 60)
+        idTokenString = jwt.encode(
+            idToken.model_dump(),
+            jwk.key,
+            algorithm="ES384",
+            headers={"kid": "1"},
+        )
+        oidcCore.verificationCache = VerifiedTokenCache()
+        assert await oidcCore.verifyIdToken(idTokenString, "foo") == idToken
+        assert await oidcCore.verifyIdToken(idTokenString, "foo") == idToken
+        assert oidcCore.verificationCache.hits == 1
+
+        with pytest.raises(jwt.InvalidAudienceError):
+            await oidcCore.verifyIdToken(
+                idToken=idTokenString,
+                clientId="bar",
+            )
+
+        # The cache is shared with the core of another tenant
+        otherCore = OidcCore(
+            mockProviderMetadata.model_copy(update={"issuer": "https://other.app"}),
+            verificationCache=oidcCore.verificationCache,
+        )
+        otherCore.jwksStore = oidcCore.jwksStore
+        with pytest.raises(jwt.InvalidIssuerError):
+            await otherCore.verifyIdToken(idTokenString, "foo")
+
     async def test_fetchUserInfo(
         self,
         oidcCore: OidcCore,
@@ -0,0 +1,99 @@
+"""
+The lock interface for coordinating refresh token grants across processes, and the
+file lock implementation for processes on the same host.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, AsyncIterator
+
+from .LogtoException import LogtoException
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+
+
+class RefreshLock(ABC):
+    """
+    The lock that `LogtoClient` holds while refreshing tokens for a session and
+    resource. Concurrent refreshes in the same process are always deduplicated by the
+    client; implement this interface to extend the guarantee to multiple processes
+    (e.g. the workers of a web server) that share the same storage.
+
+    After acquiring the lock, the client checks the storage again, so a token refreshed
+    by another process is reused instead of refreshed twice.
+    """
+
+    @abstractmethod
+    def acquire(self, key: str) -> AsyncContextManager[None]:
+        """
+        Return an async context manager that holds the lock for the given key. The key
+        is an opaque hex digest that identifies the session and the resource.
+        """
+        ...
+
+
+class FileRefreshLock(RefreshLock):
+    """
+    The refresh lock backed by `flock(2)` on lock files in a local directory, which
+    coordinates the processes on the same host. Only available on POSIX systems.
+
+    Keys are hashed into a fixed number of lock files (`stripes`), so the number of
+    files is bounded no matter how many sessions there are.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        stripes: int = 256,
+        timeout: float = 30,
+        pollInterval: float = 0.01,
+    ) -> None:
+        """
+        Args:
+            directory: The directory for the lock files, it will be created if it
+                doesn't exist.
+            stripes: The number of lock files.
+            timeout: The time (in seconds) to wait for the lock before giving up.
+            pollInterval: The time (in seconds) between attempts to take the lock.
+        """
+        if fcntl is None:
+            raise LogtoException("FileRefreshLock is only available on POSIX systems")
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.stripes = stripes
+        self.timeout = timeout
+        self.pollInterval = pollInterval
+
+    def _path(self, key: str) -> str:
+        stripe = int(hashlib.sha256(key.encode()).hexdigest(), 16) % self.stripes
+        return os.path.join(self.directory, f"logto-refresh-{stripe}.lock")
+
+    @asynccontextmanager
+    async def acquire(self, key: str) -> AsyncIterator[None]:
+        fd = os.open(self._path(key), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    # Non-blocking, so waiting for the lock doesn't block the event loop
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise LogtoException("Timed out waiting for the refresh lock")
+                    await asyncio.sleep(self.pollInterval)
+
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
@@ -0,0 +1,44 @@
+import asyncio
+import sys
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from . import LogtoException
+from .RefreshLock import FileRefreshLock
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="FileRefreshLock requires POSIX"
+)
+
+
+class TestFileRefreshLock:
+    async def test_acquire_exclusive(self, tmp_path: Path) -> None:
+        # Use two instances, like two processes sharing the directory
+        locks = [FileRefreshLock(str(tmp_path)), FileRefreshLock(str(tmp_path))]
+        events: List[str] = []
+
+        async def hold(index: int) -> None:
+            async with locks[index].acquire("key"):
+                events.append(f"enter{index}")
+                await asyncio.sleep(0.02)
+                events.append(f"exit{index}")
+
+        await asyncio.gather(hold(0), hold(1))
+
+        assert events in (
+            ["enter0", "exit0", "enter1", "exit1"],
+            ["enter1", "exit1", "enter0", "exit0"],
+        )
+
+    async def test_acquire_timeout(self, tmp_path: Path) -> None:
+        lock = FileRefreshLock(str(tmp_path), timeout=0.05)
+
+        async with lock.acquire("key"):
+            with pytest.raises(LogtoException, match="Timed out"):
+                async with lock.acquire("key"):
+                    pass
+
+        async with lock.acquire("key"):
+            pass
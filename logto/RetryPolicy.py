@@ -0,0 +1,193 @@
+"""
+The retry policies for the requests to Logto, with capped exponential backoff, full
+jitter and `Retry-After` handling.
+"""
+
+import asyncio
+import email.utils
+import random
+import time
+from typing import AbstractSet, Awaitable, Callable, Optional
+
+import aiohttp
+
+from .HttpTransport import HttpResponse
+from .Timeouts import LogtoDeadlineExceededException, getRemainingTime
+
+
+class RetryPolicy:
+    """
+    The policy for retrying a request to Logto after a transient failure.
+
+    The delay before the n-th retry is drawn uniformly from
+    `[0, min(maxDelay, baseDelay * 2 ** (n - 1))]` ("full jitter"), so clients that
+    failed together don't retry together. If the response has a `Retry-After` header,
+    the delay is at least that long; a `Retry-After` longer than `maxRetryAfter` is
+    not waited for, and the response is returned as is.
+
+    Failures are classified by whether Logto may have processed the request:
+
+    - Responses with a status in `retryStatuses` are retried.
+    - Connection failures (`aiohttp.ClientConnectorError`), where the request was
+      never sent, are retried if `retryConnectionErrors` is set.
+    - Other errors, such as timeouts and dropped connections, leave the outcome
+      unknown. They are only retried if `retryAmbiguousErrors` is set, which is safe
+      for idempotent requests only.
+
+    If the operation has a deadline (see `runWithDeadline`) that would be missed by
+    waiting for the next retry, `LogtoDeadlineExceededException` is raised at once.
+    """
+
+    def __init__(
+        self,
+        maxAttempts: int = 3,
+        baseDelay: float = 0.1,
+        maxDelay: float = 2,
+        retryStatuses: AbstractSet[int] = frozenset({429, 500, 502, 503, 504}),
+        retryConnectionErrors: bool = True,
+        retryAmbiguousErrors: bool = True,
+        maxRetryAfter: float = 10,
+    ) -> None:
+        """
+        Args:
+            maxAttempts: The maximum number of attempts, including the first one.
+            baseDelay: The cap (in seconds) of the delay before the first retry.
+            maxDelay: The cap (in seconds) of the delay before any retry.
+            retryStatuses: The HTTP statuses to retry.
+            retryConnectionErrors: Whether to retry when the connection can't be
+                established.
+            retryAmbiguousErrors: Whether to retry other connection errors and
+                timeouts, where the request may have been processed.
+            maxRetryAfter: The longest `Retry-After` (in seconds) to wait for.
+        """
+        self.maxAttempts = maxAttempts
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.retryStatuses = retryStatuses
+        self.retryConnectionErrors = retryConnectionErrors
+        self.retryAmbiguousErrors = retryAmbiguousErrors
+        self.maxRetryAfter = maxRetryAfter
+
+    def getDelay(self, attempt: int, resp: Optional[HttpResponse] = None) -> float:
+        """
+        Get the delay (in seconds) before retrying the given failed attempt (starting
+        from 1).
+        """
+        delay = random.uniform(
+            0, min(self.maxDelay, self.baseDelay * 2 ** (attempt - 1))
+        )
+        retryAfter = None if resp is None else parseRetryAfter(resp)
+        return delay if retryAfter is None else max(delay, retryAfter)
+
+    def shouldRetryResponse(self, attempt: int, resp: HttpResponse) -> bool:
+        if attempt >= self.maxAttempts or resp.status not in self.retryStatuses:
+            return False
+        retryAfter = parseRetryAfter(resp)
+        return retryAfter is None or retryAfter <= self.maxRetryAfter
+
+    def shouldRetryError(self, attempt: int, error: BaseException) -> bool:
+        if attempt >= self.maxAttempts:
+            return False
+        if isinstance(error, aiohttp.ClientConnectorError):
+            return self.retryConnectionErrors
+        return self.retryAmbiguousErrors
+
+    async def run(self, send: Callable[[], Awaitable[HttpResponse]]) -> HttpResponse:
+        """
+        Send the request until it succeeds or the policy gives up, and return the last
+        response. The last connection error or timeout is raised as is.
+        """
+        attempt = 1
+        while True:
+            try:
+                resp = await send()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                remaining = getRemainingTime()
+                if remaining is not None and remaining <= 0:
+                    raise LogtoDeadlineExceededException(
+                        "The deadline has passed"
+                    ) from e
+                if not self.shouldRetryError(attempt, e):
+                    raise
+                delay = self.getDelay(attempt)
+            else:
+                if not self.shouldRetryResponse(attempt, resp):
+                    return resp
+                delay = self.getDelay(attempt, resp)
+
+            remaining = getRemainingTime()
+            if remaining is not None and delay >= remaining:
+                raise LogtoDeadlineExceededException(
+                    f"The deadline would be missed by retrying in {delay:.3f} seconds"
+                )
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+noRetry = RetryPolicy(maxAttempts=1)
+"""
+The policy that never retries.
+"""
+
+
+class RetryPolicies:
+    """
+    The retry policies of `OidcCore` and `JwksStore` by operation.
+
+    The defaults retry the idempotent requests (discovery, JWKS and UserInfo) on
+    5xx, 429, connection errors and timeouts.
+
+    Token requests are retried more conservatively:
+
+    - A refresh token grant is only retried when Logto can't have processed it (429,
+      503 or a failed connection). Otherwise a retried grant may send a refresh token
+      that has been rotated, and get `invalid_grant`, which signs the user out.
+    - An authorization code can only be used once. The code exchange is only retried
+      on 429 or a failed connection.
+    """
+
+    def __init__(
+        self,
+        discovery: Optional[RetryPolicy] = None,
+        jwks: Optional[RetryPolicy] = None,
+        userInfo: Optional[RetryPolicy] = None,
+        refreshToken: Optional[RetryPolicy] = None,
+        authorizationCode: Optional[RetryPolicy] = None,
+    ) -> None:
+        self.discovery = discovery or RetryPolicy()
+        self.jwks = jwks or RetryPolicy()
+        self.userInfo = userInfo or RetryPolicy()
+        self.refreshToken = refreshToken or RetryPolicy(
+            retryStatuses=frozenset({429, 503}), retryAmbiguousErrors=False
+        )
+        self.authorizationCode = authorizationCode or RetryPolicy(
+            retryStatuses=frozenset({429}), retryAmbiguousErrors=False
+        )
+
+
+defaultRetryPolicies = RetryPolicies()
+"""
+The process-wide retry policies used when no policies are given to `OidcCore` or
+`JwksStore`. They can be changed at startup, e.g.
+`defaultRetryPolicies.userInfo = noRetry`.
+"""
+
+
+def parseRetryAfter(resp: HttpResponse) -> Optional[float]:
+    """
+    Parse the `Retry-After` header (in seconds or as an HTTP date) of the response,
+    return `None` if it's missing or invalid.
+    """
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(
+            0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        )
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,160 @@
+import email.utils
+import time
+from typing import Any, List, Union
+
+import aiohttp
+import pytest
+from pytest_mock import MockerFixture
+
+from .HttpTransport import HttpResponse, HttpTransport
+from .LogtoException import LogtoException
+from .OidcCore import OidcCore
+from .RetryPolicy import RetryPolicy, noRetry, parseRetryAfter
+from .Timeouts import LogtoDeadlineExceededException, runWithDeadline
+from .utilities.test import FakeLogtoServer
+
+Outcome = Union[HttpResponse, BaseException]
+
+
+def response(status: int, retryAfter: Any = None) -> HttpResponse:
+    headers = {} if retryAfter is None else {"Retry-After": str(retryAfter)}
+    return HttpResponse(status, headers, text="error")
+
+
+def connectionError() -> aiohttp.ClientConnectorError:
+    return aiohttp.ClientConnectorError(
+        aiohttp.client_reqrep.ConnectionKey(
+            "logto.app", 443, True, True, None, None, None
+        ),
+        OSError("Connection refused"),
+    )
+
+
+class Sender:
+    def __init__(self, *outcomes: Outcome) -> None:
+        self.outcomes: List[Outcome] = list(outcomes)
+        self.calls = 0
+
+    async def __call__(self) -> HttpResponse:
+        outcome = self.outcomes[self.calls]
+        self.calls += 1
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def noJitter(mocker: MockerFixture) -> Any:
+    uniform = mocker.patch("logto.RetryPolicy.random").uniform
+    uniform.side_effect = lambda low, high: 0
+    return uniform
+
+
+class TestRetryPolicy:
+    def test_getDelay(self, noJitter: Any) -> None:
+        policy = RetryPolicy(baseDelay=0.1, maxDelay=0.3)
+        noJitter.side_effect = lambda low, high: high
+
+        assert [policy.getDelay(attempt) for attempt in [1, 2, 3, 4]] == [
+            0.1,
+            0.2,
+            0.3,
+            0.3,
+        ]
+        assert policy.getDelay(1, response(503, 5)) == 5
+
+    def test_parseRetryAfter(self) -> None:
+        assert parseRetryAfter(response(429, 2.5)) == 2.5
+        assert parseRetryAfter(response(429, -1)) == 0
+        assert parseRetryAfter(response(429, "soon")) is None
+        assert parseRetryAfter(response(429)) is None
+
+        date = email.utils.formatdate(time.time() + 60, usegmt=True)
+        retryAfter = parseRetryAfter(response(429, date))
+        assert retryAfter is not None and 58 <= retryAfter <= 60
+
+    def test_shouldRetryResponse(self) -> None:
+        policy = RetryPolicy(maxAttempts=3, maxRetryAfter=10)
+
+        assert policy.shouldRetryResponse(1, response(503))
+        assert policy.shouldRetryResponse(2, response(429, 10))
+        assert not policy.shouldRetryResponse(3, response(503))
+        assert not policy.shouldRetryResponse(1, response(400))
+        assert not policy.shouldRetryResponse(1, response(429, 11))
+
+    async def test_run(self) -> None:
+        send = Sender(response(502), connectionError(), response(200))
+
+        assert (await RetryPolicy().run(send)).status == 200
+        assert send.calls == 3
+
+    async def test_run_givesUp(self) -> None:
+        send = Sender(response(503), response(503), response(503))
+
+        assert (await RetryPolicy(maxAttempts=2).run(send)).status == 503
+        assert send.calls == 2
+        assert (await noRetry.run(Sender(response(503)))).status == 503
+
+    async def test_run_ambiguousError(self) -> None:
+        policy = RetryPolicy(retryAmbiguousErrors=False)
+        send = Sender(
+            connectionError(), aiohttp.ServerDisconnectedError(), response(200)
+        )
+
+        with pytest.raises(aiohttp.ServerDisconnectedError):
+            await policy.run(send)
+        assert send.calls == 2
+
+    async def test_run_deadline(self) -> None:
+        send = Sender(response(503, 5), response(200))
+
+        # The retry would be after the deadline
+        with pytest.raises(LogtoDeadlineExceededException):
+            await runWithDeadline(RetryPolicy().run(send), time.monotonic() + 1)
+        assert send.calls == 1
+
+
+class TestOidcCoreRetries:
+    @pytest.mark.parametrize(
+        "status,requests",
+        [(429, 3), (503, 3), (502, 1), (500, 1)],
+    )
+    async def test_refreshToken(self, status: int, requests: int) -> None:
+        async with HttpTransport() as transport, FakeLogtoServer(
+            errorRate=1, errorStatus=status, faultPaths=["/oidc/token"]
+        ) as server:
+            oidcCore = OidcCore(server.metadata, transport)
+            with pytest.raises(LogtoException):
+                await oidcCore.fetchTokenByRefreshToken(
+                    "app", None, server.issueRefreshToken()
+                )
+
+        assert server.requests["/oidc/token"] == requests
+
+    @pytest.mark.parametrize("status,requests", [(429, 3), (503, 1)])
+    async def test_authorizationCode(self, status: int, requests: int) -> None:
+        async with HttpTransport() as transport, FakeLogtoServer(
+            errorRate=1, errorStatus=status, faultPaths=["/oidc/token"]
+        ) as server:
+            oidcCore = OidcCore(server.metadata, transport)
+            with pytest.raises(LogtoException):
+                await oidcCore.fetchTokenByCode("app", None, "uri", "code", "verifier")
+
+        assert server.requests["/oidc/token"] == requests
+
+    async def test_idempotentRequests(self) -> None:
+        async with HttpTransport() as transport, FakeLogtoServer(seed=3) as server:
+            server.errorRate = 0.5
+            metadata = await OidcCore.getProviderMetadata(
+                f"{server.endpoint}/oidc/.well-known/openid-configuration",
+                transport,
+                useCache=False,
+            )
+            oidcCore = OidcCore(metadata, transport)
+            await oidcCore.jwksStore.refresh()
+
+        assert (
+            server.requests["/oidc/jwks"]
+            + server.requests["/oidc/.well-known/openid-configuration"]
+            > 2
+        )
@@ -0,0 +1,378 @@
+"""
+The session stores that keep the Logto client storage of many sessions, keyed by
+session ID, with the bounded in-memory and the SQLite implementations.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .Storage import PersistKey, Storage
+from .utilities import codec
+
+
+class SessionStore(ABC):
+    """
+    The store of the Logto client storage for many sessions, e.g. the users of a web
+    application keyed by the session ID in their cookies. Use `storage` to get the
+    `Storage` of a session for `LogtoClient`.
+
+    Each value expires with the data it holds:
+    - `signInSession`: after `signInSessionTtl` seconds, since the sign-in should be
+      completed in a few minutes.
+    - `accessTokenMap`: when the last access token in the map expires.
+    - `idToken` and `refreshToken`: after `sessionTtl` seconds since they are set,
+      which should match the refresh token time-to-live in Logto.
+
+    Example:
+      ```python
+      store = MemorySessionStore()
+      client = LogtoClient(config, store.storage(session["id"]))
+      ```
+    """
+
+    def __init__(self, sessionTtl: float = 14 * 86400, signInSessionTtl: float = 600):
+        self.sessionTtl = sessionTtl
+        self.signInSessionTtl = signInSessionTtl
+
+    @abstractmethod
+    def get(self, sessionId: str, key: PersistKey) -> Optional[str]:
+        """
+        Get the stored string for the given session and key, return None if not found
+        or expired.
+        """
+        ...
+
+    @abstractmethod
+    def set(self, sessionId: str, key: PersistKey, value: Optional[str]) -> None:
+        """
+        Set the stored value for the given session and key. A None value deletes the
+        key.
+        """
+        ...
+
+    @abstractmethod
+    def delete(self, sessionId: str, key: PersistKey) -> None:
+        """
+        Delete the stored value for the given session and key.
+        """
+        ...
+
+    def storage(self, sessionId: str) -> Storage:
+        """
+        Get the storage of the given session.
+        """
+        return SessionStorage(self, sessionId)
+
+    def getExpiresAt(self, key: PersistKey, value: str, now: float) -> float:
+        """
+        Get the timestamp (in seconds) when the given value expires.
+        """
+        if key == "signInSession":
+            return now + self.signInSessionTtl
+
+        expiresAt = now + self.sessionTtl
+        if key == "accessTokenMap":
+            try:
+                accessTokens = json.loads(codec.decode(value))["x"].values()
+                return min(expiresAt, max(token["expiresAt"] for token in accessTokens))
+            except (ValueError, TypeError, KeyError):
+                pass
+        return expiresAt
+
+
+class SessionStorage(Storage):
+    """
+    The storage of a session in a `SessionStore`.
+    """
+
+    def __init__(self, store: SessionStore, sessionId: str) -> None:
+        self.store = store
+        self.sessionId = sessionId
+
+    def get(self, key: PersistKey) -> Optional[str]:
+        return self.store.get(self.sessionId, key)
+
+    def set(self, key: PersistKey, value: Optional[str]) -> None:
+        self.store.set(self.sessionId, key, value)
+
+    def delete(self, key: PersistKey) -> None:
+        self.store.delete(self.sessionId, key)
+
+
+class _Session:
+    __slots__ = ("values", "expiresAt", "size")
+
+    def __init__(self) -> None:
+        self.values: Dict[str, Tuple[str, float]] = {}
+        self.expiresAt = 0.0
+        self.size = 0
+
+
+class MemorySessionStore(SessionStore):
+    """
+    The in-memory session store for single-node deployments. All operations are O(1)
+    and thread-safe.
+
+    The store is bounded by the number of sessions (`maxSessions`) and optionally the
+    total length of the stored values (`maxBytes`, in characters); the least recently
+    used sessions are evicted when a bound is exceeded. Expired values are dropped when
+    they are read, and expired sessions are swept from the least recently used end on
+    writes, so inactive sessions don't hold the memory until they are evicted.
+
+    Note the sessions are lost when the process restarts, and they are not shared with
+    other processes.
+    """
+
+    sweepBatchSize = 2
+    """
+    The maximum number of expired sessions to sweep on each write.
+    """
+
+    def __init__(
+        self,
+        maxSessions: int = 10000,
+        maxBytes: Optional[int] = None,
+        sessionTtl: float = 14 * 86400,
+        signInSessionTtl: float = 600,
+    ) -> None:
+        super().__init__(sessionTtl, signInSessionTtl)
+        self.maxSessions = maxSessions
+        self.maxBytes = maxBytes
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def size(self) -> int:
+        """
+        The total length of the stored values.
+        """
+        return self._size
+
+    def get(self, sessionId: str, key: PersistKey) -> Optional[str]:
+        with self._lock:
+            session = self._sessions.get(sessionId)
+            if session is None:
+                return None
+            entry = session.values.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                self._deleteValue(sessionId, session, key)
+                return None
+            self._sessions.move_to_end(sessionId)
+            return entry[0]
+
+    def set(self, sessionId: str, key: PersistKey, value: Optional[str]) -> None:
+        if value is None:
+            self.delete(sessionId, key)
+            return
+
+        now = time.time()
+        expiresAt = self.getExpiresAt(key, value, now)
+        with self._lock:
+            session = self._sessions.get(sessionId)
+            if session is None:
+                session = self._sessions[sessionId] = _Session()
+            else:
+                self._sessions.move_to_end(sessionId)
+                old = session.values.get(key)
+                if old is not None:
+                    self._resize(session, -len(old[0]))
+
+            session.values[key] = (value, expiresAt)
+            session.expiresAt = max(entry[1] for entry in session.values.values())
+            self._resize(session, len(value))
+            self._evict(now)
+
+    def delete(self, sessionId: str, key: PersistKey) -> None:
+        with self._lock:
+            session = self._sessions.get(sessionId)
+            if session is not None and key in session.values:
+                self._deleteValue(sessionId, session, key)
+
+    def clear(self) -> None:
+        """
+        Remove all sessions.
+        """
+        with self._lock:
+            self._sessions.clear()
+            self._size = 0
+
+    def _resize(self, session: _Session, delta: int) -> None:
+        session.size += delta
+        self._size += delta
+
+    def _deleteValue(self, sessionId: str, session: _Session, key: str) -> None:
+        value, _ = session.values.pop(key)
+        self._resize(session, -len(value))
+        if not session.values:
+            del self._sessions[sessionId]
+
+    def _removeOldest(self) -> None:
+        _, session = self._sessions.popitem(last=False)
+        self._size -= session.size
+
+    def _evict(self, now: float) -> None:
+        for _ in range(self.sweepBatchSize):
+            oldest = next(iter(self._sessions.values()), None)
+            if oldest is None or oldest.expiresAt > now:
+                break
+            self._removeOldest()
+
+        while len(self._sessions) > self.maxSessions or (
+            self.maxBytes is not None and self._size > self.maxBytes
+        ):
+            self._removeOldest()
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    The session store backed by a SQLite database file, so the sessions survive
+    restarts and are shared by the processes on the same host (e.g. the workers of a
+    web server).
+
+    The database runs in the WAL mode, so reads are not blocked by writes. Each thread
+    uses its own connection, and the statements are cached by the connection. Expired
+    values are hidden from reads, and deleted by a background thread every
+    `sweepInterval` seconds in batches of `sweepBatchSize` rows, so the sweeping never
+    holds the write lock for long. Set `sweepInterval` to 0 to disable the background
+    thread and call `sweep` manually.
+
+    Call `close` to stop the sweeper and close the connections.
+    """
+
+    _schema = (
+        "CREATE TABLE IF NOT EXISTS logto_sessions ("
+        "session_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+        "expires_at REAL NOT NULL, PRIMARY KEY (session_id, key))",
+        "CREATE INDEX IF NOT EXISTS logto_sessions_expires_at "
+        "ON logto_sessions (expires_at)",
+    )
+    _getSql = (
+        "SELECT value FROM logto_sessions "
+        "WHERE session_id = ? AND key = ? AND expires_at > ?"
+    )
+    _setSql = (
+        "INSERT OR REPLACE INTO logto_sessions (session_id, key, value, expires_at) "
+        "VALUES (?, ?, ?, ?)"
+    )
+    _deleteSql = "DELETE FROM logto_sessions WHERE session_id = ? AND key = ?"
+    _sweepSql = (
+        "DELETE FROM logto_sessions WHERE rowid IN (SELECT rowid FROM logto_sessions "
+        "WHERE expires_at <= ? LIMIT ?)"
+    )
+
+    def __init__(
+        self,
+        path: str,
+        sessionTtl: float = 14 * 86400,
+        signInSessionTtl: float = 600,
+        sweepInterval: float = 60,
+        sweepBatchSize: int = 1000,
+        busyTimeout: float = 5,
+    ) -> None:
+        super().__init__(sessionTtl, signInSessionTtl)
+        self.path = path
+        self.sweepBatchSize = sweepBatchSize
+        self.busyTimeout = busyTimeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+        connection = self._connection()
+        for statement in self._schema:
+            connection.execute(statement)
+
+        self._sweeper: Optional[threading.Thread] = None
+        if sweepInterval > 0:
+            self._sweeper = threading.Thread(
+                target=self._sweepPeriodically,
+                args=(sweepInterval,),
+                name="logto-session-sweeper",
+                daemon=True,
+            )
+            self._sweeper.start()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection: Optional[sqlite3.Connection] = getattr(
+            self._local, "connection", None
+        )
+        if connection is None:
+            # Autocommit mode, each statement is a short transaction
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.busyTimeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def get(self, sessionId: str, key: PersistKey) -> Optional[str]:
+        row = (
+            self._connection()
+            .execute(self._getSql, (sessionId, key, time.time()))
+            .fetchone()
+        )
+        return row[0] if row is not None else None
+
+    def set(self, sessionId: str, key: PersistKey, value: Optional[str]) -> None:
+        if value is None:
+            self.delete(sessionId, key)
+            return
+
+        expiresAt = self.getExpiresAt(key, value, time.time())
+        self._connection().execute(self._setSql, (sessionId, key, value, expiresAt))
+
+    def delete(self, sessionId: str, key: PersistKey) -> None:
+        self._connection().execute(self._deleteSql, (sessionId, key))
+
+    def sweep(self) -> int:
+        """
+        Delete the expired values in batches, and return the number of deleted rows.
+        """
+        connection = self._connection()
+        now = time.time()
+        total = 0
+        while not self._closed.is_set():
+            deleted = connection.execute(
+                self._sweepSql, (now, self.sweepBatchSize)
+            ).rowcount
+            total += deleted
+            if deleted < self.sweepBatchSize:
+                break
+        return total
+
+    def close(self) -> None:
+        """
+        Stop the background sweeper and close the connections of all threads.
+        """
+        self._closed.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _sweepPeriodically(self, interval: float) -> None:
+        while not self._closed.wait(interval):
+            try:
+                self.sweep()
+            except sqlite3.Error:
+                pass  # Retry in the next round, e.g. the database is busy
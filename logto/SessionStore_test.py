@@ -0,0 +1,193 @@
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from pytest_mock import MockerFixture
+
+from .SessionStore import MemorySessionStore, SqliteSessionStore
+from .utilities import codec
+
+
+class TestMemorySessionStore:
+    def test_storage(self) -> None:
+        store = MemorySessionStore()
+        storage1, storage2 = store.storage("session1"), store.storage("session2")
+        storage1.set("idToken", "idToken1")
+        storage2.set("idToken", "idToken2")
+
+        assert storage1.get("idToken") == "idToken1"
+        assert storage2.get("idToken") == "idToken2"
+        storage1.delete("idToken")
+        assert storage1.get("idToken") is None
+        assert len(store) == 1
+
+    def test_set_none(self) -> None:
+        store = MemorySessionStore()
+        store.set("session", "idToken", "idToken")
+        store.set("session", "idToken", None)
+
+        assert store.get("session", "idToken") is None
+        assert (len(store), store.size) == (0, 0)
+
+    def test_evict_leastRecentlyUsed(self) -> None:
+        store = MemorySessionStore(maxSessions=2)
+        store.set("session1", "idToken", "idToken")
+        store.set("session2", "idToken", "idToken")
+        store.get("session1", "idToken")
+        store.set("session3", "idToken", "idToken")
+
+        assert store.get("session1", "idToken") == "idToken"
+        assert store.get("session2", "idToken") is None
+        assert store.get("session3", "idToken") == "idToken"
+
+    def test_evict_maxBytes(self) -> None:
+        store = MemorySessionStore(maxBytes=10)
+        store.set("session1", "idToken", "12345")
+        store.set("session1", "idToken", "123456")
+        store.set("session2", "idToken", "1234")
+        assert store.size == 10
+
+        store.set("session3", "idToken", "1")
+        assert store.get("session1", "idToken") is None
+        assert store.size == 5
+
+    def test_ttl_signInSession(self, mocker: MockerFixture) -> None:
+        now = mocker.patch("logto.SessionStore.time").time
+        now.return_value = 1000
+        store = MemorySessionStore(signInSessionTtl=600)
+        store.set("session", "signInSession", "signInSession")
+        store.set("session", "idToken", "idToken")
+
+        now.return_value = 1599
+        assert store.get("session", "signInSession") == "signInSession"
+        now.return_value = 1600
+        assert store.get("session", "signInSession") is None
+        assert store.get("session", "idToken") == "idToken"
+
+    def test_ttl_accessTokenMap(self, mocker: MockerFixture) -> None:
+        now = mocker.patch("logto.SessionStore.time").time
+        now.return_value = 1000
+        store = MemorySessionStore()
+        accessTokenMap = {
+            "x": {
+                "": {"token": "a", "expiresAt": 2000},
+                "foo": {"token": "b", "expiresAt": 3000},
+            }
+        }
+        store.set("session", "accessTokenMap", json.dumps(accessTokenMap))
+
+        now.return_value = 2999
+        assert store.get("session", "accessTokenMap") is not None
+        now.return_value = 3000
+        assert store.get("session", "accessTokenMap") is None
+
+    def test_ttl_compactAccessTokenMap(self, mocker: MockerFixture) -> None:
+        now = mocker.patch("logto.SessionStore.time").time
+        now.return_value = 1000
+        store = MemorySessionStore()
+        value = codec.encode(
+            json.dumps(
+                {
+                    "x": {
+                        "": {"token": "a" * 200, "expiresAt": 2000},
+                        "foo": {"token": "b" * 200, "expiresAt": 3000},
+                    }
+                }
+            )
+        )
+        assert codec.isCompact(value)
+        store.set("session", "accessTokenMap", value)
+
+        now.return_value = 3000
+        assert store.get("session", "accessTokenMap") is None
+
+    def test_sweepExpiredSessions(self, mocker: MockerFixture) -> None:
+        now = mocker.patch("logto.SessionStore.time").time
+        now.return_value = 1000
+        store = MemorySessionStore()
+        store.set("session1", "signInSession", "signInSession")
+
+        now.return_value = 2000
+        store.set("session2", "idToken", "idToken")
+        assert len(store) == 1
+
+
+class TestSqliteSessionStore:
+    @pytest.fixture
+    def path(self, tmp_path: Path) -> str:
+        return str(tmp_path / "sessions.db")
+
+    @pytest.fixture
+    def store(self, path: str) -> Iterator[SqliteSessionStore]:
+        store = SqliteSessionStore(path, sweepInterval=0)
+        yield store
+        store.close()
+
+    def test_storage(self, store: SqliteSessionStore) -> None:
+        storage1, storage2 = store.storage("session1"), store.storage("session2")
+        storage1.set("idToken", "idToken1")
+        storage2.set("idToken", "idToken2")
+        storage1.set("idToken", "idToken3")
+
+        assert storage1.get("idToken") == "idToken3"
+        assert storage2.get("idToken") == "idToken2"
+        storage1.set("idToken", None)
+        assert storage1.get("idToken") is None
+
+    def test_persist(self, path: str, store: SqliteSessionStore) -> None:
+        store.set("session", "refreshToken", "refreshToken")
+        store.close()
+
+        reopened = SqliteSessionStore(path, sweepInterval=0)
+        assert reopened.get("session", "refreshToken") == "refreshToken"
+        assert (
+            reopened._connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        )
+        reopened.close()
+
+    def test_threads(self, store: SqliteSessionStore) -> None:
+        def setValue(index: int) -> None:
+            store.set(f"session{index}", "idToken", f"idToken{index}")
+
+        threads = [threading.Thread(target=setValue, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [store.get(f"session{i}", "idToken") for i in range(8)] == [
+            f"idToken{i}" for i in range(8)
+        ]
+
+    def test_ttl(self, store: SqliteSessionStore, mocker: MockerFixture) -> None:
+        now = mocker.patch("logto.SessionStore.time").time
+        now.return_value = 1000
+        store.set("session", "signInSession", "signInSession")
+
+        now.return_value = 1600
+        assert store.get("session", "signInSession") is None
+
+    def test_sweep(self, path: str, mocker: MockerFixture) -> None:
+        now = mocker.patch("logto.SessionStore.time").time
+        now.return_value = 1000
+        store = SqliteSessionStore(path, sweepInterval=0, sweepBatchSize=2)
+        for i in range(5):
+            store.set(f"session{i}", "signInSession", "signInSession")
+        store.set("session", "idToken", "idToken")
+
+        now.return_value = 1600
+        assert store.sweep() == 5
+        assert store.get("session", "idToken") == "idToken"
+        store.close()
+
+    def test_sweepInBackground(self, path: str) -> None:
+        store = SqliteSessionStore(path, signInSessionTtl=0, sweepInterval=0.01)
+        store.set("session", "signInSession", "signInSession")
+        time.sleep(0.1)
+        count = store._connection().execute("SELECT COUNT(*) FROM logto_sessions")
+
+        assert count.fetchone()[0] == 0
+        store.close()
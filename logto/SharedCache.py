@@ -0,0 +1,250 @@
+"""
+The cross-process cache backed by memory-mapped files, for sharing the provider
+metadata and the JWKS among the workers of a pre-fork server on the same host.
+"""
+
+import asyncio
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .LogtoException import LogtoException
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+
+_magic = b"LOGTOSC1"
+_header = struct.Struct("<8sQdII")
+"""
+The header of a cache file: magic, sequence, expiration time, data length and CRC-32
+of the data.
+"""
+_sequence = struct.Struct("<Q")
+_sequenceOffset = 8
+_maxReadAttempts = 100
+
+
+class _SharedEntry:
+    """
+    A memory-mapped cache file that holds one value, and a lock file held by the
+    process that refreshes the value.
+
+    Readers don't take any lock: the writer makes the sequence odd while writing, and
+    readers retry if the sequence is odd or changed during the read (a seqlock). The
+    CRC-32 of the data is also checked, so a torn read is never returned even if the
+    platform reorders the writes.
+    """
+
+    def __init__(self, path: str, capacity: int) -> None:
+        self.lockPath = f"{path}.lock"
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < _header.size + capacity:
+                    os.ftruncate(fd, _header.size + capacity)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self.mm = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+
+    def read(self) -> Optional[Tuple[bytes, float]]:
+        """
+        Read the value and its expiration time, return None if the entry is empty.
+        """
+        mm = self.mm
+        for _ in range(_maxReadAttempts):
+            magic, sequence, expiresAt, length, checksum = _header.unpack_from(mm, 0)
+            if magic != _magic:
+                return None
+            if sequence & 1 or _header.size + length > len(mm):
+                os.sched_yield()
+                continue
+
+            data = mm[_header.size : _header.size + length]
+            if (
+                _sequence.unpack_from(mm, _sequenceOffset)[0] == sequence
+                and zlib.crc32(data) == checksum
+            ):
+                return data, expiresAt
+            os.sched_yield()
+        return None
+
+    def write(self, data: bytes, expiresAt: float) -> bool:
+        """
+        Write the value, the caller must hold the lock of the entry. Return False if
+        the value doesn't fit in the file.
+        """
+        mm = self.mm
+        if _header.size + len(data) > len(mm):
+            return False
+
+        magic, sequence = _header.unpack_from(mm, 0)[:2]
+        if magic != _magic:
+            sequence = 0
+        _sequence.pack_into(mm, _sequenceOffset, sequence + 1)
+        mm[_header.size : _header.size + len(data)] = data
+        _header.pack_into(
+            mm, 0, _magic, sequence + 1, expiresAt, len(data), zlib.crc32(data)
+        )
+        _sequence.pack_into(mm, _sequenceOffset, sequence + 2)
+        return True
+
+    def tryLock(self) -> Optional[int]:
+        """
+        Try to take the lock of the entry without blocking, return the file descriptor
+        that holds the lock if succeeded.
+        """
+        # A new file descriptor for each attempt, so the lock also excludes the other
+        # callers in the same process
+        fd = os.open(self.lockPath, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+            return None
+
+    @staticmethod
+    def unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def close(self) -> None:
+        self.mm.close()
+
+
+class SharedCache:
+    """
+    The cache shared by the processes on the same host, e.g. the workers of gunicorn
+    or uvicorn. Each key is stored in a memory-mapped file in `directory`, and read
+    without any lock. When a value expires, one process takes the file lock and
+    refreshes it, while the others keep serving the expired value (or wait for the
+    refresh if there's no value yet). Only available on POSIX systems.
+
+    Values are bytes and must fit in `capacity` bytes, larger values are loaded but not
+    shared. Parsed objects can't be shared across processes, so each process still
+    parses the value once it changes.
+
+    Example:
+      ```python
+      sharedCache = SharedCache("/tmp/logto-cache")
+      client = LogtoClient(config, storage, sharedCache=sharedCache)
+      ```
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        capacity: int = 256 * 1024,
+        lockTimeout: float = 10,
+        pollInterval: float = 0.01,
+    ) -> None:
+        """
+        Args:
+            directory: The directory for the cache files, it will be created if it
+                doesn't exist. It should be private to the application.
+            capacity: The maximum size (in bytes) of a value.
+            lockTimeout: The time (in seconds) to wait for another process to load a
+                missing value, before loading it without the lock.
+            pollInterval: The time (in seconds) between attempts to take the lock.
+        """
+        if fcntl is None:
+            raise LogtoException("SharedCache is only available on POSIX systems")
+
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.directory = directory
+        self.capacity = capacity
+        self.lockTimeout = lockTimeout
+        self.pollInterval = pollInterval
+        self._entries: Dict[str, _SharedEntry] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, key: str) -> _SharedEntry:
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    name = hashlib.sha256(key.encode()).hexdigest()[:32]
+                    entry = self._entries[key] = _SharedEntry(
+                        os.path.join(self.directory, f"logto-cache-{name}.bin"),
+                        self.capacity,
+                    )
+        return entry
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """
+        Get the value and its expiration timestamp (in seconds) for the given key,
+        return None if not found. The value may have expired.
+        """
+        return self._entry(key).read()
+
+    def set(self, key: str, value: bytes, ttl: float) -> bool:
+        """
+        Set the value for the given key, return False if the value is too large to
+        share. Waits for the refresh by other processes (if any) to finish.
+        """
+        entry = self._entry(key)
+        fd = os.open(entry.lockPath, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return entry.write(value, time.time() + ttl)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    async def getOrLoad(
+        self, key: str, loader: Callable[[], Awaitable[bytes]], ttl: float
+    ) -> bytes:
+        """
+        Get the value for the given key. If it's missing or expired, one process loads
+        the value with the loader and shares it for `ttl` seconds.
+        """
+        entry = self._entry(key)
+        cached = entry.read()
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+
+        deadline = time.monotonic() + self.lockTimeout
+        while True:
+            fd = entry.tryLock()
+            if fd is not None:
+                try:
+                    # Another process may have refreshed the value before we got the lock
+                    cached = entry.read()
+                    if cached is not None and cached[1] > time.time():
+                        return cached[0]
+                    value = await loader()
+                    entry.write(value, time.time() + ttl)
+                    return value
+                finally:
+                    entry.unlock(fd)
+
+            if cached is not None:
+                # Serve the expired value while another process is refreshing it
+                return cached[0]
+            if time.monotonic() >= deadline:
+                return await loader()
+
+            await asyncio.sleep(self.pollInterval)
+            cached = entry.read()
+            if cached is not None and cached[1] > time.time():
+                return cached[0]
+
+    def close(self) -> None:
+        """
+        Unmap the cache files of this process. The files are kept for other processes.
+        """
+        with self._lock:
+            for entry in self._entries.values():
+                entry.close()
+            self._entries.clear()
@@ -0,0 +1,78 @@
+import asyncio
+import multiprocessing
+import sys
+from pathlib import Path
+
+import pytest
+
+from .SharedCache import SharedCache
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="POSIX only")
+
+
+def writeRepeatedly(directory: str, count: int) -> None:
+    cache = SharedCache(directory)
+    for i in range(count):
+        cache.set("key", (b"a" if i % 2 else b"b") * 4096, ttl=60)
+
+
+class Loader:
+    def __init__(self, value: bytes) -> None:
+        self.value = value
+        self.calls = 0
+
+    async def __call__(self) -> bytes:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return self.value
+
+
+class TestSharedCache:
+    def test_set(self, tmp_path: Path) -> None:
+        cache = SharedCache(str(tmp_path))
+        assert cache.get("key") is None
+
+        assert cache.set("key", b"value", ttl=60)
+        value = cache.get("key")
+        assert value is not None and value[0] == b"value"
+        assert not cache.set("key", b"x" * (cache.capacity + 1), ttl=60)
+        cache.close()
+
+    async def test_getOrLoad_shared(self, tmp_path: Path) -> None:
+        # Separate instances behave like separate processes
+        cache1, cache2 = SharedCache(str(tmp_path)), SharedCache(str(tmp_path))
+        loader = Loader(b"value")
+
+        results = await asyncio.gather(
+            cache1.getOrLoad("key", loader, ttl=60),
+            cache2.getOrLoad("key", loader, ttl=60),
+        )
+
+        assert results == [b"value", b"value"]
+        assert loader.calls == 1
+
+    async def test_getOrLoad_staleWhileRefreshing(self, tmp_path: Path) -> None:
+        cache1, cache2 = SharedCache(str(tmp_path)), SharedCache(str(tmp_path))
+        cache1.set("key", b"stale", ttl=-1)
+        loader = Loader(b"fresh")
+
+        refreshing = asyncio.create_task(cache1.getOrLoad("key", loader, ttl=60))
+        await asyncio.sleep(0)
+        assert await cache2.getOrLoad("key", loader, ttl=60) == b"stale"
+        assert await refreshing == b"fresh"
+        assert await cache2.getOrLoad("key", loader, ttl=60) == b"fresh"
+        assert loader.calls == 1
+
+    def test_get_concurrentWriter(self, tmp_path: Path) -> None:
+        cache = SharedCache(str(tmp_path))
+        cache.set("key", b"b" * 4096, ttl=60)
+        writer = multiprocessing.get_context("fork").Process(
+            target=writeRepeatedly, args=(str(tmp_path), 2000)
+        )
+        writer.start()
+        while writer.is_alive():
+            value = cache.get("key")
+            if value is not None:
+                assert value[0] in (b"a" * 4096, b"b" * 4096)
+        writer.join()
+        assert writer.exitcode == 0
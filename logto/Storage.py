@@ -3,7 +3,7 @@ Logto client storage abstract class and the default implementation.
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Literal, Optional
+from typing import Dict, Iterable, Literal, Mapping, Optional
 
 PersistKey = Literal["idToken", "accessTokenMap", "refreshToken", "signInSession"]
 """
@@ -43,11 +43,95 @@ class Storage(ABC):
         """
 
 
+class AsyncStorage(ABC):
+    """
+    The asynchronous storage interface for the Logto client, for storages backed by
+    the network (e.g. Redis or a database) that shouldn't block the event loop.
+
+    The values are read and written in batches, so the client needs only one round
+    trip to read and one round trip to write in each flow (e.g. storing the ID token,
+    the refresh token and the access token map after signing in).
+
+    The existing `Storage` implementations can be used as is, the client wraps them
+    with `SyncStorageAdapter`.
+    """
+
+    @abstractmethod
+    async def getMany(
+        self, keys: Iterable[PersistKey]
+    ) -> Dict[PersistKey, Optional[str]]:
+        """
+        Get the stored strings for the given keys. The result must contain all the
+        given keys, with None for the keys that are not found.
+        """
+        ...
+
+    @abstractmethod
+    async def setMany(self, values: Mapping[PersistKey, Optional[str]]) -> None:
+        """
+        Set the stored values for the given keys. A None value deletes the key.
+        """
+        ...
+
+    @abstractmethod
+    async def deleteMany(self, keys: Iterable[PersistKey]) -> None:
+        """
+        Delete the stored values for the given keys.
+        """
+        ...
+
+    async def get(self, key: PersistKey) -> Optional[str]:
+        """
+        Get the stored string for the given key, return None if not found.
+        """
+        return (await self.getMany([key]))[key]
+
+    async def set(self, key: PersistKey, value: Optional[str]) -> None:
+        """
+        Set the stored value (string or None) for the given key.
+        """
+        await self.setMany({key: value})
+
+    async def delete(self, key: PersistKey) -> None:
+        """
+        Delete the stored value for the given key.
+        """
+        await self.deleteMany([key])
+
+
+class SyncStorageAdapter(AsyncStorage):
+    """
+    The adapter that exposes a synchronous `Storage` as an `AsyncStorage`. The
+    synchronous storage is called in the event loop, so it should be fast (e.g. an
+    in-memory or cookie session).
+    """
+
+    def __init__(self, storage: Storage) -> None:
+        self.storage = storage
+
+    async def getMany(
+        self, keys: Iterable[PersistKey]
+    ) -> Dict[PersistKey, Optional[str]]:
+        return {key: self.storage.get(key) for key in keys}
+
+    async def setMany(self, values: Mapping[PersistKey, Optional[str]]) -> None:
+        for key, value in values.items():
+            if value is None:
+                self.storage.delete(key)
+            else:
+                self.storage.set(key, value)
+
+    async def deleteMany(self, keys: Iterable[PersistKey]) -> None:
+        for key in keys:
+            self.storage.delete(key)
+
+
 class MemoryStorage(Storage):
     """
     The in-memory storage implementation for the Logto client. Note this should
     only be used for testing, since the data will be lost after the page is
-    redirected.
+    redirected. Use `MemorySessionStore` for a bounded in-memory storage of many
+    sessions.
 
     See `Storage` for the interface.
     """
@@ -61,18 +145,24 @@ class MemoryStorage(Storage):
 
     def __init__(self) -> None:
         self._data: Dict[str, str] = {}
+        self._warned = False
+
+    def _warnOnce(self) -> None:
+        if not self._warned:
+            self._warned = True
+            MemoryStorage.printWarning()
 
     def get(self, key: str) -> Optional[str]:
-        MemoryStorage.printWarning()
+        self._warnOnce()
         return self._data.get(key, None)
 
     def set(self, key: str, value: Optional[str]) -> None:
-        MemoryStorage.printWarning()
+        self._warnOnce()
         if value is not None:
             self._data[key] = value
         else:
             self._data.pop(key, None)
 
     def delete(self, key: str) -> None:
-        MemoryStorage.printWarning()
+        self._warnOnce()
         self._data.pop(key, None)
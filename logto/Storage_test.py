@@ -0,0 +1,45 @@
+import pytest
+
+from .Storage import MemoryStorage, SyncStorageAdapter
+
+
+class TestSyncStorageAdapter:
+    async def test_getMany(self) -> None:
+        storage = MemoryStorage()
+        storage.set("idToken", "idToken")
+        adapter = SyncStorageAdapter(storage)
+
+        assert await adapter.getMany(["idToken", "refreshToken"]) == {
+            "idToken": "idToken",
+            "refreshToken": None,
+        }
+        assert await adapter.get("idToken") == "idToken"
+
+    async def test_setMany(self) -> None:
+        storage = MemoryStorage()
+        storage.set("idToken", "idToken")
+        adapter = SyncStorageAdapter(storage)
+        await adapter.setMany({"refreshToken": "refreshToken", "idToken": None})
+
+        assert storage.get("idToken") is None
+        assert storage.get("refreshToken") == "refreshToken"
+
+    async def test_deleteMany(self) -> None:
+        storage = MemoryStorage()
+        storage.set("idToken", "idToken")
+        storage.set("refreshToken", "refreshToken")
+        adapter = SyncStorageAdapter(storage)
+        await adapter.deleteMany(["idToken", "refreshToken"])
+
+        assert storage.get("idToken") is None
+        assert storage.get("refreshToken") is None
+
+
+class TestMemoryStorage:
+    def test_printWarningOnce(self, capsys: pytest.CaptureFixture[str]) -> None:
+        storage = MemoryStorage()
+        storage.set("idToken", "idToken")
+        storage.get("idToken")
+        storage.delete("idToken")
+
+        assert capsys.readouterr().out.count("WARNING") == 1
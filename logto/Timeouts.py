@@ -0,0 +1,158 @@
+"""
+The timeouts of the requests to Logto, and the deadlines of the client operations.
+"""
+
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Coroutine, Optional, TypeVar
+
+import aiohttp
+from pydantic import BaseModel
+
+from .LogtoException import LogtoException
+
+T = TypeVar("T")
+
+
+class Timeout(BaseModel):
+    """
+    The timeouts (in seconds) of one attempt of a request, `None` means no timeout.
+    """
+
+    connect: Optional[float] = 5
+    """
+    The time to establish a connection to Logto.
+    """
+
+    read: Optional[float] = 10
+    """
+    The time to wait for the next chunk of the response.
+    """
+
+    total: Optional[float] = 15
+    """
+    The time of the whole attempt, including waiting for a pooled connection.
+    """
+
+
+class Timeouts(BaseModel):
+    """
+    The timeouts of the requests to Logto by operation. Each retry of a request (see
+    `RetryPolicies`) gets its own timeouts.
+    """
+
+    discovery: Timeout = Timeout()
+    jwks: Timeout = Timeout()
+    userInfo: Timeout = Timeout()
+    refreshToken: Timeout = Timeout()
+    authorizationCode: Timeout = Timeout()
+
+
+class LogtoDeadlineExceededException(LogtoException):
+    """
+    The exception raised when an operation can't be completed before its deadline.
+    """
+
+    pass
+
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "deadline", default=None
+)
+"""
+The deadline (a `time.monotonic()` timestamp) of the operation in progress.
+"""
+
+
+def getRemainingTime() -> Optional[float]:
+    """
+    Get the time (in seconds) left before the deadline of the operation in progress,
+    `None` if it has no deadline.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def withoutDeadline() -> contextvars.Context:
+    """
+    Get a copy of the current context without the deadline of the operation in
+    progress, for running the callbacks that outlive the operation (e.g. background
+    renewals).
+    """
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return context
+
+
+def createSharedTask(coroutine: Coroutine[Any, Any, T]) -> "asyncio.Task[T]":
+    """
+    Start a task in the running event loop without the deadline of the operation in
+    progress, for the work that is shared with other callers (e.g. a single-flight
+    load). Each caller applies its own deadline when waiting for the task, so the
+    task isn't cut short by the deadline of the caller that started it.
+    """
+    return withoutDeadline().run(asyncio.get_running_loop().create_task, coroutine)
+
+
+def toClientTimeout(timeout: Timeout) -> aiohttp.ClientTimeout:
+    """
+    Convert the timeout to the aiohttp timeout of a request attempt, which doesn't
+    last beyond the deadline of the operation in progress. Raise
+    `LogtoDeadlineExceededException` if the deadline has passed.
+    """
+    total = timeout.total
+    remaining = getRemainingTime()
+    if remaining is not None:
+        if remaining <= 0:
+            raise LogtoDeadlineExceededException("The deadline has passed")
+        total = remaining if total is None else min(total, remaining)
+    return aiohttp.ClientTimeout(
+        total=total, sock_connect=timeout.connect, sock_read=timeout.read
+    )
+
+
+async def runWithDeadline(operation: Awaitable[T], deadline: Optional[float]) -> T:
+    """
+    Run the operation with the given deadline (a `time.monotonic()` timestamp), and
+    raise `LogtoDeadlineExceededException` if it's not completed in time. The
+    requests of the operation are bounded by the deadline, as well as any earlier
+    deadline of the caller.
+
+    The shared and background tasks started by the operation (see
+    `createSharedTask`) don't inherit the deadline; waiting for them is bounded by
+    the deadline instead.
+    """
+    if deadline is None:
+        return await operation
+
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        if asyncio.iscoroutine(operation):
+            operation.close()
+        raise LogtoDeadlineExceededException("The deadline has passed")
+
+    token = _deadline.set(deadline)
+    try:
+        # The task copies the context, so the requests see the deadline
+        task = asyncio.ensure_future(operation)
+    finally:
+        _deadline.reset(token)
+
+    try:
+        done, _ = await asyncio.wait({task}, timeout=remaining)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if not done:
+        task.cancel()
+        await asyncio.wait({task})
+        if not task.cancelled():
+            task.exception()  # Avoid the "exception was never retrieved" warning
+        raise LogtoDeadlineExceededException(
+            f"The operation was not completed in {remaining:.3f} seconds"
+        )
+    return task.result()
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from typing import Any
+
+import pytest
+
+from .Timeouts import (
+    LogtoDeadlineExceededException,
+    Timeout,
+    getRemainingTime,
+    runWithDeadline,
+    toClientTimeout,
+)
+
+
+class TestTimeouts:
+    def test_toClientTimeout(self) -> None:
+        timeout = toClientTimeout(Timeout(connect=1, read=2, total=3))
+
+        assert (timeout.sock_connect, timeout.sock_read, timeout.total) == (1, 2, 3)
+
+    async def test_toClientTimeout_deadline(self) -> None:
+        async def getTotal(timeout: Timeout) -> Any:
+            return toClientTimeout(timeout).total
+
+        deadline = time.monotonic() + 1
+        assert await runWithDeadline(getTotal(Timeout(total=0.5)), deadline) == 0.5
+        assert 0.5 < await runWithDeadline(getTotal(Timeout(total=None)), deadline) <= 1
+
+    async def test_runWithDeadline(self) -> None:
+        async def remaining() -> Any:
+            # The earlier deadline of the caller wins
+            return await runWithDeadline(
+                asyncio.sleep(0, getRemainingTime()), time.monotonic() + 10
+            )
+
+        assert 0 < await runWithDeadline(remaining(), time.monotonic() + 1) <= 1
+        assert await runWithDeadline(asyncio.sleep(0, "done"), None) == "done"
+        assert getRemainingTime() is None
+
+    async def test_runWithDeadline_exceeded(self) -> None:
+        start = time.monotonic()
+        with pytest.raises(LogtoDeadlineExceededException):
+            await runWithDeadline(asyncio.sleep(10), start + 0.05)
+        assert time.monotonic() - start < 0.4
+
+        with pytest.raises(LogtoDeadlineExceededException):
+            await runWithDeadline(asyncio.sleep(0), start)
+
+    async def test_runWithDeadline_timeoutError(self) -> None:
+        async def timeout() -> None:
+            raise asyncio.TimeoutError()
+
+        # Timeouts of the requests are not mistaken for the deadline
+        with pytest.raises(asyncio.TimeoutError):
+            await runWithDeadline(timeout(), time.monotonic() + 10)
@@ -0,0 +1,136 @@
+"""
+The background refresher that renews access tokens before they expire.
+"""
+
+import asyncio
+import random
+import time
+import weakref
+from typing import TYPE_CHECKING, Dict, Optional, Set
+
+from .Timeouts import withoutDeadline
+
+if TYPE_CHECKING:
+    from .LogtoClient import LogtoClient
+
+
+class _Schedule:
+    __slots__ = ("accessToken", "handle", "lastUsedAt")
+
+    def __init__(
+        self, accessToken: str, handle: asyncio.TimerHandle, lastUsedAt: float
+    ) -> None:
+        self.accessToken = accessToken
+        self.handle = handle
+        self.lastUsedAt = lastUsedAt
+
+
+class TokenRefresher:
+    """
+    An opt-in refresher that renews the access tokens of active sessions in the
+    background, so `getAccessToken` calls are almost always served from storage.
+
+    The renewal of a token is scheduled at `refreshAt` of its remaining lifetime, with
+    a random jitter of `jitter` (as a fraction of the delay) to avoid synchronized
+    bursts. A token is only renewed if it has been used within `idleTimeout` seconds.
+
+    The refresher runs in the event loop where the tokens are stored, and it's only
+    useful when the loop and the client's storage outlive the request (e.g. an ASGI
+    server with a storage keyed by session ID).
+
+    Example:
+      ```python
+      refresher = TokenRefresher(refreshAt=0.75)
+      client = LogtoClient(config, storage, refresher=refresher)
+      ```
+    """
+
+    def __init__(
+        self, refreshAt: float = 0.75, jitter: float = 0.1, idleTimeout: float = 600
+    ) -> None:
+        self.refreshAt = refreshAt
+        self.jitter = jitter
+        self.idleTimeout = idleTimeout
+        self._schedules: (
+            "weakref.WeakKeyDictionary[LogtoClient, Dict[str, _Schedule]]"
+        ) = weakref.WeakKeyDictionary()
+        self._tasks: "Set[asyncio.Task[Optional[str]]]" = set()
+
+    def schedule(
+        self, client: "LogtoClient", resource: str, accessToken: str, expiresAt: int
+    ) -> None:
+        """
+        Schedule the renewal of the access token for the client and the resource,
+        replacing the existing schedule (if any).
+        """
+        schedules = self._schedules.setdefault(client, {})
+        existing = schedules.get(resource)
+        if existing is not None:
+            existing.handle.cancel()
+        # Renewed tokens keep the last usage of the previous token, so idle sessions
+        # are not renewed forever
+        lastUsedAt = existing.lastUsedAt if existing is not None else time.monotonic()
+
+        delay = max(0.0, (expiresAt - time.time()) * self.refreshAt)
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        clientRef = weakref.ref(client)
+        handle = asyncio.get_running_loop().call_later(
+            delay, self._refresh, clientRef, resource, context=withoutDeadline()
+        )
+        schedules[resource] = _Schedule(accessToken, handle, lastUsedAt)
+
+    def touch(
+        self, client: "LogtoClient", resource: str, accessToken: str, expiresAt: int
+    ) -> None:
+        """
+        Mark the access token as used, and schedule its renewal if it's not scheduled
+        yet (e.g. the token was stored by another process).
+        """
+        schedules = self._schedules.get(client, {})
+        if resource not in schedules or schedules[resource].accessToken != accessToken:
+            self.schedule(client, resource, accessToken, expiresAt)
+        self._schedules[client][resource].lastUsedAt = time.monotonic()
+
+    def cancel(self, client: "LogtoClient") -> None:
+        """
+        Cancel all scheduled renewals for the client, e.g. when the user signs out.
+        """
+        for schedule in self._schedules.pop(client, {}).values():
+            schedule.handle.cancel()
+
+    def close(self) -> None:
+        """
+        Cancel all scheduled and running renewals.
+        """
+        for schedules in list(self._schedules.values()):
+            for schedule in schedules.values():
+                schedule.handle.cancel()
+        self._schedules.clear()
+        for task in self._tasks:
+            task.cancel()
+
+    def _refresh(
+        self, clientRef: "weakref.ReferenceType[LogtoClient]", resource: str
+    ) -> None:
+        client = clientRef()
+        if client is None:
+            return
+
+        schedule = self._schedules.get(client, {}).get(resource)
+        if (
+            schedule is None
+            or time.monotonic() - schedule.lastUsedAt > self.idleTimeout
+        ):
+            return
+
+        task = asyncio.get_running_loop().create_task(
+            client._refreshAccessToken(resource, staleAccessToken=schedule.accessToken)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._onRefreshed)
+
+    def _onRefreshed(self, task: "asyncio.Task[Optional[str]]") -> None:
+        self._tasks.discard(task)
+        if not task.cancelled():
+            # The token will be refreshed in the foreground if the renewal failed
+            task.exception()
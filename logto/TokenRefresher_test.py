@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+from pytest_mock import MockerFixture
+
+from . import LogtoClient, LogtoConfig
+from .models.response import TokenResponse
+from .OidcCore import OidcCore
+from .Storage import MemoryStorage
+from .Timeouts import getRemainingTime
+from .TokenRefresher import TokenRefresher
+from .utilities.test import mockProviderMetadata
+
+
+class TestTokenRefresher:
+    @pytest.fixture
+    def refresher(self) -> TokenRefresher:
+        refresher = TokenRefresher(refreshAt=1, jitter=0)
+        yield refresher
+        refresher.close()
+
+    @pytest.fixture
+    def client(self, refresher: TokenRefresher, mocker: MockerFixture) -> LogtoClient:
+        storage = MemoryStorage()
+        storage.set("refreshToken", "refreshToken")
+        client = LogtoClient(
+            LogtoConfig(endpoint="https://logto.app", appId="appId"),
+            storage,
+            refresher=refresher,
+        )
+        client._oidcCore = OidcCore(mockProviderMetadata)
+        mocker.patch(
+            "logto.OidcCore.OidcCore.fetchTokenByRefreshToken",
+            return_value=TokenResponse(
+                access_token="renewedToken", token_type="Bearer", expires_in=3600
+            ),
+        )
+        return client
+
+    async def test_schedule(
+        self, refresher: TokenRefresher, client: LogtoClient
+    ) -> None:
+        await client._setAccessToken("", "accessToken", 60)
+        refresher.schedule(client, "", "accessToken", int(time.time()))
+        await asyncio.sleep(0.05)
+
+        assert await client.getAccessToken() == "renewedToken"
+        assert OidcCore.fetchTokenByRefreshToken.call_count == 1  # type: ignore
+
+    async def test_schedule_jitter(self, client: LogtoClient) -> None:
+        refresher = TokenRefresher(refreshAt=0.5, jitter=0.1)
+        refresher.schedule(client, "", "accessToken", int(time.time()) + 1000)
+        handle = refresher._schedules[client][""].handle
+        delay = handle.when() - asyncio.get_running_loop().time()
+
+        assert 450 - 1 <= delay <= 550
+        refresher.close()
+
+    async def test_schedule_idle(
+        self, refresher: TokenRefresher, client: LogtoClient
+    ) -> None:
+        refresher.idleTimeout = -1
+        await client._setAccessToken("", "accessToken", 3600)
+        refresher.schedule(client, "", "accessToken", int(time.time()))
+        await asyncio.sleep(0.05)
+
+        assert await client.getAccessToken() == "accessToken"
+        assert OidcCore.fetchTokenByRefreshToken.call_count == 0  # type: ignore
+
+    async def test_schedule_deadline(
+        self, refresher: TokenRefresher, client: LogtoClient
+    ) -> None:
+        remainingTimes = []
+        renewedToken = OidcCore.fetchTokenByRefreshToken.return_value  # type: ignore
+        OidcCore.fetchTokenByRefreshToken.side_effect = lambda *args, **kwargs: (  # type: ignore
+            remainingTimes.append(getRemainingTime()) or renewedToken
+        )
+        await client._setAccessToken("", "accessToken", 60)
+
+        # Scheduled by a call with a deadline, but renewed without it
+        await client.getAccessToken(deadline=time.monotonic() + 0.01)
+        await asyncio.sleep(0.05)
+
+        assert await client.getAccessToken() == "renewedToken"
+        assert remainingTimes == [None]
+
+    async def test_touch(self, refresher: TokenRefresher, client: LogtoClient) -> None:
+        await client._setAccessToken("", "accessToken", 3600)
+
+        # Scheduled on the first use of a stored token
+        assert await client.getAccessToken() == "accessToken"
+        assert refresher._schedules[client][""].accessToken == "accessToken"
+
+    async def test_cancel(self, refresher: TokenRefresher, client: LogtoClient) -> None:
+        refresher.schedule(client, "", "accessToken", int(time.time()) + 1000)
+        handle = refresher._schedules[client][""].handle
+        refresher.cancel(client)
+
+        assert handle.cancelled()
+        assert client not in refresher._schedules
@@ -0,0 +1,158 @@
+"""
+The tracing hooks of the Logto client. The default tracer does nothing; implement
+`Tracer` to export the spans to your tracing system (e.g. OpenTelemetry).
+"""
+
+from typing import Any, ContextManager, Dict, Iterable, Mapping, Optional
+
+from .HttpTransport import HttpMethod, HttpResponse, HttpTransport
+from .Storage import AsyncStorage, PersistKey
+
+
+class Span:
+    """
+    A span in progress. The base class records nothing, and it's a context manager
+    that returns itself, so `Tracer.span` can return a shared instance.
+    """
+
+    traceparent: Optional[str] = None
+    """
+    The W3C `traceparent` header value of the span, which is sent with the outbound
+    requests made in the span. `None` means no header is sent.
+    """
+
+    def setAttribute(self, key: str, value: Any) -> None:
+        """
+        Set an attribute of the span, e.g. the HTTP status or a cache hit.
+        """
+        pass
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+
+_noopSpan = Span()
+
+
+class Tracer:
+    """
+    The tracer of the Logto client, which creates a span for each user operation,
+    outbound request, storage access and signature verification. The base class is
+    the no-op tracer, which only costs a method call per span.
+
+    The span names are `logto.<operation>` (e.g. `logto.getAccessToken`,
+    `logto.http.token`, `logto.storage.getMany`, `logto.verifyIdToken`), with
+    attributes such as `logto.resource`, `logto.grant_type`, `logto.cache_hit`,
+    `url.full` and `http.response.status_code`. Exceptions raised in a span are
+    passed to the `__exit__` of the span's context manager.
+
+    Example:
+      ```python
+      from contextlib import contextmanager
+      from opentelemetry import trace
+      from opentelemetry.propagate import inject
+
+      class OtelSpan(Span):
+          def __init__(self, span):
+              self.span = span
+              carrier = {}
+              inject(carrier)
+              self.traceparent = carrier.get("traceparent")
+
+          def setAttribute(self, key, value):
+              self.span.set_attribute(key, value)
+
+      class OtelTracer(Tracer):
+          @contextmanager
+          def span(self, name, attributes=None):
+              tracer = trace.get_tracer("logto")
+              with tracer.start_as_current_span(name, attributes=attributes) as span:
+                  yield OtelSpan(span)
+
+      client = LogtoClient(config, storage, tracer=OtelTracer())
+      ```
+    """
+
+    def span(
+        self, name: str, attributes: Optional[Dict[str, Any]] = None
+    ) -> ContextManager[Span]:
+        """
+        Start a span with the given name and attributes, which ends when the returned
+        context manager exits.
+        """
+        return _noopSpan
+
+
+noopTracer = Tracer()
+"""
+The default tracer that records nothing.
+"""
+
+
+def formatTraceparent(traceId: int, spanId: int, sampled: bool = True) -> str:
+    """
+    Format the W3C `traceparent` header value for the given trace ID (128-bit) and
+    span ID (64-bit).
+
+    See: https://www.w3.org/TR/trace-context/#traceparent-header
+    """
+    return f"00-{traceId:032x}-{spanId:016x}-{'01' if sampled else '00'}"
+
+
+async def tracedRequest(
+    tracer: Tracer,
+    transport: HttpTransport,
+    endpoint: str,
+    method: HttpMethod,
+    url: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    **kwargs: Any,
+) -> HttpResponse:
+    """
+    Send a request with the transport in a `logto.http.<endpoint>` span, and propagate
+    the `traceparent` of the span in the request headers.
+    """
+    with tracer.span(
+        f"logto.http.{endpoint}",
+        {"http.request.method": method.upper(), "url.full": url, **(attributes or {})},
+    ) as span:
+        if span.traceparent is not None:
+            kwargs["headers"] = {
+                **kwargs.get("headers", {}),
+                "traceparent": span.traceparent,
+            }
+        resp = await transport.request(method, url, **kwargs)
+        span.setAttribute("http.response.status_code", resp.status)
+        return resp
+
+
+class TracedStorage(AsyncStorage):
+    """
+    The async storage that traces each access to the wrapped storage in a
+    `logto.storage.<method>` span, with the accessed keys in `logto.storage.keys`.
+    """
+
+    def __init__(self, storage: AsyncStorage, tracer: Tracer) -> None:
+        self.storage = storage
+        self.tracer = tracer
+
+    async def getMany(
+        self, keys: Iterable[PersistKey]
+    ) -> Dict[PersistKey, Optional[str]]:
+        keys = list(keys)
+        with self.tracer.span("logto.storage.getMany", {"logto.storage.keys": keys}):
+            return await self.storage.getMany(keys)
+
+    async def setMany(self, values: Mapping[PersistKey, Optional[str]]) -> None:
+        with self.tracer.span(
+            "logto.storage.setMany", {"logto.storage.keys": list(values)}
+        ):
+            await self.storage.setMany(values)
+
+    async def deleteMany(self, keys: Iterable[PersistKey]) -> None:
+        keys = list(keys)
+        with self.tracer.span("logto.storage.deleteMany", {"logto.storage.keys": keys}):
+            await self.storage.deleteMany(keys)
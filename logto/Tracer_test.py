@@ -0,0 +1,153 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from . import LogtoClient, LogtoConfig
+from .HttpTransport import HttpResponse, HttpTransport
+from .Storage import MemoryStorage, SyncStorageAdapter
+from .Tracer import (
+    Span,
+    TracedStorage,
+    Tracer,
+    formatTraceparent,
+    noopTracer,
+    tracedRequest,
+)
+from .utilities.test import FakeLogtoServer
+
+
+class RecordedSpan(Span):
+    def __init__(self, name: str, attributes: Dict[str, Any], spanId: int) -> None:
+        self.name = name
+        self.attributes = attributes
+        self.traceparent = formatTraceparent(1, spanId)
+
+    def setAttribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+
+class RecordingTracer(Tracer):
+    def __init__(self) -> None:
+        self.spans: List[RecordedSpan] = []
+
+    @contextmanager
+    def span(
+        self, name: str, attributes: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Span]:
+        span = RecordedSpan(name, dict(attributes or {}), len(self.spans) + 1)
+        self.spans.append(span)
+        yield span
+
+    def find(self, name: str) -> List[Dict[str, Any]]:
+        return [span.attributes for span in self.spans if span.name == name]
+
+
+class StubTransport(HttpTransport):
+    def __init__(self) -> None:
+        super().__init__()
+        self.kwargs: Dict[str, Any] = {}
+
+    async def request(self, method: Any, url: str, **kwargs: Any) -> HttpResponse:
+        self.kwargs = kwargs
+        return HttpResponse(200, {}, json={})
+
+
+def test_formatTraceparent() -> None:
+    assert (
+        formatTraceparent(0xABC, 0x12, sampled=False)
+        == "00-00000000000000000000000000000abc-0000000000000012-00"
+    )
+
+
+async def test_tracedRequest() -> None:
+    tracer = RecordingTracer()
+    transport = StubTransport()
+    await tracedRequest(
+        tracer,
+        transport,
+        "token",
+        "post",
+        "https://logto.app/oidc/token",
+        {"logto.grant_type": "refresh_token"},
+        headers={"foo": "bar"},
+    )
+
+    assert transport.kwargs["headers"] == {
+        "foo": "bar",
+        "traceparent": formatTraceparent(1, 1),
+    }
+    assert tracer.find("logto.http.token") == [
+        {
+            "http.request.method": "POST",
+            "url.full": "https://logto.app/oidc/token",
+            "logto.grant_type": "refresh_token",
+            "http.response.status_code": 200,
+        }
+    ]
+
+
+async def test_tracedRequest_noop() -> None:
+    transport = StubTransport()
+    await tracedRequest(noopTracer, transport, "jwks", "get", "https://logto.app")
+
+    assert noopTracer.span("logto.test") is noopTracer.span("logto.test")
+    assert "headers" not in transport.kwargs
+
+
+async def test_TracedStorage() -> None:
+    tracer = RecordingTracer()
+    storage = TracedStorage(SyncStorageAdapter(MemoryStorage()), tracer)
+    await storage.setMany({"idToken": "idToken"})
+
+    assert await storage.getMany(key for key in ["idToken"]) == {"idToken": "idToken"}
+    await storage.deleteMany(["idToken"])
+    assert [span.name for span in tracer.spans] == [
+        "logto.storage.setMany",
+        "logto.storage.getMany",
+        "logto.storage.deleteMany",
+    ]
+    assert tracer.find("logto.storage.getMany") == [{"logto.storage.keys": ["idToken"]}]
+
+
+async def test_LogtoClient() -> None:
+    tracer = RecordingTracer()
+    async with HttpTransport() as transport, FakeLogtoServer() as server:
+        client = LogtoClient(
+            LogtoConfig(endpoint=server.endpoint, appId="app"),
+            MemoryStorage(),
+            transport=transport,
+            tracer=tracer,
+        ).bind(MemoryStorage())
+        signInUrl = await client.signIn("http://app.test/callback")
+        async with transport.session.get(signInUrl, allow_redirects=False) as resp:
+            await client.handleSignInCallback(resp.headers["Location"])
+        await client.getAccessToken()
+        await client.getAccessToken("https://api.test")
+
+    names = [span.name for span in tracer.spans]
+    assert names[:3] == [
+        "logto.signIn",
+        "logto.http.discovery",
+        "logto.storage.setMany",
+    ]
+    for name in ["logto.handleSignInCallback", "logto.http.jwks"]:
+        assert name in names
+    assert tracer.find("logto.http.token") == [
+        {
+            "http.request.method": "POST",
+            "url.full": f"{server.endpoint}/oidc/token",
+            "logto.grant_type": "authorization_code",
+            "http.response.status_code": 200,
+        },
+        {
+            "http.request.method": "POST",
+            "url.full": f"{server.endpoint}/oidc/token",
+            "logto.grant_type": "refresh_token",
+            "logto.resource": "https://api.test",
+            "http.response.status_code": 200,
+        },
+    ]
+    assert tracer.find("logto.verifyIdToken") == [{}]
+    assert tracer.find("logto.getAccessToken") == [
+        {"logto.resource": "", "logto.cache_hit": True},
+        {"logto.resource": "https://api.test", "logto.cache_hit": False},
+    ]
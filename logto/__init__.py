@@ -4,8 +4,53 @@ from .LogtoClient import (
     InteractionMode as InteractionMode,
     AccessToken as AccessToken,
 )
+from .AccessTokenVerifier import AccessTokenVerifier as AccessTokenVerifier
+from .CircuitBreaker import (
+    CircuitBreaker as CircuitBreaker,
+    LogtoCircuitOpenException as LogtoCircuitOpenException,
+)
+from .ClientRegistry import ClientRegistry as ClientRegistry
+from .HttpTransport import HttpTransport as HttpTransport
+from .JwksStore import JwksStore as JwksStore
 from .LogtoException import LogtoException as LogtoException
-from .Storage import Storage as Storage, PersistKey as PersistKey
+from .Metrics import (
+    MetricsRegistry as MetricsRegistry,
+    MetricsTracer as MetricsTracer,
+)
+from .RefreshLock import (
+    RefreshLock as RefreshLock,
+    FileRefreshLock as FileRefreshLock,
+)
+from .RetryPolicy import (
+    RetryPolicy as RetryPolicy,
+    RetryPolicies as RetryPolicies,
+    defaultRetryPolicies as defaultRetryPolicies,
+    noRetry as noRetry,
+)
+from .SessionStore import (
+    SessionStore as SessionStore,
+    SessionStorage as SessionStorage,
+    MemorySessionStore as MemorySessionStore,
+    SqliteSessionStore as SqliteSessionStore,
+)
+from .SharedCache import SharedCache as SharedCache
+from .Storage import (
+    Storage as Storage,
+    AsyncStorage as AsyncStorage,
+    SyncStorageAdapter as SyncStorageAdapter,
+    PersistKey as PersistKey,
+)
+from .Timeouts import (
+    LogtoDeadlineExceededException as LogtoDeadlineExceededException,
+    Timeout as Timeout,
+    Timeouts as Timeouts,
+)
+from .TokenRefresher import TokenRefresher as TokenRefresher
+from .Tracer import (
+    Tracer as Tracer,
+    Span as Span,
+    formatTraceparent as formatTraceparent,
+)
 from .models.oidc import (
     AccessTokenClaims as AccessTokenClaims,
     IdTokenClaims as IdTokenClaims,
@@ -13,6 +58,7 @@ from .models.oidc import (
     Scope as Scope,
     UserInfoScope as UserInfoScope,
 )
+from .utilities.cache import VerifiedTokenCache as VerifiedTokenCache
 from .models.response import (
     TokenResponse as TokenResponse,
     UserInfoResponse as UserInfoResponse,
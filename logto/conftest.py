@@ -0,0 +1,12 @@
+import pytest
+
+from .OidcCore import providerMetadataCache
+
+
+@pytest.fixture(autouse=True)
+def clearCaches():
+    """
+    Clear the process-wide caches so tests don't leak state to each other.
+    """
+    yield
+    providerMetadataCache.clear()
@@ -0,0 +1,263 @@
+"""
+A load generator that runs the auth flows of concurrent virtual users through
+`LogtoClient` against a local `FakeLogtoServer`, and reports the throughput, latency
+and outbound requests of each user action.
+
+Usage:
+  python -m logto.loadtest [--users 100] [--pageViews 10] [--organizations 2]
+                           [--latency 0] [--errorRate 0] [--output report.json]
+
+Each user signs in (`signIn` and `handleSignInCallback`), views pages (a `pageView`
+calls `getAccessToken` and `getOrganizationToken` for each organization), refreshes
+the tokens once (`refresh`), and signs out (`signOut`). The requests of the browser
+(e.g. to the authorization endpoint) are not counted, and faults are not injected
+into them.
+
+The server runs in the same event loop as the users, so the latencies include the
+time spent signing tokens; compare them between runs rather than reading them as
+production latencies.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import platform
+import sys
+import time
+import urllib.parse
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .HttpTransport import HttpMethod, HttpResponse, HttpTransport
+from .LogtoClient import LogtoClient, LogtoConfig
+from .LogtoException import LogtoException
+from .models.oidc import UserInfoScope
+from .SessionStore import MemorySessionStore
+from .utilities.test import FakeLogtoServer
+
+_actions: contextvars.ContextVar[Tuple[str, ...]] = contextvars.ContextVar(
+    "actions", default=()
+)
+"""
+The user actions in progress, the outbound requests are counted for all of them.
+"""
+
+redirectUri = "http://app.loadtest/callback"
+_sdkPaths = [
+    "/oidc/.well-known/openid-configuration",
+    "/oidc/jwks",
+    "/oidc/token",
+    "/oidc/me",
+]
+
+
+class _CountingTransport(HttpTransport):
+    def __init__(self) -> None:
+        super().__init__(limit=0)
+        self.calls: Dict[str, "Counter[str]"] = defaultdict(Counter)
+
+    async def request(
+        self, method: HttpMethod, url: str, **kwargs: Any
+    ) -> HttpResponse:
+        path = urllib.parse.urlparse(url).path
+        for action in _actions.get():
+            self.calls[action][path] += 1
+        return await super().request(method, url, **kwargs)
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: "Counter[str]" = Counter()
+
+    @asynccontextmanager
+    async def action(self, name: str) -> AsyncIterator[None]:
+        token = _actions.set(_actions.get() + (name,))
+        start = time.perf_counter()
+        try:
+            yield
+        except LogtoException:
+            self.errors[name] += 1
+            raise
+        else:
+            self.latencies[name].append(time.perf_counter() - start)
+        finally:
+            _actions.reset(token)
+
+
+async def _runUser(
+    user: int,
+    client: LogtoClient,
+    store: MemorySessionStore,
+    transport: HttpTransport,
+    recorder: _Recorder,
+    pageViews: int,
+    organizations: int,
+) -> None:
+    storage = store.storage(f"user-{user}")
+    client = client.bind(storage)
+
+    async with recorder.action("signIn"):
+        signInUrl = await client.signIn(redirectUri)
+    # The browser follows the sign-in URL, and Logto redirects back with a code
+    async with transport.session.get(signInUrl, allow_redirects=False) as resp:
+        callbackUri = resp.headers["Location"]
+    async with recorder.action("handleSignInCallback"):
+        await client.handleSignInCallback(callbackUri)
+
+    for _ in range(pageViews):
+        async with recorder.action("pageView"):
+            async with recorder.action("getAccessToken"):
+                await client.getAccessToken()
+            for organization in range(organizations):
+                async with recorder.action("getOrganizationToken"):
+                    await client.getOrganizationToken(f"organization-{organization}")
+
+    # Expire the access tokens, so the next call refreshes them
+    storage.delete("accessTokenMap")
+    async with recorder.action("refresh"):
+        await client.getAccessToken()
+
+    async with recorder.action("signOut"):
+        await client.signOut()
+
+
+def _percentileMs(sortedLatencies: List[float], percentile: float) -> Optional[float]:
+    if not sortedLatencies:
+        return None
+    index = min(len(sortedLatencies) - 1, int(len(sortedLatencies) * percentile))
+    return round(sortedLatencies[index] * 1e3, 3)
+
+
+async def runLoadTest(
+    users: int = 100,
+    pageViews: int = 10,
+    organizations: int = 2,
+    **serverOptions: Any,
+) -> Dict[str, Any]:
+    """
+    Run the flows of the virtual users concurrently, and return the report. The
+    server options are passed to `FakeLogtoServer`.
+
+    For each action, the report has the number of successful and failed actions,
+    the throughput over the whole run (`perSec`), the latency in milliseconds
+    (`p50Ms`, `p95Ms` and `p99Ms`), and the outbound requests per action in total
+    (`callsPerAction`) and by path (`calls`).
+    """
+    recorder = _Recorder()
+    store = MemorySessionStore(maxSessions=max(users, 1))
+
+    serverOptions.setdefault("faultPaths", _sdkPaths)
+    async with FakeLogtoServer(**serverOptions) as server:
+        async with _CountingTransport() as transport:
+            client = LogtoClient(
+                LogtoConfig(
+                    endpoint=server.endpoint,
+                    appId="loadtest",
+                    scopes=[UserInfoScope.organizations],
+                ),
+                transport=transport,
+            )
+            start = time.perf_counter()
+            outcomes = await asyncio.gather(
+                *(
+                    _runUser(
+                        user,
+                        client,
+                        store,
+                        transport,
+                        recorder,
+                        pageViews,
+                        organizations,
+                    )
+                    for user in range(users)
+                ),
+                return_exceptions=True,
+            )
+            elapsed = time.perf_counter() - start
+
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException) and not isinstance(
+            outcome, LogtoException
+        ):
+            raise outcome
+
+    actions: Dict[str, Any] = {}
+    for name in dict.fromkeys([*recorder.latencies, *recorder.errors]):
+        latencies = sorted(recorder.latencies[name])
+        count = len(latencies) + recorder.errors[name]
+        calls = transport.calls[name]
+        actions[name] = {
+            "count": len(latencies),
+            "errors": recorder.errors[name],
+            "perSec": round(len(latencies) / elapsed, 1),
+            "p50Ms": _percentileMs(latencies, 0.5),
+            "p95Ms": _percentileMs(latencies, 0.95),
+            "p99Ms": _percentileMs(latencies, 0.99),
+            "callsPerAction": round(sum(calls.values()) / count, 3),
+            "calls": dict(calls),
+        }
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": int(time.time()),
+            "users": users,
+            "pageViews": pageViews,
+            "organizations": organizations,
+            "elapsedSec": round(elapsed, 3),
+        },
+        "actions": actions,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m logto.loadtest",
+        description="Run the auth flows of concurrent users against a fake Logto.",
+    )
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--pageViews", type=int, default=10)
+    parser.add_argument("--organizations", type=int, default=2)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="server latency in milliseconds"
+    )
+    parser.add_argument(
+        "--errorRate", type=float, default=0, help="fraction of failed requests"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        runLoadTest(
+            args.users,
+            args.pageViews,
+            args.organizations,
+            latency=args.latency / 1e3,
+            errorRate=args.errorRate,
+            seed=args.seed,
+        )
+    )
+
+    for name, action in report["actions"].items():
+        print(
+            f"{name:<22}{action['count']:>8}{action['errors']:>6} errors"
+            f"{action['perSec']:>10.0f}/s{action['p50Ms'] or 0:>9.2f} p50ms"
+            f"{action['p99Ms'] or 0:>9.2f} p99ms{action['callsPerAction']:>7.2f} calls",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
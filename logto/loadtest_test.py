@@ -0,0 +1,34 @@
+from .loadtest import runLoadTest
+
+
+class TestLoadTest:
+    async def test_runLoadTest(self) -> None:
+        report = await runLoadTest(users=5, pageViews=3, organizations=2)
+        actions = report["actions"]
+
+        assert report["meta"]["users"] == 5
+        assert actions["pageView"]["count"] == 15
+        assert actions["getOrganizationToken"]["count"] == 30
+        assert actions["pageView"]["p99Ms"] >= actions["pageView"]["p50Ms"]
+        # One discovery and one JWKS request are shared by all users
+        assert actions["signIn"]["calls"] == {
+            "/oidc/.well-known/openid-configuration": 1
+        }
+        assert actions["handleSignInCallback"]["calls"] == {
+            "/oidc/token": 5,
+            "/oidc/jwks": 1,
+        }
+        # Organization tokens are only fetched on the first page view
+        assert actions["pageView"]["calls"] == {"/oidc/token": 10}
+        assert actions["refresh"]["callsPerAction"] == 1
+        assert actions["signOut"]["callsPerAction"] == 0
+
+    async def test_runLoadTest_errors(self) -> None:
+        report = await runLoadTest(
+            users=5, pageViews=1, errorRate=1, faultPaths=["/oidc/token"]
+        )
+        callback = report["actions"]["handleSignInCallback"]
+
+        assert (callback["count"], callback["errors"]) == (0, 5)
+        assert callback["p50Ms"] is None
+        assert "pageView" not in report["actions"]
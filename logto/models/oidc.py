@@ -1,6 +1,6 @@
 import warnings
 from enum import Enum
-from typing import Any, List, Optional, Type, TypeVar
+from typing import Any, List, Optional, Type, TypeVar, Union
 
 from pydantic import BaseModel, ConfigDict
 
@@ -307,12 +307,15 @@ class AccessTokenClaims(BaseModel):
     """
     The subject identifier for whom the token is intended (user ID).
     """
-    aud: str
+    aud: Union[str, List[str]]
     """
     The audience that the token is intended for, which may be one of the following:
     - Client ID
     - Resource indicator
     - Logto organization URN (`urn:logto:organization:<organization_id>`)
+
+    Logto issues tokens for a single audience, but a list of audiences is also
+    accepted, as allowed by RFC 9068.
     """
     exp: int
     """
@@ -1,4 +1,6 @@
 import base64
+import os
+import threading
 from typing import Any, Dict
 
 
@@ -9,6 +11,48 @@ def urlsafeEncode(data: bytes) -> str:
     return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
 
 
+class _RandomPool:
+    """
+    A pool of cryptographically secure random bytes drawn from the OS in bulk, so
+    generating many small tokens (e.g. during a login storm) doesn't make a system
+    call for each of them. The pool is discarded in forked child processes, so they
+    never reuse the bytes of the parent.
+    """
+
+    def __init__(self, size: int = 4096) -> None:
+        self.size = size
+        self._lock = threading.Lock()
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        self._pool = b""
+        self._offset = 0
+
+    def take(self, count: int) -> bytes:
+        if count > self.size:
+            return os.urandom(count)
+        with self._lock:
+            if self._offset + count > len(self._pool):
+                self._pool = os.urandom(self.size)
+                self._offset = 0
+            offset = self._offset
+            self._offset += count
+            return self._pool[offset : offset + count]
+
+
+_randomPool = _RandomPool()
+
+
+def tokenBytes(count: int) -> bytes:
+    """
+    Get the given number of cryptographically secure random bytes, drawn from the OS
+    in bulk.
+    """
+    return _randomPool.take(count)
+
+
 def removeFalsyKeys(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Remove keys with falsy values from the given dictionary.
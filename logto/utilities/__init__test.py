@@ -1,4 +1,8 @@
-from . import removeFalsyKeys, urlsafeEncode
+import os
+
+import pytest
+
+from . import removeFalsyKeys, tokenBytes, urlsafeEncode
 
 
 class TestRemoveFalsyKeys:
@@ -41,3 +45,28 @@ class TestUrlsafeEncode:
 
     def test_shouldReplaceUnsafeEncodedCharacters(self):
         assert urlsafeEncode(b"\xff\xff") == "__8"
+
+
+class TestTokenBytes:
+    def test_shouldReturnUniqueBytes(self):
+        tokens = [tokenBytes(32) for _ in range(1000)]
+
+        assert all(len(token) == 32 for token in tokens)
+        assert len(set(tokens)) == 1000
+
+    def test_shouldSupportLargeCounts(self):
+        assert len(tokenBytes(10000)) == 10000
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="POSIX only")
+    def test_shouldNotShareWithForkedChild(self):
+        tokenBytes(32)
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover - child process
+            os.write(write, tokenBytes(32))
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        assert os.read(read, 32) != tokenBytes(32)
+        os.close(read)
+        os.close(write)
@@ -0,0 +1,245 @@
+"""
+Caching helpers shared by the Logto client.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from ..Timeouts import createSharedTask
+
+T = TypeVar("T")
+
+
+class CacheEntry(Generic[T]):
+    """
+    A cached value with its freshness deadlines (monotonic timestamps in seconds).
+    """
+
+    __slots__ = ("value", "freshUntil", "staleUntil")
+
+    def __init__(self, value: T, freshUntil: float, staleUntil: float) -> None:
+        self.value = value
+        self.freshUntil = freshUntil
+        self.staleUntil = staleUntil
+
+
+class AsyncTtlCache(Generic[T]):
+    """
+    An in-memory cache for values that are loaded asynchronously, with TTL,
+    stale-while-revalidate refresh and single-flight loading.
+
+    - A fresh value (younger than `ttl`) is returned directly.
+    - A stale value (younger than `ttl + staleTtl`) is returned directly, and a
+      background refresh is started.
+    - Otherwise the caller waits for the value to be loaded.
+
+    Concurrent loads of the same key in the same event loop share one loader call.
+    Failed loads are not cached. `ttl` and `staleTtl` can be changed at any time, and
+    apply to the values loaded afterwards.
+    """
+
+    def __init__(self, ttl: float, staleTtl: float = 0, maxSize: int = 1024) -> None:
+        """
+        Args:
+            ttl: The time (in seconds) a loaded value is considered fresh, 0 disables
+                caching.
+            staleTtl: The extra time (in seconds) a value can be served while it's
+                being refreshed in the background.
+            maxSize: The maximum number of keys, the oldest key will be evicted when
+                the cache is full.
+        """
+        self.ttl = ttl
+        self.staleTtl = staleTtl
+        self.maxSize = maxSize
+        self._entries: Dict[Hashable, CacheEntry[T]] = {}
+        self._inflight: Dict[Hashable, "asyncio.Task[T]"] = {}
+
+    def get(self, key: Hashable) -> Optional[T]:
+        """
+        Get the cached value for the given key if it's fresh, no loading will be
+        performed.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.freshUntil <= time.monotonic():
+            return None
+        return entry.value
+
+    def getStale(self, key: Hashable) -> Optional[T]:
+        """
+        Get the cached value for the given key even if it has expired, e.g. to serve
+        it while the source is unavailable.
+        """
+        entry = self._entries.get(key)
+        return None if entry is None else entry.value
+
+    def set(self, key: Hashable, value: T) -> None:
+        """
+        Put the value to the cache, it will be fresh for `ttl` seconds. Nothing will be
+        cached if `ttl` is 0.
+        """
+        if self.ttl <= 0:
+            return
+
+        now = time.monotonic()
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.maxSize:
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = CacheEntry(
+            value, now + self.ttl, now + self.ttl + self.staleTtl
+        )
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Remove the cached value for the given key.
+        """
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Remove all cached values.
+        """
+        self._entries.clear()
+        self._inflight.clear()
+
+    async def getOrLoad(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> T:
+        """
+        Get the cached value for the given key, or load it with the loader if it's
+        missing or expired. See the class docstring for the details.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now < entry.freshUntil:
+                return entry.value
+            if now < entry.staleUntil:
+                task = self._load(key, loader)
+                if not task.done():
+                    task.add_done_callback(_consumeException)
+                return entry.value
+
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(
+        self, key: Hashable, loader: Callable[[], Awaitable[T]]
+    ) -> "asyncio.Task[T]":
+        """
+        Get the in-flight loading task for the given key, or start a new one.
+        """
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is loop:
+            return task
+
+        async def load() -> T:
+            try:
+                value = await loader()
+                self.set(key, value)
+                return value
+            finally:
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+
+        task = createSharedTask(load())
+        self._inflight[key] = task
+        return task
+
+
+class VerifiedTokenCache(Generic[T]):
+    """
+    A bounded LRU cache for the claims of verified tokens, so a token that is seen
+    repeatedly (e.g. the same bearer token on consecutive requests) is only verified
+    once.
+
+    Entries are keyed by the SHA-256 digest of the token and the verification context
+    (e.g. the issuer and the expected audience), so the raw tokens are not kept in memory. An entry
+    never outlives the `exp` of its token.
+    """
+
+    def __init__(self, maxSize: int = 10000) -> None:
+        """
+        Args:
+            maxSize: The maximum number of tokens to cache, the least recently used
+                token will be evicted when the cache is full.
+        """
+        self.maxSize = maxSize
+        self.hits = 0
+        """The number of lookups that found a valid entry."""
+        self.misses = 0
+        """The number of lookups that found no valid entry."""
+        self._entries: "OrderedDict[bytes, Tuple[T, float]]" = OrderedDict()
+
+    @staticmethod
+    def _digest(token: str, context: str) -> bytes:
+        return hashlib.sha256(f"{context}\0{token}".encode()).digest()
+
+    @property
+    def hitRatio(self) -> float:
+        """
+        The ratio of hits to all lookups, 0 if there's no lookup yet.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, token: str, context: str = "") -> Optional[T]:
+        """
+        Get the cached claims of the token verified in the given context, return None
+        if not found or the token has expired.
+        """
+        key = self._digest(token, context)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        claims, expiresAt = entry
+        if expiresAt <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def set(self, token: str, claims: T, expiresAt: float, context: str = "") -> None:
+        """
+        Cache the claims of a verified token until `expiresAt` (a UNIX timestamp in
+        seconds, usually the `exp` claim). Expired tokens are not cached.
+        """
+        if expiresAt <= time.time() or self.maxSize <= 0:
+            return
+
+        key = self._digest(token, context)
+        self._entries[key] = (claims, expiresAt)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxSize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove all cached entries and reset the counters.
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def _consumeException(task: "asyncio.Task") -> None:
+    """
+    Retrieve the exception of a background task to avoid the "exception was never
+    retrieved" warning, the stale value will be kept in this case.
+    """
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+from pytest_mock import MockerFixture
+
+from .cache import AsyncTtlCache, VerifiedTokenCache
+
+
+class Loader:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def __call__(self) -> int:
+        self.calls += 1
+        await asyncio.sleep(0)
+        return self.calls
+
+
+class TestAsyncTtlCache:
+    async def test_shouldLoadOnce(self) -> None:
+        cache: AsyncTtlCache[int] = AsyncTtlCache(ttl=60)
+        loader = Loader()
+
+        assert await cache.getOrLoad("key", loader) == 1
+        assert await cache.getOrLoad("key", loader) == 1
+        assert cache.get("key") == 1
+        assert loader.calls == 1
+
+    async def test_shouldDeduplicateConcurrentLoads(self) -> None:
+        cache: AsyncTtlCache[int] = AsyncTtlCache(ttl=60)
+        loader = Loader()
+
+        results = await asyncio.gather(
+            *(cache.getOrLoad("key", loader) for _ in range(1000))
+        )
+
+        assert results == [1] * 1000
+        assert loader.calls == 1
+
+    async def test_shouldNotCacheFailures(self) -> None:
+        cache: AsyncTtlCache[int] = AsyncTtlCache(ttl=60)
+
+        async def failingLoader() -> int:
+            raise ValueError("failed")
+
+        with pytest.raises(ValueError):
+            await cache.getOrLoad("key", failingLoader)
+
+        assert await cache.getOrLoad("key", Loader()) == 1
+
+    async def test_shouldReloadExpiredValue(self, mocker: MockerFixture) -> None:
+        now = mocker.patch("logto.utilities.cache.time").monotonic
+        now.return_value = 1000
+        cache: AsyncTtlCache[int] = AsyncTtlCache(ttl=60)
+        loader = Loader()
+
+        assert await cache.getOrLoad("key", loader) == 1
+        now.return_value = 1061
+        assert cache.get("key") is None
+        assert await cache.getOrLoad("key", loader) == 2
+
+    async def test_shouldRevalidateStaleValueInBackground(
+        self, mocker: MockerFixture
+    ) -> None:
+        now = mocker.patch("logto.utilities.cache.time").monotonic
+        now.return_value = 1000
+        cache: AsyncTtlCache[int] = AsyncTtlCache(ttl=60, staleTtl=60)
+        loader = Loader()
+
+        assert await cache.getOrLoad("key", loader) == 1
+        now.return_value = 1061
+        assert await cache.getOrLoad("key", loader) == 1
+        await asyncio.sleep(0.01)
+        assert loader.calls == 2
+        assert await cache.getOrLoad("key", loader) == 2
+
+    async def test_shouldKeepStaleValueIfRevalidationFails(
+        self, mocker: MockerFixture
+    ) -> None:
+        now = mocker.patch("logto.utilities.cache.time").monotonic
+        now.return_value = 1000
+        cache: AsyncTtlCache[int] = AsyncTtlCache(ttl=60, staleTtl=60)
+        await cache.getOrLoad("key", Loader())
+
+        async def failingLoader() -> int:
+            raise ValueError("failed")
+
+        now.return_value = 1061
+        assert await cache.getOrLoad("key", failingLoader) == 1
+        await asyncio.sleep(0.01)
+        assert await cache.getOrLoad("key", failingLoader) == 1
+
+    async def test_shouldNotCacheIfTtlIsZero(self) -> None:
+        cache: AsyncTtlCache[int] = AsyncTtlCache(ttl=0)
+        loader = Loader()
+
+        assert await cache.getOrLoad("key", loader) == 1
+        assert await cache.getOrLoad("key", loader) == 2
+        assert cache.get("key") is None
+
+    def test_shouldEvictOldestKey(self) -> None:
+        cache: AsyncTtlCache[int] = AsyncTtlCache(ttl=60, maxSize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("c", 3)
+
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        assert cache.get("c") == 3
+
+
+class TestVerifiedTokenCache:
+    def test_shouldCacheUntilExpiration(self, mocker: MockerFixture) -> None:
+        now = mocker.patch("logto.utilities.cache.time").time
+        now.return_value = 1000
+        cache: VerifiedTokenCache[str] = VerifiedTokenCache()
+        cache.set("token", "claims", expiresAt=1060)
+
+        assert cache.get("token") == "claims"
+        assert cache.get("other") is None
+        now.return_value = 1060
+        assert cache.get("token") is None
+        assert (cache.hits, cache.misses) == (1, 2)
+        assert cache.hitRatio == 1 / 3
+
+    def test_shouldNotCacheExpiredToken(self, mocker: MockerFixture) -> None:
+        mocker.patch("logto.utilities.cache.time").time.return_value = 1000
+        cache: VerifiedTokenCache[str] = VerifiedTokenCache()
+        cache.set("token", "claims", expiresAt=999)
+
+        assert cache.get("token") is None
+
+    def test_shouldSeparateContexts(self) -> None:
+        cache: VerifiedTokenCache[str] = VerifiedTokenCache()
+        cache.set("token", "claims", expiresAt=9999999999, context="audience1")
+
+        assert cache.get("token", "audience1") == "claims"
+        assert cache.get("token", "audience2") is None
+
+    def test_shouldEvictLeastRecentlyUsed(self) -> None:
+        cache: VerifiedTokenCache[str] = VerifiedTokenCache(maxSize=2)
+        cache.set("a", "a", expiresAt=9999999999)
+        cache.set("b", "b", expiresAt=9999999999)
+        assert cache.get("a") == "a"
+        cache.set("c", "c", expiresAt=9999999999)
+
+        assert cache.get("a") == "a"
+        assert cache.get("b") is None
+        assert cache.get("c") == "c"
+
+    def test_clear(self) -> None:
+        cache: VerifiedTokenCache[str] = VerifiedTokenCache()
+        cache.set("a", "a", expiresAt=9999999999)
+        cache.get("a")
+        cache.clear()
+
+        assert (cache.hits, cache.misses) == (0, 0)
+        assert cache.get("a") is None
@@ -0,0 +1,65 @@
+"""
+The compact encoding for the session state persisted by the Logto client.
+
+A compact value is `lt1.` followed by the base64url encoding of the JSON value
+compressed with zlib. The JSON is only compressed if it gets smaller, otherwise it's
+kept as is, so both JSON and compact values must be accepted when reading.
+"""
+
+import binascii
+import zlib
+
+compactPrefix = "lt1."
+"""
+The prefix of compact encoded values, values without this prefix are JSON.
+"""
+
+_fromUrlsafe = bytes.maketrans(b"-_", b"+/")
+_toUrlsafe = bytes.maketrans(b"+/", b"-_")
+
+
+class CodecError(ValueError):
+    """
+    The value is not a valid compact encoded value.
+    """
+
+
+def isCompact(value: str) -> bool:
+    """
+    Check if the value is compact encoded.
+    """
+    return value.startswith(compactPrefix)
+
+
+def encode(value: str, compressThreshold: int = 256) -> str:
+    """
+    Encode the JSON value, it's compressed if it's at least `compressThreshold` bytes
+    and the compact value is shorter than the JSON, otherwise the JSON is returned.
+    """
+    data = value.encode()
+    if len(data) < compressThreshold:
+        return value
+    encoded = compactPrefix + (
+        binascii.b2a_base64(zlib.compress(data), newline=False)
+        .translate(_toUrlsafe)
+        .rstrip(b"=")
+        .decode("ascii")
+    )
+    return encoded if len(encoded) < len(value) else value
+
+
+def decode(value: str) -> str:
+    """
+    Decode the value to JSON, the values that are not compact are returned as is.
+    """
+    if not isCompact(value):
+        return value
+    data = value[len(compactPrefix) :]
+    try:
+        return zlib.decompress(
+            binascii.a2b_base64(
+                data.encode("ascii").translate(_fromUrlsafe) + b"=" * (-len(data) % 4)
+            )
+        ).decode()
+    except (binascii.Error, zlib.error, UnicodeError) as e:
+        raise CodecError(str(e)) from e
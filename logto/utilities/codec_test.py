@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from . import urlsafeEncode
+from .codec import CodecError, decode, encode, isCompact
+
+
+def createAccessTokenMap(count: int) -> str:
+    header = urlsafeEncode(json.dumps({"alg": "ES384", "kid": "key"}).encode())
+    return json.dumps(
+        {
+            "x": {
+                f"urn:logto:organization:{i}": {
+                    "token": f"{header}.{urlsafeEncode(json.dumps({'sub': str(i)}).encode())}.{urlsafeEncode(bytes(range(i, i + 96)))}",
+                    "expiresAt": 1700000000 + i,
+                }
+                for i in range(count)
+            }
+        },
+        separators=(",", ":"),
+    )
+
+
+class TestCodec:
+    def test_roundTrip(self) -> None:
+        value = createAccessTokenMap(20)
+        encoded = encode(value)
+
+        assert isCompact(encoded)
+        assert len(encoded) < len(value) / 2
+        assert decode(encoded) == value
+
+    def test_small(self) -> None:
+        # Not compressed below the threshold, or if it doesn't get smaller
+        value = createAccessTokenMap(1)
+        incompressible = json.dumps({"x": urlsafeEncode(bytes(range(256)))})
+
+        assert encode(value, compressThreshold=len(value) + 1) == value
+        assert encode(incompressible) == incompressible
+        assert decode(value) == value
+
+    def test_unicode(self) -> None:
+        value = json.dumps({"x": {"組織" * 200: 1}}, ensure_ascii=False)
+
+        assert decode(encode(value)) == value
+
+    def test_invalid(self) -> None:
+        encoded = encode(createAccessTokenMap(20))
+
+        with pytest.raises(CodecError):
+            decode(encoded[:-4])
+        with pytest.raises(CodecError):
+            decode("lt1.!")
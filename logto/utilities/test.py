@@ -1,16 +1,48 @@
-from typing import Any, Dict, Optional
-from pytest_mock import MockerFixture
+import asyncio
+import random
+import socket
+import time
+import urllib.parse
+from collections import Counter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import jwt
+from aiohttp import web
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jwt.algorithms import RSAAlgorithm
 
 from logto.models.oidc import OidcProviderMetadata
+from logto.OidcCore import OidcCore
+from logto.utilities import OrganizationUrnPrefix, tokenBytes, urlsafeEncode
+
+if TYPE_CHECKING:
+    # pytest-mock is a dev dependency, and `FakeLogtoServer` is used without it
+    from pytest_mock import MockerFixture
 
 
 class MockResponse:
     def __init__(
-        self, json: Optional[Dict[str, Any]], text: Optional[str], status: int
+        self,
+        json: Optional[Dict[str, Any]],
+        text: Optional[str],
+        status: int,
+        headers: Optional[Dict[str, str]] = None,
     ) -> None:
         self._json = json
         self._text = text or str(json)
         self.status = status
+        self.headers = headers or {}
 
     async def json(self):
         return self._json
@@ -26,7 +58,7 @@ class MockResponse:
 
 
 def mockHttp(
-    mocker: MockerFixture,
+    mocker: "MockerFixture",
     method: str,
     json: Optional[Dict[str, Any]],
     text: Optional[str],
@@ -48,3 +80,358 @@ mockProviderMetadata = OidcProviderMetadata(
     subject_types_supported=[],
     id_token_signing_alg_values_supported=[],
 )
+
+
+def createSigningKey(
+    kid: str, algorithm: Literal["RS256", "ES256"] = "RS256"
+) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Create a private key for signing test tokens, and the public JWK of it.
+    """
+    if algorithm == "RS256":
+        privateKey: Any = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = RSAAlgorithm.to_jwk(privateKey.public_key(), as_dict=True)
+    else:
+        privateKey = ec.generate_private_key(ec.SECP256R1())
+        numbers = privateKey.public_key().public_numbers()
+        # Coordinates must be padded to the curve size, which `ECAlgorithm.to_jwk`
+        # doesn't do in the installed PyJWT
+        jwk = {
+            "kty": "EC",
+            "crv": "P-256",
+            "x": urlsafeEncode(numbers.x.to_bytes(32, "big")),
+            "y": urlsafeEncode(numbers.y.to_bytes(32, "big")),
+        }
+    return privateKey, {**jwk, "kid": kid, "use": "sig", "alg": algorithm}
+
+
+Latency = Union[float, Callable[[random.Random], float]]
+"""
+A fixed latency in seconds, or a function that draws one from the given random
+generator, e.g. `lambda rng: rng.expovariate(1 / 0.05)`.
+"""
+
+
+class FakeLogtoServer:
+    """
+    A local stand-in of the Logto OIDC provider, served by `aiohttp.web` on the
+    loopback interface. It implements discovery, JWKS, the authorization endpoint
+    (which redirects back with a code immediately), the token endpoint (code, refresh
+    and organization grants), UserInfo and end session, and it mints real tokens
+    signed by keys in its JWKS.
+
+    The knobs are plain attributes, so they can be changed while the server runs:
+    `latency` delays each response, a fraction of `errorRate` of the requests to the
+    `faultPaths` fail with `errorStatus`, requests beyond `rateLimit` per second get
+    429, and the signing key is rotated every `keyRotationInterval` seconds (or by
+    `rotateKeys`). Random draws use a generator seeded by `seed`, so runs with the
+    same requests see the same faults.
+
+    Example:
+      ```python
+      async with FakeLogtoServer(errorRate=0.1, seed=1) as server:
+          client = LogtoClient(LogtoConfig(endpoint=server.endpoint, appId="app"))
+          ...
+      ```
+    """
+
+    def __init__(
+        self,
+        algorithm: Literal["RS256", "ES256"] = "ES256",
+        latency: Latency = 0,
+        errorRate: float = 0,
+        errorStatus: int = 503,
+        faultPaths: Optional[Collection[str]] = None,
+        rateLimit: Optional[float] = None,
+        keyRotationInterval: Optional[float] = None,
+        accessTokenTtl: int = 3600,
+        rotateRefreshTokens: bool = False,
+        seed: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            algorithm: The signing algorithm of the keys.
+            latency: The latency of each response.
+            errorRate: The fraction of the requests that fail.
+            errorStatus: The HTTP status of the failed requests.
+            faultPaths: The paths (e.g. `/oidc/token`) that fail and are delayed,
+                `None` means all paths.
+            rateLimit: The number of requests per second (with the same burst)
+                before responding 429, `None` means no limit.
+            keyRotationInterval: The time (in seconds) between key rotations, `None`
+                means the keys are only rotated by `rotateKeys`.
+            accessTokenTtl: The lifetime (in seconds) of the access tokens.
+            rotateRefreshTokens: Whether the refresh grant issues a new refresh token
+                and revokes the used one.
+            seed: The seed of the random generator.
+        """
+        self.algorithm = algorithm
+        self.latency = latency
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.faultPaths = faultPaths
+        self.rateLimit = rateLimit
+        self.keyRotationInterval = keyRotationInterval
+        self.accessTokenTtl = accessTokenTtl
+        self.rotateRefreshTokens = rotateRefreshTokens
+        self.random = random.Random(seed)
+        self.requests: "Counter[str]" = Counter()
+        """
+        The number of requests by path.
+        """
+        self.userInfo: Dict[str, Any] = {"name": "John Wick", "username": "john"}
+        """
+        The extra claims returned by the UserInfo endpoint.
+        """
+
+        self._keys: List[Tuple[Any, Dict[str, Any]]] = []
+        self._keyCount = 0
+        self._rotatedAt = time.monotonic()
+        self._codes: Dict[str, Tuple[str, str, str]] = {}
+        self._refreshTokens: Dict[str, str] = {}
+        self._bucket = float(rateLimit or 0)
+        self._bucketUpdatedAt = time.monotonic()
+        self._runner: Optional[web.AppRunner] = None
+        self.endpoint = ""
+        """
+        The endpoint of the running server, e.g. `http://127.0.0.1:8080`.
+        """
+        self.rotateKeys()
+
+    @property
+    def metadata(self) -> OidcProviderMetadata:
+        oidc = f"{self.endpoint}/oidc"
+        return OidcProviderMetadata(
+            issuer=oidc,
+            authorization_endpoint=f"{oidc}/auth",
+            token_endpoint=f"{oidc}/token",
+            userinfo_endpoint=f"{oidc}/me",
+            jwks_uri=f"{oidc}/jwks",
+            end_session_endpoint=f"{oidc}/session/end",
+            response_types_supported=["code"],
+            subject_types_supported=["public"],
+            id_token_signing_alg_values_supported=[self.algorithm],
+        )
+
+    @property
+    def jwks(self) -> Dict[str, Any]:
+        """
+        The JWKS with the current and the previous signing keys, so tokens signed
+        before a rotation can still be verified.
+        """
+        return {"keys": [jwk for _, jwk in self._keys]}
+
+    def rotateKeys(self) -> None:
+        """
+        Sign new tokens with a new key, and drop all but the previous key.
+        """
+        self._keyCount += 1
+        self._keys = self._keys[-1:] + [
+            createSigningKey(f"key-{self._keyCount}", self.algorithm)
+        ]
+        self._rotatedAt = time.monotonic()
+
+    def sign(self, claims: Dict[str, Any]) -> str:
+        """
+        Sign the claims with the current key, filling in the issuer and timestamps.
+        """
+        if (
+            self.keyRotationInterval is not None
+            and time.monotonic() - self._rotatedAt >= self.keyRotationInterval
+        ):
+            self.rotateKeys()
+
+        privateKey, jwk = self._keys[-1]
+        now = int(time.time())
+        return jwt.encode(
+            {"iss": self.metadata.issuer, "iat": now, "exp": now + 3600, **claims},
+            privateKey,
+            algorithm=self.algorithm,
+            headers={"kid": jwk["kid"]},
+        )
+
+    def issueRefreshToken(self, subject: str = "user") -> str:
+        """
+        Issue a refresh token for the subject, e.g. to seed sessions of a load test
+        without signing in.
+        """
+        refreshToken = urlsafeEncode(tokenBytes(32))
+        self._refreshTokens[refreshToken] = subject
+        return refreshToken
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        """
+        Start serving, on a free port if `port` is 0.
+        """
+        app = web.Application(middlewares=[self._faults])
+        app.add_routes(
+            [
+                web.get("/oidc/.well-known/openid-configuration", self._discovery),
+                web.get("/oidc/jwks", self._jwks),
+                web.get("/oidc/auth", self._auth),
+                web.post("/oidc/token", self._token),
+                web.get("/oidc/me", self._userInfo),
+                web.get("/oidc/session/end", self._endSession),
+            ]
+        )
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        sock = socket.socket()
+        sock.bind((host, port))
+        await web.SockSite(self._runner, sock).start()
+        self.endpoint = f"http://{host}:{sock.getsockname()[1]}"
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeLogtoServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    def _isRateLimited(self) -> bool:
+        if self.rateLimit is None:
+            return False
+
+        now = time.monotonic()
+        self._bucket = min(
+            self.rateLimit,
+            self._bucket + (now - self._bucketUpdatedAt) * self.rateLimit,
+        )
+        self._bucketUpdatedAt = now
+        if self._bucket < 1:
+            return True
+        self._bucket -= 1
+        return False
+
+    @web.middleware
+    async def _faults(
+        self,
+        request: web.Request,
+        handler: Callable[[web.Request], Any],
+    ) -> web.StreamResponse:
+        self.requests[request.path] += 1
+        if self._isRateLimited():
+            return web.json_response(
+                {"error": "too_many_requests"},
+                status=429,
+                headers={"Retry-After": "1"},
+            )
+
+        if self.faultPaths is None or request.path in self.faultPaths:
+            latency = (
+                self.latency(self.random) if callable(self.latency) else self.latency
+            )
+            if latency > 0:
+                await asyncio.sleep(latency)
+            if self.errorRate > 0 and self.random.random() < self.errorRate:
+                return web.json_response(
+                    {"error": "server_error"}, status=self.errorStatus
+                )
+        return await handler(request)
+
+    async def _discovery(self, request: web.Request) -> web.Response:
+        return web.json_response(self.metadata.model_dump(exclude_none=True))
+
+    async def _jwks(self, request: web.Request) -> web.Response:
+        return web.json_response(self.jwks)
+
+    async def _auth(self, request: web.Request) -> web.Response:
+        query = request.query
+        if query.get("code_challenge_method") != "S256":
+            return _oauthError("invalid_request", "PKCE with S256 is required")
+
+        code = urlsafeEncode(tokenBytes(16))
+        self._codes[code] = (
+            query["client_id"],
+            query["redirect_uri"],
+            query["code_challenge"],
+        )
+        raise web.HTTPFound(
+            query["redirect_uri"]
+            + "?"
+            + urllib.parse.urlencode({"code": code, "state": query.get("state", "")})
+        )
+
+    async def _token(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        grantType = data.get("grant_type")
+        clientId = str(data.get("client_id"))
+
+        if grantType == "authorization_code":
+            grant = self._codes.pop(str(data.get("code")), None)
+            if (
+                grant is None
+                or grant[:2] != (clientId, data.get("redirect_uri"))
+                or OidcCore.generateCodeChallenge(str(data.get("code_verifier")))
+                != grant[2]
+            ):
+                return _oauthError("invalid_grant", "Invalid authorization code")
+            subject = "user"
+            refreshToken = self.issueRefreshToken(subject)
+        elif grantType == "refresh_token":
+            refreshToken = str(data.get("refresh_token"))
+            subject = self._refreshTokens.get(refreshToken, "")
+            if not subject:
+                return _oauthError("invalid_grant", "Invalid refresh token")
+            if self.rotateRefreshTokens:
+                del self._refreshTokens[refreshToken]
+                refreshToken = self.issueRefreshToken(subject)
+        else:
+            return _oauthError("unsupported_grant_type", str(grantType))
+
+        organizationId = data.get("organization_id")
+        audience = (
+            f"{OrganizationUrnPrefix}{organizationId}"
+            if organizationId
+            else str(data.get("resource") or clientId)
+        )
+        now = int(time.time())
+        tokenResponse: Dict[str, Any] = {
+            "access_token": self.sign(
+                {
+                    "sub": subject,
+                    "aud": audience,
+                    "client_id": clientId,
+                    "scope": "openid offline_access profile",
+                    "exp": now + self.accessTokenTtl,
+                }
+            ),
+            "token_type": "Bearer",
+            "expires_in": self.accessTokenTtl,
+            "refresh_token": refreshToken,
+        }
+        if grantType == "authorization_code":
+            tokenResponse["id_token"] = self.sign({"sub": subject, "aud": clientId})
+        return web.json_response(tokenResponse)
+
+    async def _userInfo(self, request: web.Request) -> web.Response:
+        accessToken = request.headers.get("Authorization", "")[len("Bearer ") :]
+        keys = {jwk["kid"]: privateKey for privateKey, jwk in self._keys}
+        try:
+            privateKey = keys[jwt.get_unverified_header(accessToken).get("kid")]
+            claims = jwt.decode(
+                accessToken,
+                privateKey.public_key(),
+                algorithms=[self.algorithm],
+                options={"verify_aud": False},
+            )
+        except (KeyError, jwt.PyJWTError):
+            return _oauthError("invalid_token", "Invalid access token", 401)
+        return web.json_response({**self.userInfo, "sub": claims["sub"]})
+
+    async def _endSession(self, request: web.Request) -> web.Response:
+        redirectUri = request.query.get("post_logout_redirect_uri")
+        if redirectUri:
+            raise web.HTTPFound(redirectUri)
+        return web.Response(text="Signed out")
+
+
+def _oauthError(error: str, description: str, status: int = 400) -> web.Response:
+    return web.json_response(
+        {"error": error, "error_description": description}, status=status
+    )
@@ -0,0 +1,141 @@
+from typing import AsyncIterator
+
+import pytest
+
+from logto import JwksStore, LogtoClient, LogtoConfig, LogtoException
+from logto.HttpTransport import HttpTransport
+from logto.models.oidc import UserInfoScope
+from logto.Storage import MemoryStorage
+
+from .test import FakeLogtoServer
+
+
+@pytest.fixture
+async def transport() -> AsyncIterator[HttpTransport]:
+    async with HttpTransport() as transport:
+        yield transport
+
+
+async def signIn(
+    server: FakeLogtoServer, client: LogtoClient, transport: HttpTransport
+) -> None:
+    signInUrl = await client.signIn("http://app.test/callback")
+    async with transport.session.get(signInUrl, allow_redirects=False) as resp:
+        assert resp.status == 302
+        await client.handleSignInCallback(resp.headers["Location"])
+
+
+class TestFakeLogtoServer:
+    async def test_signInFlow(self, transport: HttpTransport) -> None:
+        async with FakeLogtoServer() as server:
+            client = LogtoClient(
+                LogtoConfig(
+                    endpoint=server.endpoint,
+                    appId="app",
+                    scopes=[UserInfoScope.organizations],
+                ),
+                MemoryStorage(),
+                transport=transport,
+            )
+            await signIn(server, client, transport)
+
+            assert client.getIdTokenClaims().sub == "user"
+            assert (await client.fetchUserInfo()).name == "John Wick"
+            assert (await client.getOrganizationTokenClaims("org")).aud == (
+                "urn:logto:organization:org"
+            )
+            assert (await client.signOut("http://app.test")).startswith(
+                f"{server.endpoint}/oidc/session/end?"
+            )
+            assert server.requests["/oidc/token"] == 2
+
+    async def test_token_invalidGrant(self, transport: HttpTransport) -> None:
+        async with FakeLogtoServer() as server:
+            resp = await transport.request(
+                "post",
+                server.metadata.token_endpoint,
+                data={"grant_type": "refresh_token", "refresh_token": "bogus"},
+            )
+
+        assert resp.status == 400
+        assert "invalid_grant" in (resp.text or "")
+
+    async def test_rotateRefreshTokens(self, transport: HttpTransport) -> None:
+        async with FakeLogtoServer(rotateRefreshTokens=True) as server:
+            core = await LogtoClient(
+                LogtoConfig(endpoint=server.endpoint, appId="app"),
+                MemoryStorage(),
+                transport=transport,
+            ).getOidcCore()
+            refreshToken = server.issueRefreshToken()
+            tokenResponse = await core.fetchTokenByRefreshToken(
+                "app", None, refreshToken
+            )
+
+            assert tokenResponse.refresh_token != refreshToken
+            with pytest.raises(LogtoException, match="invalid_grant"):
+                await core.fetchTokenByRefreshToken("app", None, refreshToken)
+
+    async def test_errorRate(self, transport: HttpTransport) -> None:
+        async with FakeLogtoServer(
+            errorRate=1, errorStatus=502, faultPaths=["/oidc/token"]
+        ) as server:
+            client = LogtoClient(
+                LogtoConfig(endpoint=server.endpoint, appId="app"),
+                MemoryStorage(),
+                transport=transport,
+            )
+            with pytest.raises(LogtoException, match="server_error"):
+                await signIn(server, client, transport)
+
+            # Other paths are not affected
+            assert (await client.getOidcCore()).metadata.issuer.startswith(
+                server.endpoint
+            )
+
+    async def test_latency_seeded(self, transport: HttpTransport) -> None:
+        latencies = []
+        for _ in range(2):
+            drawn = []
+
+            def latency(rng) -> float:
+                drawn.append(rng.random())
+                return 0.001
+
+            async with FakeLogtoServer(latency=latency, seed=1) as server:
+                for _ in range(3):
+                    await transport.request("get", server.metadata.jwks_uri)
+            latencies.append(drawn)
+
+        assert len(latencies[0]) == 3
+        assert latencies[0] == latencies[1]
+
+    async def test_rateLimit(self, transport: HttpTransport) -> None:
+        async with FakeLogtoServer(rateLimit=2) as server:
+            statuses = [
+                (await transport.request("get", server.metadata.jwks_uri)).status
+                for _ in range(3)
+            ]
+
+        assert statuses == [200, 200, 429]
+
+    async def test_rotateKeys(self, transport: HttpTransport) -> None:
+        async with FakeLogtoServer(algorithm="RS256") as server:
+            jwksStore = JwksStore(
+                server.metadata.jwks_uri, transport, minRefreshInterval=0
+            )
+            token = server.sign({"sub": "user"})
+            await jwksStore.getSigningKeyFromJwt(token)
+
+            # The previous key is still published after a rotation
+            server.rotateKeys()
+            assert len(server.jwks["keys"]) == 2
+            await jwksStore.refresh()
+            await jwksStore.getSigningKeyFromJwt(token)
+
+            # New tokens are signed by the new key, which is fetched on demand
+            server.rotateKeys()
+            await jwksStore.getSigningKeyFromJwt(server.sign({"sub": "user"}))
+            assert server.requests["/oidc/jwks"] == 3
+            with pytest.raises(LogtoException, match="key-1"):
+                await jwksStore.getSigningKeyFromJwt(token)